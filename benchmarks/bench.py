@@ -0,0 +1,154 @@
+"""Benchmarks the conversion stages on synthetic documents
+
+    $ python benchmarks/bench.py --kind donor --scales 1000,10000 -o results.json
+    $ python benchmarks/bench.py --compare before.json after.json
+
+Every stage runs in a fresh process, so that the peak RSS reported for a
+stage is not inflated by the stages before it.
+"""
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import records  # noqa: E402
+
+STAGES = ["parse", "mutate", "serialize"]
+
+ONTOLOGY_IRI = "http://purl.org/ccf/data/benchmark.owl"
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak //= 1024
+    return peak / 1024.0
+
+
+def count_records(data):
+    return len(data["@graph"]) if isinstance(data, dict) else len(data)
+
+
+def run_stage(stage, path, format):
+    """Runs the prerequisites of `stage` untimed, then times the stage
+    """
+    from spatial2ccf import reader
+    from spatial2ccf.ontology import SPOntology
+
+    result = {"stage": stage}
+    if stage == "parse":
+        before = peak_rss_mb()
+        start, cpu_start = time.perf_counter(), time.process_time()
+        with open(path, encoding="utf-8") as f:
+            data = reader.load(f)
+            items = data["@graph"] if isinstance(data, dict) else data
+            result["records"] = sum(1 for _ in items)
+        result["triples"] = 0
+        result["bytes"] = os.path.getsize(path)
+    else:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        result["records"] = count_records(data)
+        o = SPOntology.new(ONTOLOGY_IRI)
+        if stage == "mutate":
+            before = peak_rss_mb()
+            start, cpu_start = time.perf_counter(), time.process_time()
+        o = o.mutate(data)
+        result["triples"] = len(o.graph)
+        if stage == "serialize":
+            del data
+            fd, output = tempfile.mkstemp()
+            os.close(fd)
+            before = peak_rss_mb()
+            start, cpu_start = time.perf_counter(), time.process_time()
+            o.serialize(output, format)
+            result["bytes"] = os.path.getsize(output)
+            os.remove(output)
+    result["seconds"] = time.perf_counter() - start
+    result["cpu_seconds"] = time.process_time() - cpu_start
+    result["peak_rss_mb"] = peak_rss_mb()
+    result["stage_rss_mb"] = max(0.0, result["peak_rss_mb"] - before)
+    result["records_per_sec"] = result["records"] / result["seconds"]
+    result["triples_per_sec"] = result["triples"] / result["seconds"]
+    return result
+
+
+def benchmark(kind, scales, seed, format, stages):
+    context = multiprocessing.get_context("spawn")
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for scale in scales:
+            path = os.path.join(directory, "%s-%d.json" % (kind, scale))
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(records.generate(kind, scale, seed), f)
+            for stage in stages:
+                with context.Pool(1) as pool:
+                    result = pool.apply(run_stage, (stage, path, format))
+                result["scale"] = scale
+                results.append(result)
+                print("%-10s %8d %-10s %9.3fs %12.0f rec/s %12.0f triples/s "
+                      "%8.1f MB" % (kind, scale, stage, result["seconds"],
+                                    result["records_per_sec"],
+                                    result["triples_per_sec"],
+                                    result["peak_rss_mb"]))
+    return {
+        "meta": {
+            "kind": kind,
+            "seed": seed,
+            "format": format,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S")
+        },
+        "results": results
+    }
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = {(r["scale"], r["stage"]): r for r in json.load(f)["results"]}
+    with open(after_path) as f:
+        after = {(r["scale"], r["stage"]): r for r in json.load(f)["results"]}
+    print("%8s %-10s %10s %10s %8s %10s %10s" % (
+        "scale", "stage", "before", "after", "speedup", "rss before",
+        "rss after"))
+    for key in sorted(before.keys() & after.keys()):
+        b, a = before[key], after[key]
+        print("%8d %-10s %9.3fs %9.3fs %7.2fx %8.1fMB %8.1fMB" % (
+            key[0], key[1], b["seconds"], a["seconds"],
+            b["seconds"] / a["seconds"], b["peak_rss_mb"], a["peak_rss_mb"]))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--kind", choices=["rui", "donor"], default="donor")
+    parser.add_argument("--scales", default="1000,10000",
+                        help="comma separated numbers of records")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-f", "--format", default="ttl",
+                        choices=["ttl", "nt", "nq"])
+    parser.add_argument("--stages", default=",".join(STAGES),
+                        help="comma separated stages to run")
+    parser.add_argument("-o", "--output", help="JSON file for the results")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="compare two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    else:
+        report = benchmark(args.kind, [int(s) for s in args.scales.split(",")],
+                           args.seed, args.format, args.stages.split(","))
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
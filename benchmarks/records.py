@@ -0,0 +1,201 @@
+"""Seeded generator of synthetic RUI and Donor documents for benchmarking
+
+    $ python benchmarks/records.py --kind donor --records 10000 -o donors.jsonld
+"""
+import json
+import random
+import sys
+
+from argparse import ArgumentParser
+
+CCF_1_5 = "http://purl.org/ccf/1.5/"
+ENTITY_API = "https://entity.api.hubmapconsortium.org/entities/"
+
+ORGANS = [
+    ("VHFLeftKidney", "UBERON:0004538", "Female", "Left"),
+    ("VHFRightKidney", "UBERON:0004539", "Female", "Right"),
+    ("VHMLeftKidney", "UBERON:0004538", "Male", "Left"),
+    ("VHMSpleen", "UBERON:0002106", "Male", None),
+    ("VHFHeart", "UBERON:0000948", "Female", None),
+    ("VHMColon", "UBERON:0001155", "Male", None),
+]
+
+STRUCTURES = [
+    "UBERON:0001225", "UBERON:0001284", "UBERON:0000362", "UBERON:0001228",
+    "UBERON:0002113", "UBERON:0001224", "UBERON:0004200", "UBERON:0006517",
+]
+
+CONSORTIA = ["HuBMAP", "KPMP", "SPARC", "GTEx"]
+FIRST_NAMES = ["Ellen", "Bruce", "Yingnan", "Griffin", "Katy", "Andreas"]
+LAST_NAMES = ["Quardokus", "Herr", "Ju", "Weber", "Börner", "Bueckle"]
+
+
+def placement(rng, placement_id, target, source=None):
+    obj = {
+        "@id": placement_id,
+        "@type": "SpatialPlacement",
+        "target": target,
+        "placement_date": "2021-%02d-%02d" % (rng.randint(1, 12),
+                                              rng.randint(1, 28)),
+        "x_scaling": 1, "y_scaling": 1, "z_scaling": 1,
+        "scaling_units": "ratio",
+        "x_rotation": rng.choice([0, 90, rng.uniform(-180, 180)]),
+        "y_rotation": rng.choice([0, rng.uniform(-180, 180)]),
+        "z_rotation": rng.choice([0, rng.uniform(-180, 180)]),
+        "rotation_order": "XYZ",
+        "rotation_units": "degree",
+        "x_translation": round(rng.uniform(0, 120), 3),
+        "y_translation": round(rng.uniform(0, 120), 3),
+        "z_translation": round(rng.uniform(0, 60), 3),
+        "translation_units": "millimeter"
+    }
+    if source is not None:
+        obj["source"] = source
+    return obj
+
+
+def tissue_block(rng, block_id, reference_organ):
+    obj = {
+        "@id": block_id,
+        "@type": "SpatialEntity",
+        "creator_first_name": rng.choice(FIRST_NAMES),
+        "creator_last_name": rng.choice(LAST_NAMES),
+        "creation_date": "2021-%02d-%02d" % (rng.randint(1, 12),
+                                             rng.randint(1, 28)),
+        "x_dimension": rng.randint(2, 20),
+        "y_dimension": rng.randint(2, 20),
+        "z_dimension": rng.choice([0.5, 1, 2, 5]),
+        "dimension_units": "millimeter",
+        "placement": placement(rng, block_id + "_placement",
+                               "http://purl.org/ccf/latest/ccf.owl#" +
+                               reference_organ)
+    }
+    if rng.random() < 0.3:
+        obj["creator_orcid"] = "0000-000%d-%04d-%04d" % (
+            rng.randint(1, 3), rng.randint(0, 9999), rng.randint(0, 9999))
+    if rng.random() < 0.8:
+        obj["ccf_annotations"] = [
+            "http://purl.obolibrary.org/obo/" + s.replace(":", "_")
+            for s in rng.sample(STRUCTURES, rng.randint(1, 3))]
+    return obj
+
+
+def reference_entity(rng, index):
+    organ, uberon, sex, side = ORGANS[index % len(ORGANS)]
+    entity_id = "#" + organ + "_" + str(index)
+    obj = {
+        "@id": entity_id,
+        "@type": "SpatialEntity",
+        "label": "Spatial entity " + str(index),
+        "creator_first_name": rng.choice(FIRST_NAMES),
+        "creator_last_name": rng.choice(LAST_NAMES),
+        "creation_date": "2020-06-01",
+        "x_dimension": rng.randint(10, 150),
+        "y_dimension": rng.randint(10, 150),
+        "z_dimension": rng.randint(10, 150),
+        "dimension_units": "millimeter",
+        "sex": sex,
+        "representation_of": rng.choice([uberon] + STRUCTURES),
+        "reference_organ": "#" + organ,
+        "extraction_set": "#" + organ + "Set",
+        "rui_rank": rng.randint(1, 100),
+        "object": {
+            "@id": entity_id + "Obj",
+            "file": "https://ccf-ontology.hubmapconsortium.org/objects/v1.0/" +
+                    organ + ".glb",
+            "file_format": "model/gltf-binary",
+            "file_subpath": organ + "_" + str(index),
+            "placement": placement(rng, entity_id + "ObjPlacement",
+                                   "#" + organ)
+        },
+        "placement": placement(rng, entity_id + "Placement", "#" + organ)
+    }
+    if side is not None:
+        obj["side"] = side
+    return obj
+
+
+def generate_rui(count, seed=0):
+    """Returns a list of `count` reference records mixing spatial entities,
+    placements, extraction sets and retired spatial entities
+    """
+    rng = random.Random(seed)
+    records = []
+    for index in range(count):
+        roll = rng.random()
+        organ = ORGANS[index % len(ORGANS)][0]
+        if roll < 0.7:
+            records.append(reference_entity(rng, index))
+        elif roll < 0.85:
+            records.append(placement(rng, "#" + organ + "Placement" +
+                                     str(index), "#VHFemaleBody",
+                                     "#" + organ))
+        elif roll < 0.95:
+            records.append({
+                "@id": "#" + organ + "Set" + str(index),
+                "@type": "ExtractionSet",
+                "label": rng.choice(CONSORTIA),
+                "extraction_set_for": "#" + organ,
+                "rui_rank": rng.randint(1, 100)
+            })
+        else:
+            records.append({
+                "@id": "#Retired" + str(index),
+                "@type": "RetiredSpatialEntity",
+                "representation_of": rng.choice(STRUCTURES)
+            })
+    return records
+
+
+def generate_donors(count, seed=0, samples=4):
+    """Returns a JSON-LD document with `count` Donors in its '@graph', each
+    with up to `samples` registered tissue samples
+    """
+    rng = random.Random(seed)
+    donors = []
+    for index in range(count):
+        organ = rng.choice(ORGANS)[0]
+        donor_samples = []
+        for sample in range(rng.randint(1, samples)):
+            sample_id = ENTITY_API + "%032x" % rng.getrandbits(128)
+            obj = {"@id": sample_id}
+            if rng.random() < 0.9:
+                obj["rui_location"] = tissue_block(
+                    rng, CCF_1_5 + "%032x" % rng.getrandbits(128), organ)
+            donor_samples.append(obj)
+        donors.append({
+            "@id": ENTITY_API + "%032x" % rng.getrandbits(128),
+            "@type": "Donor",
+            "consortium_name": rng.choice(CONSORTIA),
+            "samples": donor_samples
+        })
+    return {
+        "@context": "https://hubmapconsortium.github.io/hubmap-ontology/"
+                    "ccf-context.jsonld",
+        "@graph": donors
+    }
+
+
+def generate(kind, count, seed=0):
+    if kind == "rui":
+        return generate_rui(count, seed)
+    elif kind == "donor":
+        return generate_donors(count, seed)
+    raise ValueError("Unknown document kind <" + kind + ">")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--kind", choices=["rui", "donor"], default="donor")
+    parser.add_argument("--records", type=int, default=1000,
+                        help="number of top-level records (or Donors)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="output JSON file")
+    args = parser.parse_args()
+
+    document = generate(args.kind, args.records, args.seed)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(document, f)
+    else:
+        json.dump(document, sys.stdout)
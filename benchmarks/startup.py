@@ -0,0 +1,136 @@
+"""Benchmarks the startup of bin/spatial2ccf against a fixed budget
+
+    $ python benchmarks/startup.py --repeat 10 -o startup.json
+
+Every case runs in a fresh interpreter and is timed over `--repeat` runs.
+The budgets apply to the best time of a case minus the best time of a bare
+`python -c pass`, so that they do not depend on how fast the machine
+starts Python. The script also checks that --version and --help do not
+import any of the conversion dependencies, and exits with status 1 when a
+check fails.
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from argparse import ArgumentParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, "bin", "spatial2ccf")
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import records  # noqa: E402
+
+ONTOLOGY_IRI = "http://purl.org/ccf/data/benchmark.owl"
+
+# Modules that --version and --help must not import
+HEAVY_MODULES = ["rdflib", "requests", "requests_file", "numpy",
+                 "spatial2ccf.pipeline"]
+
+# Prints the heavy modules imported by running the script with the given
+# arguments
+IMPORTED = """
+import runpy, sys
+sys.argv = [%r] + %r
+try:
+    runpy.run_path(%r, run_name="__main__")
+except SystemExit:
+    pass
+print("imported:" + ",".join(m for m in %r if m in sys.modules))
+"""
+
+
+def best_time(command, repeat, env):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def imported_modules(arguments, env):
+    code = IMPORTED % (SCRIPT, arguments, SCRIPT, HEAVY_MODULES)
+    output = subprocess.run([sys.executable, "-c", code], env=env,
+                            check=True, capture_output=True, text=True)
+    line = output.stdout.rsplit("imported:", 1)[1].strip()
+    return [m for m in line.split(",") if m]
+
+
+def benchmark(repeat, budgets):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [ROOT] + [p for p in [env.get("PYTHONPATH")] if p])
+    results = []
+    failed = False
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "rui-1.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(records.generate("rui", 1, 0), f)
+        cases = [
+            ("version", [SCRIPT, "--version"]),
+            ("help", [SCRIPT, "--help"]),
+            ("convert", [SCRIPT, path, "--ontology-iri", ONTOLOGY_IRI,
+                         "-f", "nt", "--stream",
+                         "-o", os.path.join(directory, "rui-1.nt")]),
+        ]
+        baseline = best_time([sys.executable, "-c", "pass"], repeat, env)
+        print("%-10s %9.1f ms" % ("python", baseline * 1000))
+        for name, command in cases:
+            seconds = best_time([sys.executable] + command, repeat, env)
+            overhead_ms = (seconds - baseline) * 1000
+            result = {"case": name, "seconds": seconds,
+                      "overhead_ms": overhead_ms,
+                      "budget_ms": budgets[name]}
+            if name in ("version", "help"):
+                result["heavy_modules"] = imported_modules(command[1:], env)
+            result["ok"] = overhead_ms <= budgets[name] and \
+                not result.get("heavy_modules")
+            failed = failed or not result["ok"]
+            results.append(result)
+            print("%-10s %9.1f ms %+9.1f ms (budget %d ms) %s%s" % (
+                name, seconds * 1000, overhead_ms, budgets[name],
+                "ok" if result["ok"] else "FAILED",
+                "" if not result.get("heavy_modules") else
+                " imports " + ", ".join(result["heavy_modules"])))
+    report = {
+        "meta": {
+            "repeat": repeat,
+            "baseline_seconds": baseline,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S")
+        },
+        "results": results
+    }
+    return report, failed
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--version-budget-ms", type=int, default=50,
+                        help="budget of --version and --help over a bare "
+                             "interpreter")
+    parser.add_argument("--convert-budget-ms", type=int, default=400,
+                        help="budget of a single record conversion over a "
+                             "bare interpreter")
+    parser.add_argument("-o", "--output", help="JSON file for the results")
+    args = parser.parse_args()
+
+    report, failed = benchmark(args.repeat, {
+        "version": args.version_budget_ms,
+        "help": args.version_budget_ms,
+        "convert": args.convert_budget_ms
+    })
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,119 @@
+"""Benchmarks the in-memory graph against the on-disk SQLite store
+
+    $ python benchmarks/store.py --scales 1000,10000,100000 -o store.json
+
+Every case converts a synthetic document and serializes it to N-Triples in
+a fresh process, so that the peak RSS reported for a case is its own. The
+records are read incrementally, so that the peak RSS is mostly the one of
+the graph.
+"""
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import records  # noqa: E402
+
+STORES = ["memory", "sqlite"]
+
+ONTOLOGY_IRI = "http://purl.org/ccf/data/benchmark.owl"
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak //= 1024
+    return peak / 1024.0
+
+
+def run_case(store, path, directory):
+    """Converts the document at `path` with the graph kept in `store`
+    """
+    from spatial2ccf import reader
+    from spatial2ccf.ontology import SPOntology
+    from spatial2ccf.store import SQLiteStore
+
+    database = os.path.join(directory, "graph.db")
+    output = os.path.join(directory, "graph.nt")
+    before = peak_rss_mb()
+    start = time.perf_counter()
+    graph = SQLiteStore(database) if store == "sqlite" else None
+    o = SPOntology.new(ONTOLOGY_IRI, graph)
+    with open(path, encoding="utf-8") as f:
+        o = o.mutate(reader.load(f))
+    o.flush()
+    mutated = time.perf_counter()
+    o.serialize(output, "nt")
+    result = {
+        "store": store,
+        "triples": len(o.graph),
+        "mutate_seconds": mutated - start,
+        "serialize_seconds": time.perf_counter() - mutated,
+        "seconds": time.perf_counter() - start,
+        "bytes": os.path.getsize(output),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    result["case_rss_mb"] = max(0.0, result["peak_rss_mb"] - before)
+    result["triples_per_sec"] = result["triples"] / result["seconds"]
+    if graph is not None:
+        result["store_bytes"] = os.path.getsize(database)
+        graph.close()
+        os.remove(database)
+    os.remove(output)
+    return result
+
+
+def benchmark(kind, scales, seed, stores):
+    context = multiprocessing.get_context("spawn")
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for scale in scales:
+            path = os.path.join(directory, "%s-%d.json" % (kind, scale))
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(records.generate(kind, scale, seed), f)
+            for store in stores:
+                with context.Pool(1) as pool:
+                    result = pool.apply(run_case, (store, path, directory))
+                result["scale"] = scale
+                results.append(result)
+                print("%-10s %8d %-8s %9.3fs %12.0f triples/s %8.1f MB" % (
+                    kind, scale, store, result["seconds"],
+                    result["triples_per_sec"], result["peak_rss_mb"]))
+    return {
+        "meta": {
+            "kind": kind,
+            "seed": seed,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S")
+        },
+        "results": results
+    }
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--kind", choices=["rui", "donor"], default="donor")
+    parser.add_argument("--scales", default="1000,10000,100000",
+                        help="comma separated numbers of records")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stores", default=",".join(STORES),
+                        help="comma separated stores to run")
+    parser.add_argument("-o", "--output", help="JSON file for the results")
+    args = parser.parse_args()
+
+    report = benchmark(args.kind, [int(s) for s in args.scales.split(",")],
+                       args.seed, args.stores.split(","))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
@@ -1,6 +1,4 @@
-from distutils.core import setup
-
-from setuptools import find_packages
+from setuptools import setup, find_packages
 
 from spatial2ccf import __version__
 
@@ -11,8 +9,6 @@ License :: OSI Approved :: BSD License
 Intended Audience :: Science/Research
 Topic :: Scientific/Engineering
 Topic :: Scientific/Engineering :: Bio-Informatics
-Programming Language :: Python :: 3.5
-Programming Language :: Python :: 3.6
 Programming Language :: Python :: 3.7
 Programming Language :: Python :: 3.8
 Operating System :: POSIX :: Linux
@@ -31,7 +27,10 @@ setup(name='spatial2ccf',
           'stringcase==1.2.0',
           'requests_file==1.5.1'
       ],
-      python_requires='>=3.5',
+      extras_require={
+          'spatial': ['numpy']
+      },
+      python_requires='>=3.7',
       test_suite='nose.collector',
       tests_require=['nose'],
       packages=find_packages(),
@@ -1 +1,13 @@
 __version__ = '1.1.0'
+
+__all__ = ['convert', 'aconvert']
+
+
+def __getattr__(name):
+    # Imported on first use, so that importing the package for its version
+    # does not import rdflib
+    if name in __all__:
+        from spatial2ccf import api
+        return getattr(api, name)
+    raise AttributeError("module 'spatial2ccf' has no attribute '" +
+                         name + "'")
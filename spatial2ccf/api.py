@@ -0,0 +1,76 @@
+import asyncio
+
+from rdflib import OWL, RDF, URIRef
+
+from spatial2ccf.mapping import NO_CONTEXT
+from spatial2ccf.ontology import GRAPH_RECORD_TYPES, RECORD_TYPES, emitter
+from spatial2ccf.seen import SeenIndex
+from spatial2ccf.terms import TermFactory
+
+
+class Converter:
+    """Converter
+    Converts records one at a time into lists of triples, without a graph
+    or a writer. Object references and extraction sets shared by several
+    records are only converted for the first one, see SeenIndex
+    """
+    def __init__(self, ontology_iri=None, strict=False, terms=None):
+        self.ontology_iri = ontology_iri
+        self.terms = TermFactory() if terms is None else terms
+        self.seen = SeenIndex(strict)
+
+    def header(self):
+        """Returns the ontology declaration, if there is an ontology IRI
+        """
+        if self.ontology_iri is None:
+            return []
+        return [(URIRef(self.ontology_iri), RDF.type, OWL.Ontology)]
+
+    def convert(self, obj, record_types=RECORD_TYPES):
+        """Returns the triples of the record `obj`
+        """
+        triples = []
+        emitter(obj, record_types)(obj, NO_CONTEXT, self.terms, triples,
+                                   self.seen)
+        return triples
+
+
+def convert(records, ontology_iri=None, strict=False, terms=None):
+    """Yields the triples of the records, converted lazily as they are
+    taken from `records`, which is any iterable of RUI records or a JSON-LD
+    document with Donors in its '@graph'. With an ontology IRI the triples
+    start with the ontology declaration. The triples of a record are
+    yielded before the next record is taken
+    """
+    converter = Converter(ontology_iri, strict, terms)
+    records, record_types = _records(records)
+    yield from converter.header()
+    for obj in records:
+        yield from converter.convert(obj, record_types)
+
+
+async def aconvert(records, ontology_iri=None, strict=False, terms=None):
+    """Asynchronous variant of `convert`. The records can also come from
+    an asynchronous iterable, and the event loop gets control back after
+    every record
+    """
+    converter = Converter(ontology_iri, strict, terms)
+    for triple in converter.header():
+        yield triple
+    if hasattr(records, '__aiter__'):
+        async for obj in records:
+            for triple in converter.convert(obj):
+                yield triple
+            await asyncio.sleep(0)
+        return
+    records, record_types = _records(records)
+    for obj in records:
+        for triple in converter.convert(obj, record_types):
+            yield triple
+        await asyncio.sleep(0)
+
+
+def _records(data):
+    if isinstance(data, dict):
+        return data['@graph'], GRAPH_RECORD_TYPES
+    return data, RECORD_TYPES
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+# Headers of a request that must not be answered with 304 Not Modified
+UNCONDITIONAL = {'If-None-Match': None, 'If-Modified-Since': None}
+
+
+class HTTPCache:
+    """HTTP Cache
+    Keeps the bodies of remote inputs on disk together with their ETag and
+    Last-Modified headers. A cached input is revalidated with a conditional
+    request and reused when the server answers 304 Not Modified. The least
+    recently used entries are evicted once the cache grows over `max_size`
+    bytes. In offline mode no request is made at all
+    """
+    def __init__(self, directory, max_size=1 << 30, offline=False,
+                 chunk_size=1 << 16):
+        self.directory = directory
+        self.max_size = max_size
+        self.offline = offline
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def open(self, session, url):
+        """Returns the body of `url` as a binary file, downloading it only
+        when the cached copy is missing or out of date
+        """
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        meta = self._read_meta(key)
+        if self.offline:
+            body = self._open_body(key) if meta is not None else None
+            if body is None:
+                raise ValueError("Input <" + url + "> is not in the cache")
+            return body
+
+        # Validators set on the session are dropped, a 304 is only useful
+        # with a cached body
+        headers = dict(UNCONDITIONAL)
+        if meta is not None and os.path.exists(self._path(key, 'body')):
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+        with session.get(url, headers=headers, stream=True) as response:
+            if response.status_code == 304:
+                body = self._open_body(key) if headers != UNCONDITIONAL \
+                    else None
+                if body is not None:
+                    return body
+            else:
+                response.raise_for_status()
+                return self._store(key, url, response)
+        # A 304 without a cached body, e.g. evicted by another fetch thread
+        # since its metadata was read
+        with session.get(url, headers=UNCONDITIONAL, stream=True) as response:
+            response.raise_for_status()
+            if response.status_code == 304:
+                raise ValueError("Input <" + url + "> answered 304 Not "
+                                 "Modified to an unconditional request")
+            return self._store(key, url, response)
+
+    def _store(self, key, url, response):
+        fd, temp_path = tempfile.mkstemp(dir=self.directory,
+                                         suffix='.part')
+        size = 0
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in response.iter_content(self.chunk_size):
+                f.write(chunk)
+                size += len(chunk)
+        meta = {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'size': size
+        }
+        with self._lock:
+            os.replace(temp_path, self._path(key, 'body'))
+            with open(self._path(key, 'json'), 'w') as f:
+                json.dump(meta, f)
+            self._evict(keep=key)
+            return open(self._path(key, 'body'), 'rb')
+
+    def _open_body(self, key):
+        """Returns the cached body, or None when the entry was evicted
+        """
+        with self._lock:
+            try:
+                # The access time of an entry is the mtime of its metadata
+                os.utime(self._path(key, 'json'))
+                body = open(self._path(key, 'body'), 'rb')
+            except FileNotFoundError:
+                return None
+            self._evict(keep=key)
+            return body
+
+    def _read_meta(self, key):
+        # Under the lock, so that an entry being stored is read whole
+        with self._lock:
+            try:
+                with open(self._path(key, 'json')) as f:
+                    return json.load(f)
+            except FileNotFoundError:
+                return None
+
+    def _evict(self, keep):
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            key = name[:-len('.json')]
+            path = self._path(key, 'json')
+            with open(path) as f:
+                size = json.load(f)['size']
+            entries.append((os.path.getmtime(path), key, size))
+            total += size
+        for _, key, size in sorted(entries):
+            if total <= self.max_size:
+                break
+            if key == keep:
+                continue
+            os.remove(self._path(key, 'json'))
+            os.remove(self._path(key, 'body'))
+            total -= size
+
+    def _path(self, key, extension):
+        return os.path.join(self.directory, key + '.' + extension)
@@ -0,0 +1,209 @@
+import json
+import logging
+import os
+import pickle
+
+from spatial2ccf.ontology import SPOntology
+from spatial2ccf.seen import SeenIndex
+from spatial2ccf.writer import TripleList
+
+logger = logging.getLogger("spatial2ccf")
+
+CHECKPOINT_VERSION = 1
+
+# Errors of a malformed record, as opposed to I/O or programming errors
+RECORD_ERRORS = (ValueError, KeyError, TypeError)
+
+
+class CheckpointMutator:
+    """Checkpoint Mutator
+    Converts the records one at a time and keeps the position of the run,
+    as the index of the input and the offset of the record in it, in the
+    checkpoint file `checkpoint_path`. The triples added since the previous
+    checkpoint are appended to the file `checkpoint_path` + '.triples' as
+    pickled chunks every `every` records, at the end of every input and
+    when the run fails, so that a resumed run can add them back and skip
+    what was already converted. The checkpoint is only removed by `written`
+    once the outputs are complete, so that a run failing while writing them
+    resumes with nothing left to convert.
+
+    With a `quarantine_path` a record that cannot be converted is written
+    to that file as a JSON line, together with the error, instead of
+    failing the run. Every record is converted apart and only added once it
+    is complete, so that a failed record leaves nothing behind
+    """
+    def __init__(self, checkpoint_path=None, every=10000,
+                 quarantine_path=None, resume=False):
+        self.checkpoint_path = checkpoint_path
+        self.every = every
+        self.resume = resume
+        self.quarantine_path = quarantine_path
+        self.inputs = []
+        self.input_index = 0
+        self.offset = 0
+        self.quarantined = 0
+        self._o = None
+        self._pending = []
+        self._since_checkpoint = 0
+        self._triples_size = 0
+        self._quarantine = None
+
+    def __enter__(self):
+        if self.quarantine_path is not None:
+            self._quarantine = open(self.quarantine_path, 'a',
+                                    encoding='utf-8')
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._quarantine is not None:
+            self._quarantine.close()
+        if self.quarantined:
+            logger.warning("%d records quarantined to %s", self.quarantined,
+                           self.quarantine_path)
+        if self.checkpoint_path is None or self._o is None:
+            return
+        if exc_type is not None:
+            # Every record before the current one is complete
+            self.save()
+            logger.error("Checkpoint saved to %s at input %d, record %d",
+                         self.checkpoint_path, self.input_index,
+                         self.offset)
+
+    def written(self, outputs, context=None):
+        """Removes the checkpoint once the outputs are complete
+        """
+        if self.checkpoint_path is None:
+            return
+        for path in (self.checkpoint_path, self._triples_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    @property
+    def _triples_path(self):
+        return self.checkpoint_path + ".triples"
+
+    def restore(self, o, inputs):
+        """Starts the run on `inputs`. When resuming, adds the triples of the
+        checkpoint to `o` and returns the inputs that are left to convert
+        """
+        self.inputs = list(inputs)
+        self._o = o
+        if self.checkpoint_path is None:
+            return self.inputs
+        if not (self.resume and os.path.exists(self.checkpoint_path)):
+            if self.resume:
+                logger.info("No checkpoint at %s, starting from scratch",
+                            self.checkpoint_path)
+            with open(self._triples_path, 'wb'):
+                pass
+            return self.inputs
+        state = load_checkpoint(self.checkpoint_path)
+        if state['inputs'] != self.inputs:
+            raise ValueError("The checkpoint <" + self.checkpoint_path +
+                             "> was saved for other inputs")
+        self.input_index, self.offset = state['input'], state['offset']
+        self._triples_size = state['triples_size']
+        with open(self._triples_path, 'r+b') as f:
+            # Drop a chunk written after the last saved state
+            f.truncate(self._triples_size)
+            while f.tell() < self._triples_size:
+                o.extend(pickle.load(f))
+        o.seen.remember(state['seen'])
+        o.flush()
+        logger.info("Resuming from input %d, record %d",
+                    self.input_index, self.offset)
+        return self.inputs[self.input_index:]
+
+    def mutate(self, o, data):
+        """
+        """
+        self._o = o
+        if isinstance(data, dict):
+            records, wrap = data['@graph'], lambda r: {'@graph': [r]}
+        else:
+            records, wrap = data, lambda r: [r]
+        skip, self.offset = self.offset, 0
+        for record in records:
+            if self.offset < skip:
+                self.offset += 1
+                continue
+            try:
+                self._convert(o, wrap(record))
+            except RECORD_ERRORS as e:
+                if self._quarantine is None:
+                    raise
+                self._quarantine_record(record, e)
+            self.offset += 1
+            self._since_checkpoint += 1
+            if self.checkpoint_path is not None and \
+                    self._since_checkpoint >= self.every:
+                self.save()
+        self.input_index += 1
+        self.offset = 0
+        if self.checkpoint_path is not None:
+            self.save()
+        o.flush()
+        return o
+
+    def _convert(self, o, data):
+        triples = TripleList()
+        seen = SeenIndex(o.seen.strict, record_marks=True)
+        SPOntology(triples, o.terms, metrics=o.metrics,
+                   seen=seen).mutate(data)
+        kept = o.seen.merge(triples, seen.marks)
+        o.extend(kept)
+        if self.checkpoint_path is not None:
+            self._pending.extend(kept)
+
+    def _quarantine_record(self, record, error):
+        source = self.inputs[self.input_index] \
+            if self.input_index < len(self.inputs) else None
+        self._quarantine.write(json.dumps({
+            'input': source,
+            'offset': self.offset,
+            'error': repr(error),
+            'record': record
+        }) + "\n")
+        self.quarantined += 1
+        if self._o.metrics is not None:
+            self._o.metrics.count('records_quarantined')
+
+    def save(self):
+        """Appends the pending triples and saves the current position
+        """
+        if self._pending:
+            with open(self._triples_path, 'ab') as f:
+                pickle.dump(self._pending, f, pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+                self._triples_size = f.tell()
+            self._pending = []
+        save_checkpoint(self.checkpoint_path, {
+            'inputs': self.inputs,
+            'input': self.input_index,
+            'offset': self.offset,
+            'triples_size': self._triples_size,
+            'seen': self._o.seen.hashed()
+        })
+        self._since_checkpoint = 0
+
+
+def load_checkpoint(path):
+    with open(path, encoding='utf-8') as f:
+        state = json.load(f)
+    if state.get('version') != CHECKPOINT_VERSION:
+        raise ValueError("Unsupported checkpoint version <" +
+                         str(state.get('version')) + ">")
+    return state
+
+
+def save_checkpoint(path, state):
+    # Written next to the target first so that a crash while saving keeps
+    # the previous checkpoint intact
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(dict(state, version=CHECKPOINT_VERSION), f,
+                  separators=(',', ':'))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
@@ -0,0 +1,188 @@
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from spatial2ccf.namespace import CCF
+
+# Cells of the boolean block by term matrix used to drop repeated overlaps
+MAX_PAIR_MATRIX = 1 << 26
+
+
+class BoxTree:
+    """Box Tree
+    Bounding volume hierarchy over axis-aligned boxes, split at the median
+    of the box centers along the widest axis until at most `leaf_size`
+    boxes are left. The nodes are kept in flat arrays, so that a batch of
+    query boxes walks down the tree together, one level per step
+    """
+    def __init__(self, low, high, leaf_size=4):
+        if np is None:
+            raise ImportError("The box tree requires NumPy, install "
+                              "spatial2ccf[spatial]")
+        self.low = np.asarray(low, dtype=float)
+        self.high = np.asarray(high, dtype=float)
+        self.items = np.arange(len(self.low))
+        centers = (self.low + self.high) / 2
+        node_low, node_high, first, count, left = [], [], [], [], []
+        # Nodes are numbered in preorder, so the left child of a node is
+        # the next node
+        pending = [(0, len(self.items))] if len(self.items) else []
+        while pending:
+            start, end = pending.pop()
+            node = len(first)
+            items = self.items[start:end]
+            node_low.append(self.low[items].min(axis=0))
+            node_high.append(self.high[items].max(axis=0))
+            first.append(start)
+            count.append(end - start)
+            left.append(-1)
+            if end - start <= leaf_size:
+                continue
+            spread = centers[items].max(axis=0) - centers[items].min(axis=0)
+            axis = int(np.argmax(spread))
+            middle = (end - start) // 2
+            order = np.argpartition(centers[items, axis], middle)
+            self.items[start:end] = items[order]
+            left[node] = node + 1
+            pending.append((start + middle, end))
+            pending.append((start, start + middle))
+        self.node_low = np.array(node_low).reshape(-1, 3)
+        self.node_high = np.array(node_high).reshape(-1, 3)
+        self.first = np.array(first, dtype=int)
+        self.count = np.array(count, dtype=int)
+        self.left = np.array(left, dtype=int)
+        self.right = self._right_children()
+
+    def _right_children(self):
+        # The right child of a node comes right after the subtree of its
+        # left child
+        right = np.full(len(self.left), -1)
+        sizes = np.ones(len(self.left), dtype=int)
+        for node in range(len(self.left) - 1, -1, -1):
+            if self.left[node] >= 0:
+                child = self.left[node]
+                right[node] = child + sizes[child]
+                sizes[node] = 1 + sizes[child] + sizes[right[node]]
+        return right
+
+    def query(self, low, high):
+        """Returns the pairs (query, item) of the query boxes and the tree
+        boxes that overlap, as two index arrays
+        """
+        low = np.asarray(low, dtype=float)
+        high = np.asarray(high, dtype=float)
+        if not len(self.left) or not len(low):
+            return np.empty(0, dtype=int), np.empty(0, dtype=int)
+        queries = np.arange(len(low))
+        nodes = np.zeros(len(low), dtype=int)
+        found_queries, found_items = [], []
+        while len(queries):
+            overlap = _overlap(low[queries], high[queries],
+                               self.node_low[nodes], self.node_high[nodes])
+            queries, nodes = queries[overlap], nodes[overlap]
+            leaf = self.left[nodes] < 0
+
+            leaf_queries, leaf_nodes = queries[leaf], nodes[leaf]
+            counts = self.count[leaf_nodes]
+            pair_queries = np.repeat(leaf_queries, counts)
+            offsets = np.arange(counts.sum()) - \
+                np.repeat(np.cumsum(counts) - counts, counts)
+            pair_items = self.items[np.repeat(self.first[leaf_nodes],
+                                              counts) + offsets]
+            hit = _overlap(low[pair_queries], high[pair_queries],
+                           self.low[pair_items], self.high[pair_items])
+            found_queries.append(pair_queries[hit])
+            found_items.append(pair_items[hit])
+
+            inner_queries, inner_nodes = queries[~leaf], nodes[~leaf]
+            queries = np.concatenate([inner_queries, inner_queries])
+            nodes = np.concatenate([self.left[inner_nodes],
+                                    self.right[inner_nodes]])
+        return np.concatenate(found_queries), np.concatenate(found_items)
+
+
+def find_collisions(table, collector, mode='missing', metrics=None):
+    """Yields the collides_with triples between the placed entities that
+    do not represent an anatomical structure (e.g. tissue blocks) and the
+    structures whose world bounding boxes they overlap in the same
+    reference frame. In 'missing' mode only the entities without
+    annotations get triples, in 'all' mode every entity gets the ones its
+    annotations miss and the existing annotations are checked against the
+    computed ones
+    """
+    entities = collector.entities
+    finite = np.isfinite(table.aabb_min).all(axis=1)
+    structures, blocks = {}, {}
+    for i, node in enumerate(table.nodes):
+        if not finite[i] or table.roots[i] is None:
+            continue
+        values = entities.get(node)
+        if values is None:
+            continue
+        group = structures if 'representation_of' in values else blocks
+        group.setdefault(table.roots[i], []).append(i)
+
+    added = confirmed = unconfirmed = 0
+    for root, block_rows in blocks.items():
+        terms, starts, codes = _overlapping(table, entities, block_rows,
+                                            structures.get(root))
+        for query, row in enumerate(block_rows):
+            block = table.nodes[row]
+            # Codes follow the order of the terms, sorted by IRI
+            computed = [terms[code] for code in
+                        codes[starts[query]:starts[query + 1]]]
+            existing = collector.annotations.get(block)
+            if existing:
+                computed_set = set(computed)
+                confirmed += len(existing & computed_set)
+                unconfirmed += len(existing - computed_set)
+                if mode != 'all':
+                    continue
+                # Only the missing ones, the others are in the input already
+                computed = [structure for structure in computed
+                            if structure not in existing]
+            added += len(computed)
+            for structure in computed:
+                yield block, CCF.collides_with, structure
+    if metrics is not None:
+        metrics.count('collisions_added', added)
+        metrics.count('collisions_confirmed', confirmed)
+        metrics.count('collisions_unconfirmed', unconfirmed)
+
+
+def _overlapping(table, entities, block_rows, structure_rows):
+    """Returns the representation_of terms of the structures, sorted by
+    IRI, and for every block the codes of the terms it overlaps, as the
+    block's slice codes[starts[i]:starts[i + 1]] of distinct sorted codes
+    """
+    if not structure_rows:
+        return [], [0] * (len(block_rows) + 1), []
+    structure_rows = np.array(structure_rows)
+    representations = [entities[table.nodes[row]]['representation_of']
+                       for row in structure_rows.tolist()]
+    terms = sorted(set(representations), key=str)
+    code_of = {term: code for code, term in enumerate(terms)}
+    structure_codes = np.array([code_of[term] for term in representations],
+                               dtype=np.int64)
+    tree = BoxTree(table.aabb_min[structure_rows],
+                   table.aabb_max[structure_rows])
+    queries, items = tree.query(table.aabb_min[block_rows],
+                                table.aabb_max[block_rows])
+    # One (block, term) pair per distinct overlap, ordered by block, marked
+    # in a block by term matrix when it is small enough, since that is
+    # faster than sorting the pairs
+    codes = structure_codes[items]
+    if len(block_rows) * len(terms) <= MAX_PAIR_MATRIX:
+        matrix = np.zeros((len(block_rows), len(terms)), dtype=bool)
+        matrix[queries, codes] = True
+        pair_queries, pair_codes = np.nonzero(matrix)
+    else:
+        pairs = np.unique(queries.astype(np.int64) * len(terms) + codes)
+        pair_queries, pair_codes = np.divmod(pairs, len(terms))
+    starts = np.searchsorted(pair_queries, np.arange(len(block_rows) + 1))
+    return terms, starts.tolist(), pair_codes.tolist()
+
+
+def _overlap(low, high, other_low, other_high):
+    return ((low <= other_high) & (high >= other_low)).all(axis=1)
@@ -0,0 +1,180 @@
+import bz2
+import gzip
+import io
+import lzma
+import os
+import queue
+import sys
+import threading
+import zlib
+
+COMPRESSIONS = ['gzip', 'bz2', 'xz']
+
+EXTENSIONS = {
+    '.gz': 'gzip',
+    '.bz2': 'bz2',
+    '.xz': 'xz',
+}
+
+MAGIC_NUMBERS = [
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bz2'),
+    (b'\xfd7zXZ\x00', 'xz'),
+]
+
+
+def detect(head):
+    """Returns the compression of data starting with the bytes `head`, or
+    None when it is not compressed
+    """
+    for magic, compression in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def compression_for(path):
+    """Returns the compression implied by the extension of `path`
+    """
+    if path is None:
+        return None
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+
+def open_input(fp):
+    """Returns the binary stream `fp`, decompressed on the fly when it
+    starts with the magic number of gzip, bzip2 or xz data. This also
+    covers HTTP bodies with a Content-Encoding that requests does not
+    decode itself, such as xz
+    """
+    if not hasattr(fp, 'peek'):
+        fp = io.BufferedReader(fp)
+    compression = detect(fp.peek(6))
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=fp, mode='rb')
+    elif compression == 'bz2':
+        return bz2.BZ2File(fp, mode='rb')
+    elif compression == 'xz':
+        return lzma.LZMAFile(fp, mode='rb')
+    return fp
+
+
+def decompress(data):
+    """Returns the bytes `data`, decompressed when they are compressed
+    """
+    compression = detect(data[:6])
+    if compression == 'gzip':
+        return gzip.decompress(data)
+    elif compression == 'bz2':
+        return bz2.decompress(data)
+    elif compression == 'xz':
+        return lzma.decompress(data)
+    return data
+
+
+def open_output(destination, compression=None, buffer_size=1 << 16):
+    """Opens `destination` for writing bytes, compressed with the given
+    compression or else with the one implied by its extension. Without a
+    destination the compressed bytes go to the standard output
+    """
+    if compression is None:
+        compression = compression_for(destination)
+    if destination is None:
+        fileobj, owns_fileobj = sys.stdout.buffer, False
+    else:
+        fileobj = open(destination, 'wb', buffering=buffer_size)
+        owns_fileobj = True
+    if compression is None:
+        return fileobj
+    return CompressedStream(fileobj, compression, owns_fileobj)
+
+
+class CompressedStream(io.BufferedIOBase):
+    """Compressed Stream
+    Write-only stream that compresses the bytes written to it on a
+    background thread, so that the compression overlaps with the
+    conversion. The bytes are handed over in chunks of `chunk_size` bytes
+    through a queue of at most `max_pending` chunks. An error raised by the
+    background thread is raised again by the next write or by close
+    """
+    def __init__(self, fileobj, compression, close_fileobj=True,
+                 chunk_size=1 << 20, max_pending=8):
+        if compression not in COMPRESSIONS:
+            raise ValueError("Unsupported compression <" +
+                             compression + ">")
+        self.fileobj = fileobj
+        self.compression = compression
+        self.close_fileobj = close_fileobj
+        self.chunk_size = chunk_size
+        self._pending = []
+        self._pending_size = 0
+        self._queue = queue.Queue(max_pending)
+        self._error = None
+        self._thread = threading.Thread(target=self._compress, daemon=True)
+        self._thread.start()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        if self._error is not None:
+            raise self._error
+        size = len(b)
+        self._pending.append(bytes(b))
+        self._pending_size += size
+        if self._pending_size >= self.chunk_size:
+            self._hand_over()
+        return size
+
+    def flush(self):
+        # The background thread writes on its own schedule
+        if self._pending:
+            self._hand_over()
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self.flush()
+            self._queue.put(None)
+            self._thread.join()
+        finally:
+            if self.close_fileobj:
+                self.fileobj.close()
+            else:
+                self.fileobj.flush()
+            super().close()
+        if self._error is not None:
+            raise self._error
+
+    def _hand_over(self):
+        self._queue.put(b''.join(self._pending))
+        self._pending = []
+        self._pending_size = 0
+
+    def _compress(self):
+        compressor = _compressor(self.compression)
+        while True:
+            chunk = self._queue.get()
+            if self._error is not None:
+                # Keep draining the queue so that writers never block
+                if chunk is None:
+                    return
+                continue
+            try:
+                if chunk is None:
+                    self.fileobj.write(compressor.flush())
+                    return
+                self.fileobj.write(compressor.compress(chunk))
+            except Exception as e:
+                self._error = e
+                if chunk is None:
+                    return
+
+
+def _compressor(compression):
+    if compression == 'gzip':
+        return zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    elif compression == 'bz2':
+        return bz2.BZ2Compressor(9)
+    return lzma.LZMACompressor(lzma.FORMAT_XZ)
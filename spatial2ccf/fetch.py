@@ -0,0 +1,101 @@
+import json
+import os
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from os.path import exists
+
+from spatial2ccf import reader
+from spatial2ccf.compression import decompress
+
+
+def open_session(max_connections=1):
+    """Returns a session that keeps up to `max_connections` keep-alive
+    connections per host and blocks instead of opening more
+    """
+    # Imported here, since requests takes longer to import than converting
+    # a small local input
+    import requests
+    from requests.adapters import HTTPAdapter
+    from requests_file import FileAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=max_connections, pool_block=True)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.mount('file://', FileAdapter())
+    return session
+
+
+def iter_documents(session, urls, jobs=1, cache=None, metrics=None):
+    """Yields the parsed input documents in the order of `urls`.
+    With a single job each document is parsed lazily while it is being
+    converted. With more jobs, up to `jobs` documents are fetched and parsed
+    concurrently and each one is handed over as soon as it and all the
+    documents before it have arrived. Remote documents go through the
+    HTTP cache when one is given. Compressed inputs are decompressed on the
+    fly. The bytes read are counted as
+    'bytes_read' in the metrics when they are given.
+    """
+    if jobs <= 1:
+        for url in urls:
+            yield from _iter_lazy_document(session, url, cache, metrics)
+        return
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        for url in urls:
+            pending.append(executor.submit(fetch_document, session, url,
+                                           cache, metrics))
+            if len(pending) > jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _iter_lazy_document(session, url, cache, metrics):
+    if is_local(url):
+        with open(urlparse(url).path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            yield reader.load(reader.open_text(f))
+    elif cache is not None:
+        with cache.open(session, url) as f:
+            size = os.fstat(f.fileno()).st_size
+            yield reader.load(reader.open_text(f))
+    else:
+        with session.get(url, stream=True) as response:
+            response.raise_for_status()
+            yield reader.load(reader.iter_content(response))
+            size = response.raw.tell()
+    if metrics is not None:
+        metrics.count('bytes_read', size)
+
+
+def fetch_document(session, url, cache=None, metrics=None):
+    """Fetches and fully parses a single input document
+    """
+    if is_local(url):
+        with open(urlparse(url).path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            data = json.load(reader.open_text(f))
+    elif cache is not None:
+        with cache.open(session, url) as f:
+            size = os.fstat(f.fileno()).st_size
+            data = json.load(reader.open_text(f))
+    else:
+        response = session.get(url)
+        response.raise_for_status()
+        # Content-Encoding gzip and deflate are already decoded by requests
+        data = json.loads(decompress(response.content))
+        size = len(response.content)
+    if metrics is not None:
+        metrics.count('bytes_read', size)
+    return data
+
+
+def is_local(url):
+    url_parsed = urlparse(url)
+    if url_parsed.scheme in ('file', ''):
+        return exists(url_parsed.path)
+    return False
@@ -0,0 +1,349 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+
+from collections import Counter
+from functools import lru_cache
+from urllib.parse import urlparse
+
+from spatial2ccf.compression import compression_for
+from spatial2ccf.fetch import is_local
+from spatial2ccf.ontology import SPOntology
+from spatial2ccf.seen import SeenIndex, content_hash, without
+from spatial2ccf.writer import NQuadsWriter, NTriplesWriter, TripleList
+from spatial2ccf.writer import nt_row, nt_term
+
+logger = logging.getLogger("spatial2ccf")
+
+MANIFEST_VERSION = 2
+
+# The records of the previous run by key, with the input they came from and
+# the range of their rows in its output, and their rows by content hash,
+# so that records with the same content share their rows
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS records (key TEXT PRIMARY KEY, "
+    "hash TEXT NOT NULL, input TEXT, position INTEGER, "
+    "span_start INTEGER, span_length INTEGER) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS records_input ON records (input, position)",
+    "CREATE TABLE IF NOT EXISTS rows (hash TEXT PRIMARY KEY, "
+    "nt TEXT NOT NULL, shared TEXT) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS inputs (url TEXT PRIMARY KEY, "
+    "size INTEGER, mtime INTEGER) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS outputs (path TEXT PRIMARY KEY, "
+    "format TEXT, context TEXT, size INTEGER, mtime INTEGER) WITHOUT ROWID",
+]
+
+# The records and inputs of the current run, which replace those of the
+# previous run once it succeeds
+RUN_SCHEMA = [
+    "CREATE TEMP TABLE records_next (key TEXT PRIMARY KEY, "
+    "hash TEXT NOT NULL, input TEXT, position INTEGER, "
+    "span_start INTEGER, span_length INTEGER) WITHOUT ROWID",
+    "CREATE TEMP TABLE inputs_next (url TEXT PRIMARY KEY, "
+    "size INTEGER, mtime INTEGER) WITHOUT ROWID",
+]
+
+NT_ROW_PATTERN = re.compile(
+    r'<([^>]*)> <([^>]*)> (?:<([^>]*)>|"(.*)"(?:\^\^<([^>]*)>)?) \.$')
+NT_ESCAPE_PATTERN = re.compile(r'\\(.)')
+NT_ESCAPES = {'\\': '\\', 'n': '\n', '"': '"', 'r': '\r'}
+
+
+class IncrementalMutator:
+    """Incremental Mutator
+    Keeps a manifest, an SQLite database, that maps the '@id' of every
+    top-level record to the hash of its content, and the hash to the
+    triples it produced as N-Triples rows. Records whose hash did not
+    change since the previous run are not converted again, their rows are
+    taken from the manifest instead. Records that are no longer in the
+    input are dropped from the manifest, and so from the output. The rows
+    of a record always include its shared subtrees, together with their
+    ranges, so that they can be left out when an earlier record has already
+    added them. The manifest is looked up record by record and the new one
+    is only written over the previous one when the run succeeds.
+
+    A local input whose size and modification time did not change is not
+    read at all: its records are taken from the manifest in their previous
+    order, see `reuse`. When the output is streamed to the same
+    uncompressed N-Triples or N-Quads file as in the previous run, the rows
+    of an unchanged record are copied from the previous output, see
+    `keep_output`
+    """
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+        self.connection = None
+        self.inputs = []
+        self.unchanged = set()
+        self.converted = 0
+        self.reused = 0
+        self.removed = 0
+        self._index = 0
+        self._input = None
+        self._position = 0
+        self._spans = False
+        self._previous_path = None
+        self._previous = None
+        self._term = lru_cache(maxsize=1 << 16)(nt_term)
+
+    def __enter__(self):
+        self.connection = open_manifest(self.manifest_path)
+        self.connection.execute("BEGIN")
+        for statement in RUN_SCHEMA:
+            self.connection.execute(statement)
+        # Written again by `written` once the output is complete
+        self.connection.execute("DELETE FROM outputs")
+        if self._previous_path is not None:
+            self._previous = open(self._previous_path, 'rb')
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self._commit()
+                logger.info("%d records converted, %d reused, %d removed",
+                            self.converted, self.reused, self.removed)
+            else:
+                self.connection.execute("ROLLBACK")
+        finally:
+            self.connection.close()
+            self.connection = None
+            if self._previous is not None:
+                self._previous.close()
+                self._previous = None
+            if self._previous_path is not None:
+                if exc_type is None:
+                    os.remove(self._previous_path)
+                else:
+                    # The manifest still describes the previous output
+                    os.replace(self._previous_path,
+                               self._previous_path[:-len(".previous")])
+
+    def keep_output(self, destination, format, context=None,
+                    compression=None):
+        """Keeps the output of the previous run aside, before it is
+        overwritten, when it is the uncompressed N-Triples or N-Quads file
+        the manifest was written with, so that the rows of the unchanged
+        records can be copied from it
+        """
+        if destination is None or format not in ('nt', 'nq') or \
+                compression is not None or compression_for(destination) or \
+                not os.path.exists(destination) or \
+                not os.path.exists(self.manifest_path):
+            return
+        connection = open_manifest(self.manifest_path)
+        try:
+            previous = connection.execute(
+                "SELECT format, context, size, mtime FROM outputs "
+                "WHERE path = ?", (os.path.abspath(destination),)).fetchone()
+        finally:
+            connection.close()
+        stat = os.stat(destination)
+        if previous != (format, str(context or ''), stat.st_size,
+                        stat.st_mtime_ns):
+            return
+        self._previous_path = destination + ".previous"
+        os.replace(destination, self._previous_path)
+
+    def written(self, outputs, context=None):
+        """Records the output once it is complete, so that the next run can
+        copy the rows of the unchanged records from it
+        """
+        if not self._spans or len(outputs) != 1:
+            return
+        destination, format = outputs[0]
+        stat = os.stat(destination)
+        connection = open_manifest(self.manifest_path)
+        try:
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?, ?)",
+                    (os.path.abspath(destination), format,
+                     str(context or ''), stat.st_size, stat.st_mtime_ns))
+        finally:
+            connection.close()
+
+    def restore(self, o, inputs):
+        """Starts the run on `inputs` and finds the local inputs that did
+        not change since the previous run
+        """
+        self.inputs = list(inputs)
+        # Byte ranges are only meaningful in a single uncompressed file
+        self._spans = type(o.graph) in (NTriplesWriter, NQuadsWriter) and \
+            o.graph.position() is not None
+        counts = Counter(self.inputs)
+        for url in self.inputs:
+            # An input given twice cannot be told apart in the manifest
+            if counts[url] > 1 or not is_local(url):
+                continue
+            stat = os.stat(urlparse(url).path)
+            fingerprint = (url, stat.st_size, stat.st_mtime_ns)
+            self.connection.execute(
+                "INSERT INTO inputs_next VALUES (?, ?, ?)", fingerprint)
+            previous = self.connection.execute(
+                "SELECT url, size, mtime FROM inputs WHERE url = ?",
+                (url,)).fetchone()
+            if previous == fingerprint:
+                self.unchanged.add(url)
+        return self.inputs
+
+    def reuse(self, o, url):
+        """Adds the records of the unchanged input `url` from the manifest,
+        in the order they had, without reading the input
+        """
+        self._next_input()
+        records = self.connection.execute(
+            "SELECT key, hash, span_start, span_length FROM records "
+            "WHERE input = ? ORDER BY position", (url,))
+        for key, digest, offset, length in records:
+            self._reuse(o, self._unique(key), digest, offset, length)
+        o.flush()
+        return o
+
+    def mutate(self, o, data):
+        """
+        """
+        self._next_input()
+        if isinstance(data, dict):
+            records, wrap = data['@graph'], lambda r: {'@graph': [r]}
+        else:
+            records, wrap = data, lambda r: [r]
+        for record in records:
+            key = self._unique(record.get('@id') or content_hash(record))
+            digest = content_hash(record)
+            previous = self.connection.execute(
+                "SELECT span_start, span_length FROM records "
+                "WHERE key = ? AND hash = ?", (key, digest)).fetchone()
+            if previous is not None:
+                self._reuse(o, key, digest, *previous)
+                continue
+            triples = TripleList()
+            seen = SeenIndex(o.seen.strict, record_marks=True)
+            SPOntology(triples, o.terms, metrics=o.metrics,
+                       seen=seen).mutate(wrap(record))
+            rows = ''.join(nt_row(triple, self._term) for triple in triples)
+            marks = seen.marks
+            self.connection.execute(
+                "INSERT OR IGNORE INTO rows VALUES (?, ?, ?)",
+                (digest, rows, json.dumps(marks) if marks else None))
+            dropped = o.seen.drop(marks)
+            start = self._start(o)
+            o.extend(without(triples, dropped))
+            self._add(o, key, digest, None if dropped else start)
+            self.converted += 1
+        o.flush()
+        return o
+
+    def _reuse(self, o, key, digest, offset, length):
+        shared = self.connection.execute(
+            "SELECT shared FROM rows WHERE hash = ?", (digest,)).fetchone()[0]
+        dropped = o.seen.drop(json.loads(shared) if shared else None)
+        start = self._start(o)
+        if self._previous is not None and offset is not None and \
+                not dropped:
+            o.graph.copy(self._previous, offset, length)
+        else:
+            rows = self.connection.execute(
+                "SELECT nt FROM rows WHERE hash = ?", (digest,)).fetchone()[0]
+            if hasattr(o.graph, 'add_rows'):
+                o.flush()
+                o.graph.add_rows('\n'.join(without(rows.split('\n'),
+                                                   dropped)))
+            else:
+                o.extend(without(parse_rows(rows, o.terms), dropped))
+        self._add(o, key, digest, None if dropped else start)
+        self.reused += 1
+        if o.metrics is not None:
+            o.metrics.count('records_reused')
+
+    def _start(self, o):
+        if not self._spans:
+            return None
+        o.flush()
+        return o.graph.position()
+
+    def _add(self, o, key, digest, start):
+        length = None
+        if start is not None:
+            o.flush()
+            length = o.graph.position() - start
+        self.connection.execute(
+            "INSERT INTO records_next VALUES (?, ?, ?, ?, ?, ?)",
+            (key, digest, self._input, self._position, start, length))
+        self._position += 1
+
+    def _next_input(self):
+        self._input = self.inputs[self._index] \
+            if self._index < len(self.inputs) else None
+        self._index += 1
+
+    def _unique(self, key):
+        if self._taken(key):
+            # Repeated records are kept apart by their occurrence number
+            occurrence = 2
+            while self._taken(key + " " + str(occurrence)):
+                occurrence += 1
+            key = key + " " + str(occurrence)
+        return key
+
+    def _taken(self, key):
+        return self.connection.execute(
+            "SELECT 1 FROM records_next WHERE key = ?", (key,)).fetchone() \
+            is not None
+
+    def _commit(self):
+        execute = self.connection.execute
+        self.removed = execute(
+            "SELECT COUNT(*) FROM records WHERE key NOT IN "
+            "(SELECT key FROM records_next)").fetchone()[0]
+        execute("DELETE FROM records")
+        execute("INSERT INTO records SELECT * FROM records_next")
+        execute("DELETE FROM inputs")
+        execute("INSERT INTO inputs SELECT * FROM inputs_next")
+        execute("DELETE FROM rows WHERE hash NOT IN "
+                "(SELECT hash FROM records)")
+        execute("COMMIT")
+
+
+def open_manifest(path):
+    """Opens the manifest database at `path`, creating it when missing
+    """
+    connection = sqlite3.connect(path, isolation_level=None)
+    try:
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, MANIFEST_VERSION):
+            raise ValueError("Unsupported manifest version <" +
+                             str(version) + ">")
+        for statement in SCHEMA:
+            connection.execute(statement)
+        connection.execute("PRAGMA user_version = %d" % MANIFEST_VERSION)
+    except sqlite3.DatabaseError:
+        connection.close()
+        raise ValueError("Unsupported manifest <" + path + ">")
+    except ValueError:
+        connection.close()
+        raise
+    return connection
+
+
+def parse_rows(rows, terms):
+    """Parses N-Triples rows as written by this tool back into triples
+    """
+    triples = []
+    if not rows:
+        return triples
+    for row in rows[:-1].split('\n'):
+        s, p, iri, lexical, datatype = NT_ROW_PATTERN.match(row).groups()
+        if iri is not None:
+            o = terms.iri(iri)
+        else:
+            if '\\' in lexical:
+                lexical = NT_ESCAPE_PATTERN.sub(
+                    lambda m: NT_ESCAPES[m.group(1)], lexical)
+            if datatype is None:
+                o = terms.string(lexical)
+            else:
+                o = terms.literal(lexical, None, terms.iri(datatype))
+        triples.append((terms.iri(s), terms.iri(p), o))
+    return triples
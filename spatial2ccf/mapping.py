@@ -0,0 +1,322 @@
+from operator import attrgetter
+
+from spatial2ccf.namespace import CCF
+
+from rdflib import OWL, RDF, RDFS, DCTERMS
+
+# Term kinds, named after the TermFactory method that builds them
+IRI = 'iri'
+STRING = 'string'
+INTEGER = 'integer'
+DECIMAL = 'decimal'
+DATE = 'date'
+INSTANCE = 'instance_iri'
+ANATOMICAL_ENTITY = 'anatomical_entity_iri'
+
+
+class Type:
+    """Adds an rdf:type to every record"""
+    def __init__(self, rdf_type):
+        self.rdf_type = rdf_type
+
+
+class Field:
+    """Maps the value of a record key to a predicate.
+    A required field raises KeyError when the key is missing. An optional
+    field is skipped when the key is missing or the term is empty. With
+    `many`, a list value gives one triple per item, and with `ref` the
+    value is a nested object whose '@id' is used
+    """
+    def __init__(self, key, predicate, kind, required=False, many=False,
+                 ref=False):
+        self.key = key
+        self.predicate = predicate
+        self.kind = kind
+        self.required = required
+        self.many = many
+        self.ref = ref
+
+
+class Derived:
+    """Maps a value computed from the record by `function(obj, terms)`"""
+    def __init__(self, predicate, function):
+        self.predicate = predicate
+        self.function = function
+
+
+class Context:
+    """Maps a value given by the parent record, e.g. the publisher, or
+    computed by `fallback(obj, terms)` when the parent gives none"""
+    def __init__(self, name, predicate, fallback=None):
+        self.name = name
+        self.predicate = predicate
+        self.fallback = fallback
+
+
+class Child:
+    """Converts a nested record (or list of records) with another mapping,
+    passing on the subject as 'source' and the listed context values"""
+    def __init__(self, key, mapping, many=False, required=False,
+                 pass_source=False, pass_context=()):
+        self.key = key
+        self.mapping = mapping
+        self.many = many
+        self.required = required
+        self.pass_source = pass_source
+        self.pass_context = pass_context
+
+
+def _creator(obj, terms):
+    return terms.string(str(terms.string(obj['creator_first_name'])) + " " +
+                        str(terms.string(obj['creator_last_name'])))
+
+
+def _file_name(obj, terms):
+    return terms.string(str(terms.string(obj['file'])).split("/")[-1])
+
+
+def _placement_source(obj, terms):
+    return terms.instance_iri(obj['source'] if 'source' in obj
+                              else obj['target'])
+
+
+MAPPINGS = {
+    'SpatialEntity': [
+        Type(OWL.NamedIndividual),
+        Type(CCF.SpatialEntity),
+        Field('representation_of', RDF.type, ANATOMICAL_ENTITY),
+        Field('label', RDFS.label, STRING),
+        Field('creator_first_name', CCF.creator_first_name, STRING,
+              required=True),
+        Field('creator_last_name', CCF.creator_last_name, STRING,
+              required=True),
+        Derived(DCTERMS.creator, _creator),
+        Field('creator_orcid', CCF.creator_orcid, STRING),
+        Field('creation_date', DCTERMS.created, DATE, required=True),
+        Field('ccf_annotations', CCF.collides_with, IRI, many=True),
+        Field('x_dimension', CCF.x_dimension, DECIMAL, required=True),
+        Field('y_dimension', CCF.y_dimension, DECIMAL, required=True),
+        Field('z_dimension', CCF.z_dimension, DECIMAL, required=True),
+        Field('dimension_units', CCF.dimension_unit, STRING, required=True),
+        Field('sex', CCF.organ_owner_sex, STRING),
+        Field('side', CCF.organ_side, STRING),
+        Field('object', CCF.has_object_reference, INSTANCE, ref=True),
+        Field('placement', CCF.has_placement, INSTANCE, many=True, ref=True),
+        Field('reference_organ', CCF.has_reference_organ, INSTANCE),
+        Field('representation_of', CCF.representation_of, ANATOMICAL_ENTITY),
+        Field('extraction_set', CCF.has_extraction_set, INSTANCE),
+        Field('rui_rank', CCF.rui_rank, INTEGER),
+        Context('publisher', DCTERMS.publisher),
+        # Only RUI data have 'spatial object reference' information
+        Child('object', 'SpatialObjectReference'),
+        Child('placement', 'SpatialPlacement', many=True, pass_source=True,
+              pass_context=('publisher',)),
+    ],
+    'RetiredSpatialEntity': [
+        Type(OWL.NamedIndividual),
+        Type(CCF.RetiredSpatialEntity),
+        Field('representation_of', CCF.representation_of, ANATOMICAL_ENTITY,
+              required=True),
+    ],
+    'SpatialObjectReference': [
+        Type(OWL.NamedIndividual),
+        Type(CCF.SpatialObjectReference),
+        Field('file', CCF.file_url, STRING, required=True),
+        Derived(CCF.file_name, _file_name),
+        Field('file_format', CCF.file_format, STRING, required=True),
+        Field('file_subpath', CCF.file_subpath, STRING),
+        Child('placement', 'SpatialPlacement', required=True,
+              pass_source=True),
+    ],
+    'SpatialPlacement': [
+        Type(OWL.NamedIndividual),
+        Type(CCF.SpatialPlacement),
+        Field('target', CCF.placement_relative_to, INSTANCE, required=True),
+        Context('source', CCF.placement_for, fallback=_placement_source),
+        Field('x_scaling', CCF.x_scaling, DECIMAL, required=True),
+        Field('y_scaling', CCF.y_scaling, DECIMAL, required=True),
+        Field('z_scaling', CCF.z_scaling, DECIMAL, required=True),
+        Field('scaling_units', CCF.scaling_unit, STRING, required=True),
+        Field('x_rotation', CCF.x_rotation, DECIMAL, required=True),
+        Field('y_rotation', CCF.y_rotation, DECIMAL, required=True),
+        Field('z_rotation', CCF.z_rotation, DECIMAL, required=True),
+        Field('rotation_units', CCF.rotation_unit, STRING, required=True),
+        Field('rotation_order', CCF.rotation_order, STRING),
+        Field('x_translation', CCF.x_translation, DECIMAL, required=True),
+        Field('y_translation', CCF.y_translation, DECIMAL, required=True),
+        Field('z_translation', CCF.z_translation, DECIMAL, required=True),
+        Field('translation_units', CCF.translation_unit, STRING,
+              required=True),
+        Field('placement_date', DCTERMS.created, DATE, required=True),
+        Context('publisher', DCTERMS.publisher),
+    ],
+    'ExtractionSet': [
+        Type(OWL.NamedIndividual),
+        Type(CCF.ExtractionSet),
+        Field('label', RDFS.label, STRING, required=True),
+        Field('label', CCF.consortium_name, STRING, required=True),
+        Field('extraction_set_for', CCF.extraction_set_for, INSTANCE,
+              required=True),
+        Field('rui_rank', CCF.rui_rank, INTEGER, required=True),
+    ],
+}
+
+# Subtrees shared between records, converted only once per key when a
+# SeenIndex is given. Placements are left out: nearly every one belongs to
+# a single entity, so keying them would only grow the index
+SHARED = {'SpatialObjectReference', 'ExtractionSet'}
+
+NO_CONTEXT = {}
+
+
+def compile_mappings(mappings=MAPPINGS, shared=SHARED):
+    """Compiles the mapping table into one emitter function per type.
+    An emitter is called as `emit(obj, context, terms, out, seen)` and
+    extends `out` with the triples of the record, followed by those of its
+    nested records. The types in `shared` are skipped when `seen`, a
+    SeenIndex, already holds them
+    """
+    emitters = {}
+    for name, items in mappings.items():
+        emitters[name] = _compile(items, emitters, name in shared)
+    emitters['Donor'] = _compile_donor(emitters)
+    return emitters
+
+
+def _compile_donor(emitters):
+    spatial_entity = emitters['SpatialEntity']
+
+    def emit(obj, context, terms, out, seen=None):
+        publisher = None
+        if 'consortium_name' in obj:
+            publisher = terms.string(obj['consortium_name'])
+        context = {'publisher': publisher}
+        for sample in obj.get('samples', ()):
+            if 'rui_location' not in sample:
+                continue
+            sample_id = terms.iri(sample['@id'])
+            registration_location = sample['rui_location']
+            out.extend(((terms.iri(registration_location['@id']),
+                         CCF.represents_bbox_of, sample_id),))
+            spatial_entity(registration_location, context, terms, out, seen)
+    return emit
+
+
+def _compile(items, emitters, shared=False):
+    steps = [_compile_step(item) for item in items
+             if not isinstance(item, Child)]
+    children = [_compile_child(item, emitters) for item in items
+                if isinstance(item, Child)]
+
+    def convert(obj, subject, context, terms, out, seen):
+        # All the values are built before the first triple is added, so a
+        # record with a missing required key adds nothing
+        triples = []
+        for step in steps:
+            step(obj, subject, context, terms, triples)
+        out.extend(triples)
+        for child in children:
+            child(obj, subject, context, terms, out, seen)
+
+    def emit(obj, context, terms, out, seen=None):
+        subject = terms.instance_iri(obj['@id'])
+        if not shared or seen is None:
+            convert(obj, subject, context, terms, out, seen)
+            return subject
+        if not seen.enter(_key(subject, context), obj, out):
+            return subject
+        try:
+            convert(obj, subject, context, terms, out, seen)
+        except BaseException:
+            # Not seen after all: a later definition is converted again
+            seen.abort()
+            raise
+        seen.leave(out)
+        return subject
+    return emit
+
+
+def _key(subject, context):
+    if not context:
+        return str(subject)
+    # The same subtree under another parent gets other triples, e.g. its
+    # placement_for subject
+    return ' '.join([str(subject)] + [str(value)
+                                      for value in context.values()])
+
+
+def _compile_step(item):
+    if isinstance(item, Type):
+        rdf_type = item.rdf_type
+
+        def step(obj, s, context, terms, out):
+            out.append((s, RDF.type, rdf_type))
+    elif isinstance(item, Derived):
+        predicate, function = item.predicate, item.function
+
+        def step(obj, s, context, terms, out):
+            out.append((s, predicate, function(obj, terms)))
+    elif isinstance(item, Context):
+        name, predicate, fallback = item.name, item.predicate, item.fallback
+
+        def step(obj, s, context, terms, out):
+            value = context.get(name)
+            if not value and fallback is not None:
+                value = fallback(obj, terms)
+            if value:
+                out.append((s, predicate, value))
+    else:
+        step = _compile_field(item)
+    return step
+
+
+def _compile_field(field):
+    key, predicate, build = field.key, field.predicate, attrgetter(field.kind)
+    if field.ref:
+        def to_term(terms, value):
+            return build(terms)(value['@id']) if '@id' in value else None
+    else:
+        def to_term(terms, value):
+            return build(terms)(value)
+
+    if field.many:
+        def step(obj, s, context, terms, out):
+            values = obj.get(key)
+            if values is None:
+                return
+            if isinstance(values, dict):
+                values = [values]
+            for value in values:
+                out.append((s, predicate, to_term(terms, value)))
+    elif field.required:
+        def step(obj, s, context, terms, out):
+            out.append((s, predicate, to_term(terms, obj[key])))
+    else:
+        def step(obj, s, context, terms, out):
+            value = obj.get(key)
+            if value is not None:
+                term = to_term(terms, value)
+                if term:
+                    out.append((s, predicate, term))
+    return step
+
+
+def _compile_child(child, emitters):
+    key, name, many = child.key, child.mapping, child.many
+    pass_source, pass_context = child.pass_source, child.pass_context
+
+    def emit_child(obj, subject, context, terms, out, seen):
+        if key not in obj:
+            if child.required:
+                raise KeyError(key)
+            return
+        child_context = {context_name: context.get(context_name)
+                         for context_name in pass_context}
+        if pass_source:
+            child_context['source'] = subject
+        values = obj[key]
+        if not many or isinstance(values, dict):
+            values = [values]
+        for value in values:
+            emitters[name](value, child_context, terms, out, seen)
+    return emit_child
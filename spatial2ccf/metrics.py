@@ -0,0 +1,90 @@
+import json
+import time
+
+from collections import Counter
+from contextlib import contextmanager
+
+
+class Metrics:
+    """Run Metrics
+    Collects the wall and CPU time spent in each stage of a run and in the
+    conversion of each record @type, together with named counters. Hooks
+    added with `add_hook` are called as `hook(event, name, values)` every
+    time a stage ends
+    """
+    def __init__(self):
+        self.stages = {}
+        self.types = {}
+        self.counters = Counter()
+        self.hooks = []
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    @contextmanager
+    def stage(self, name):
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self._add_time(self.stages, name,
+                           time.perf_counter() - wall,
+                           time.process_time() - cpu)
+            for hook in self.hooks:
+                hook('stage', name, self.stages[name])
+
+    def iterate(self, records, by_type=True):
+        """Yields the records, timing the parsing of each record as the
+        'parse' stage and, unless `by_type` is false, the conversion of each
+        record by its @type
+        """
+        records = iter(records)
+        while True:
+            wall, cpu = time.perf_counter(), time.process_time()
+            try:
+                obj = next(records)
+            except StopIteration:
+                return
+            finally:
+                parsed_wall = time.perf_counter()
+                parsed_cpu = time.process_time()
+                self._add_time(self.stages, 'parse', parsed_wall - wall,
+                               parsed_cpu - cpu)
+            yield obj
+            if not by_type:
+                continue
+            self._add_time(self.types, obj.get('@type'),
+                           time.perf_counter() - parsed_wall,
+                           time.process_time() - parsed_cpu)
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+    def merge(self, report):
+        """Adds the times and counters of a `report` of another Metrics,
+        e.g. of a worker process
+        """
+        for table, name in ((self.stages, 'stages'), (self.types, 'types')):
+            for key, entry in report[name].items():
+                self._add_time(table, key, entry['wall'], entry['cpu'],
+                               entry['count'])
+        self.counters.update(report['counters'])
+
+    def _add_time(self, table, name, wall, cpu, count=1):
+        entry = table.get(name)
+        if entry is None:
+            entry = table[name] = {'count': 0, 'wall': 0.0, 'cpu': 0.0}
+        entry['count'] += count
+        entry['wall'] += wall
+        entry['cpu'] += cpu
+
+    def report(self):
+        return {
+            'stages': self.stages,
+            'types': self.types,
+            'counters': dict(self.counters)
+        }
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
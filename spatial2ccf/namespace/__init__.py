@@ -1,3 +1,6 @@
+import warnings
+
+from types import MappingProxyType
 from typing import List
 from rdflib.term import URIRef, Variable, _is_valid_uri
 
@@ -73,8 +76,28 @@ class DefinedNamespaceMeta(type):
     _extras: List[str] = []  # List of non-pythonesque items
     _underscore_num: bool = False  # True means pass "_n" constructs
 
+    def __init__(cls, name, bases, namespace, **kwargs):
+        super().__init__(name, bases, namespace, **kwargs)
+        # Resolve every defined term to its URIRef once, so that later
+        # lookups are a single dict access
+        ns = next((c.__dict__["_NS"] for c in cls.__mro__ if "_NS" in c.__dict__), None)
+        terms = {}
+        if ns is not None:
+            for c in reversed(cls.__mro__):
+                if not isinstance(c, DefinedNamespaceMeta):
+                    continue
+                for term in c.__dict__.get("__annotations__", {}):
+                    terms[term] = ns[term]
+                for term in c.__dict__.get("_extras", []):
+                    terms[term] = ns[term]
+        cls._terms = MappingProxyType(terms)
+
     def __getitem__(cls, name, default=None):
         name = str(name)
+        try:
+            return cls._terms[name]
+        except KeyError:
+            pass
         if str(name).startswith("__"):
             return super().__getitem__(name, default)
         if (cls._warn or cls._fail) and not name in cls:
@@ -102,6 +125,8 @@ class DefinedNamespaceMeta(type):
     def __contains__(cls, item):
         """Determine whether a URI or an individual item belongs to this namespace"""
         item_str = str(item)
+        if item_str in cls._terms:
+            return True
         if item_str.startswith("__"):
             return super().__contains__(item)
         if item_str.startswith(str(cls._NS)):
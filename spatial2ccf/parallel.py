@@ -0,0 +1,91 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from spatial2ccf.metrics import Metrics
+from spatial2ccf.ontology import SPOntology
+from spatial2ccf.seen import SeenIndex
+from spatial2ccf.terms import TermFactory
+from spatial2ccf.writer import TripleList
+
+# Kept warm across the chunks converted by the same worker process
+_terms = TermFactory()
+
+
+class ParallelMutator:
+    """Parallel Mutator
+    Converts the records on a pool of worker processes. The records are
+    split into chunks of `chunk_size` records (or Donors for a JSON-LD
+    document) and the triples of each chunk are merged back in the original
+    record order, so the result is the same as a single-process run
+    """
+    def __init__(self, processes, chunk_size=1000):
+        self.processes = processes
+        self.chunk_size = chunk_size
+        self.executor = None
+
+    def __enter__(self):
+        self.executor = ProcessPoolExecutor(self.processes)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.executor.shutdown()
+        self.executor = None
+
+    def mutate(self, o, data):
+        """
+        """
+        metrics = o.metrics
+        timed = metrics is not None
+        pending = deque()
+        for chunk in _iter_chunks(data, self.chunk_size, metrics):
+            pending.append(self.executor.submit(_convert_chunk, chunk,
+                                                o.seen.strict, timed))
+            # Keep a bounded number of chunks in flight
+            if len(pending) > 2 * self.processes:
+                _merge(o, *pending.popleft().result())
+        while pending:
+            _merge(o, *pending.popleft().result())
+        o.flush()
+        return o
+
+
+def _merge(o, triples, marks, report):
+    o.extend(triples, marks)
+    if report is not None:
+        o.metrics.merge(report)
+
+
+def _iter_chunks(data, chunk_size, metrics=None):
+    if isinstance(data, dict):
+        for chunk in _iter_chunks(data['@graph'], chunk_size, metrics):
+            yield {'@graph': chunk}
+    else:
+        # Records are parsed here, and converted by the workers
+        records = iter(data) if metrics is None else \
+            metrics.iterate(data, by_type=False)
+        while True:
+            chunk = list(islice(records, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+
+def _convert_chunk(chunk, strict=False, timed=False):
+    triples = TripleList()
+    seen = SeenIndex(strict, record_marks=True)
+    metrics = Metrics() if timed else None
+    hits, misses = _terms.hits, _terms.misses
+    SPOntology(triples, _terms, metrics=metrics, seen=seen).mutate(chunk)
+    report = None
+    if metrics is not None:
+        metrics.count('term_cache_hits', _terms.hits - hits)
+        metrics.count('term_cache_misses', _terms.misses - misses)
+        report = metrics.report()
+        # Already counted when the parent parsed the chunk
+        report['stages'].pop('parse', None)
+    # The marks let the parent drop the shared subtrees that an earlier
+    # chunk has already converted
+    return triples, seen.marks, report
+
+
@@ -1,30 +1,202 @@
-import json
-import requests
+import os
 
-from urllib.parse import urlparse
-from os.path import exists
-from requests_file import FileAdapter
+from rdflib import URIRef
 
+from spatial2ccf.cache import HTTPCache
+from spatial2ccf.checkpoint import CheckpointMutator
+from spatial2ccf.fetch import open_session, iter_documents, is_local
+from spatial2ccf.incremental import IncrementalMutator
+from spatial2ccf.metrics import Metrics
 from spatial2ccf.ontology import SPOntology
+from spatial2ccf.parallel import ParallelMutator
+from spatial2ccf.shard import DonorIndex, ShardWriter, shard_paths
+from spatial2ccf.shard import write_shards
+from spatial2ccf.snapshot import Snapshot, SnapshotBuilder, save_snapshot
+from spatial2ccf.store import open_store
+from spatial2ccf.writer import MultiWriter, open_writers, resolve_outputs
 
 
-def run(args):
+def run(args, metrics=None):
     """
     """
-    session = requests.Session()
-    session.mount('file://', FileAdapter())
+    if metrics is None and args.metrics_out:
+        metrics = Metrics()
+    session = None
+    if not all(is_local(url) for url in args.input_file):
+        session = open_session(args.max_connections or args.jobs)
+    cache = None
+    if args.cache_dir:
+        cache = HTTPCache(args.cache_dir, args.cache_size << 20,
+                          args.offline)
 
-    o = SPOntology.new(args.ontology_iri)
-    for url in args.input_file:
-        data = json.load(open(url)) if is_local(url) \
-            else session.get(url).json()
-        o = o.mutate(data)
+    outputs = resolve_outputs(args.output, args.format)
+    donors = DonorIndex() if args.shards and args.shard_by == 'donor' \
+        else None
+    mutator = open_mutator(args)
+    if hasattr(mutator, 'keep_output') and args.stream and \
+            len(outputs) == 1 and not args.shards:
+        # Before the writer overwrites the output of the previous run
+        mutator.keep_output(*outputs[0], args.ontology_iri, args.compress)
 
-    o.serialize(args.output)
+    writer = None
+    if args.stream and args.shards:
+        writers = [ShardWriter(destination, format, args.shards,
+                               args.shard_by, donors,
+                               URIRef(args.ontology_iri), args.sort,
+                               args.compress)
+                   for destination, format in outputs]
+        writer = writers[0] if len(writers) == 1 else MultiWriter(writers)
+    elif args.stream:
+        writer = open_writers(outputs, URIRef(args.ontology_iri), args.sort,
+                              args.compress)
 
+    collector = None
+    if args.world_out or args.world_triples or args.collisions:
+        # Imported here, since NumPy is an optional dependency
+        from spatial2ccf.spatial import PlacementCollector
+        collector = PlacementCollector(writer)
+        if writer is not None:
+            writer = collector
 
-def is_local(url):
-    url_parsed = urlparse(url)
-    if url_parsed.scheme in ('file', ''):
-        return exists(url_parsed.path)
-    return False
+    builder = None
+    if args.snapshot_out and writer is not None:
+        builder = writer = SnapshotBuilder(writer)
+    if args.store and writer is None:
+        # The placements and the snapshot are then read back from the store
+        writer = open_store(args.store)
+
+    base = Snapshot(args.base_snapshot) if args.base_snapshot else None
+    o = SPOntology.new(args.ontology_iri, writer, args.batch_size, metrics,
+                       args.strict,
+                       namespaces=base.namespaces if base is not None else ())
+    if base is not None:
+        with _stage(metrics, 'load'), base:
+            o.load(base)
+    with mutator:
+        inputs = args.input_file
+        if hasattr(mutator, 'restore'):
+            inputs = mutator.restore(o, inputs)
+        # Inputs that did not change since the previous run are not read,
+        # unless their Donors are needed to shard the output
+        unchanged = getattr(mutator, 'unchanged', set()) \
+            if donors is None else set()
+        documents = iter_documents(session, [url for url in inputs
+                                             if url not in unchanged],
+                                   args.jobs, cache, metrics)
+        documents = _timed(metrics, 'fetch', documents)
+        for url in inputs:
+            if url in unchanged:
+                with _stage(metrics, 'mutate'):
+                    o = mutator.reuse(o, url)
+                continue
+            data = next(documents)
+            if donors is not None:
+                data = donors.observe(data)
+            with _stage(metrics, 'mutate'):
+                o = mutator.mutate(o, data)
+        # Closes the last input
+        next(documents, None)
+
+    if collector is not None:
+        with _stage(metrics, 'spatial'):
+            _resolve_placements(o, collector, args)
+
+    with _stage(metrics, 'serialize'):
+        if args.shards and not args.stream:
+            o.flush()
+            for destination, format in outputs:
+                write_shards(o.graph, destination, format, args.shards,
+                             args.shard_by, donors,
+                             URIRef(args.ontology_iri), args.compress)
+        else:
+            o.serialize_all(outputs, args.compress)
+
+    if args.snapshot_out:
+        with _stage(metrics, 'snapshot'):
+            if builder is not None:
+                builder.save(args.snapshot_out, o.seen)
+            else:
+                save_snapshot(args.snapshot_out, o.graph,
+                              o.graph.namespaces(), o.seen)
+    # Only once every output is complete
+    if hasattr(mutator, 'written'):
+        mutator.written(outputs, args.ontology_iri)
+
+    if metrics is not None:
+        metrics.count('triples', o.triple_count)
+        metrics.count('term_cache_hits', o.terms.hits)
+        metrics.count('term_cache_misses', o.terms.misses)
+        for destination, _ in outputs:
+            paths = [destination]
+            if args.shards:
+                paths = shard_paths(destination, args.shards)
+            for path in paths:
+                if path and os.path.exists(path):
+                    metrics.count('bytes_written', os.path.getsize(path))
+        if args.metrics_out:
+            metrics.write(args.metrics_out)
+    return o
+
+
+def _resolve_placements(o, collector, args):
+    o.flush()
+    if collector.target is None:
+        collector.collect(o.graph)
+    table = collector.resolve()
+    if args.world_out:
+        table.save(args.world_out)
+    if args.world_triples:
+        o.extend(table.triples(o.terms))
+    if args.collisions:
+        from spatial2ccf.collision import find_collisions
+        o.extend(find_collisions(table, collector, args.collisions,
+                                 o.metrics))
+    if o.metrics is not None:
+        o.metrics.count('world_transforms', len(table))
+
+
+def open_mutator(args):
+    if args.manifest:
+        return IncrementalMutator(args.manifest)
+    elif args.checkpoint or args.quarantine:
+        return CheckpointMutator(args.checkpoint, args.checkpoint_every,
+                                 args.quarantine, args.resume)
+    elif args.processes > 1:
+        return ParallelMutator(args.processes, args.chunk_size)
+    else:
+        return SerialMutator()
+
+
+class SerialMutator:
+    """Converts the records in the current process
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def mutate(self, o, data):
+        return o.mutate(data)
+
+
+def _stage(metrics, name):
+    return metrics.stage(name) if metrics is not None else _NoStage()
+
+
+def _timed(metrics, name, iterable):
+    iterator = iter(iterable)
+    while True:
+        with _stage(metrics, name):
+            item = next(iterator, StopIteration)
+        if item is StopIteration:
+            return
+        yield item
+
+
+class _NoStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
@@ -0,0 +1,162 @@
+import io
+import json
+
+from spatial2ccf.compression import open_input
+
+WHITESPACE = ' \t\n\r'
+
+# Characters that can follow a complete JSON number
+DELIMITERS = WHITESPACE + ',]}:'
+
+_decoder = json.JSONDecoder()
+
+
+def load(fp, chunk_size=1 << 16):
+    """Incrementally reads a RUI or JSON-LD document from a text stream.
+    A top-level list is returned as a generator over its elements and a
+    top-level object is returned as a dict whose '@graph' member is a
+    generator over the graph elements. Members that follow '@graph' in the
+    document are not read.
+    """
+    scanner = _Scanner(fp, chunk_size)
+    first = scanner.peek()
+    if first == '[':
+        return scanner.iter_array()
+    elif first == '{':
+        return scanner.read_graph_object()
+    else:
+        return scanner.read_value()
+
+
+def open_text(fp):
+    """Returns a UTF-8 text stream over the binary stream `fp`, which is
+    decompressed on the fly when it is gzip, bzip2 or xz compressed
+    """
+    return io.TextIOWrapper(open_input(fp), encoding='utf-8')
+
+
+def iter_content(response, chunk_size=1 << 16):
+    """Returns a text stream over the body of a streamed HTTP response
+    """
+    raw = _ChunkStream(response.iter_content(chunk_size))
+    return open_text(io.BufferedReader(raw, chunk_size))
+
+
+class _Scanner:
+    """Minimal pull scanner that decodes one JSON value at a time from a
+    growing text buffer
+    """
+    def __init__(self, fp, chunk_size):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size):
+        chunk = self.fp.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and \
+                    self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill(self.chunk_size):
+                return ''
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError("Expecting '" + char + "' but found '" +
+                             found + "' in JSON input")
+        self.pos += 1
+
+    def read_value(self):
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+                # A value that ends with the buffer may have been cut short,
+                # and so may a number followed by anything but a delimiter,
+                # e.g. 2 of '2.5' cut after '2.'
+                if self.eof or (end < len(self.buffer) and
+                                (not _is_number(value) or
+                                 self.buffer[end] in DELIMITERS)):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill(size)
+            size *= 2
+
+    def iter_array(self):
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.read_value()
+            separator = self.peek()
+            self.pos += 1
+            if separator == ']':
+                return
+            elif separator != ',':
+                raise ValueError("Expecting ',' or ']' but found '" +
+                                 separator + "' in JSON input")
+
+    def read_graph_object(self):
+        obj = {}
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return obj
+        while True:
+            key = self.read_value()
+            self.expect(':')
+            if key == '@graph' and self.peek() == '[':
+                obj[key] = self.iter_array()
+                return obj
+            obj[key] = self.read_value()
+            separator = self.peek()
+            self.pos += 1
+            if separator == '}':
+                return obj
+            elif separator != ',':
+                raise ValueError("Expecting ',' or '}' but found '" +
+                                 separator + "' in JSON input")
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class _ChunkStream(io.RawIOBase):
+    """Adapts an iterator of byte chunks to a raw binary stream
+    """
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.leftover = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self.leftover:
+            try:
+                self.leftover = next(self.chunks)
+            except StopIteration:
+                return 0
+        size = min(len(b), len(self.leftover))
+        b[:size] = self.leftover[:size]
+        self.leftover = self.leftover[size:]
+        return size
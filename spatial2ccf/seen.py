@@ -0,0 +1,167 @@
+import hashlib
+import json
+import logging
+
+from collections import OrderedDict
+
+logger = logging.getLogger("spatial2ccf")
+
+
+class SeenIndex:
+    """Seen Index
+    Remembers the shared subtrees (object references and extraction sets)
+    that were already converted, so that a subtree that comes back is not
+    converted again. A subtree is keyed by its subject and by the values
+    its parent passes down to it, and the content hash of every repeated
+    subtree is compared with the first definition. In strict mode a
+    conflicting definition raises ValueError, otherwise it is converted as
+    well, as if there were no index, and a warning is logged.
+
+    Only the last `max_size` subtrees are remembered, so that the index
+    does not grow with the number of records when streaming. A subtree
+    that comes back after it was forgotten is converted again, which only
+    repeats triples.
+
+    With `record_marks` every subtree converted for the first time is also
+    recorded in `marks` as [key, digest, start, end], the range of its
+    triples in the output list, so that triples converted apart (by a
+    worker process or from a manifest) can later be merged with `merge` as
+    if they had been converted in one go
+    """
+    def __init__(self, strict=False, record_marks=False, max_size=1 << 16):
+        self.strict = strict
+        self.max_size = max_size
+        self.digests = OrderedDict()
+        self.marks = [] if record_marks else None
+        self.conflicts = 0
+        self._open = []
+        self._added = []
+
+    def enter(self, key, obj, out):
+        """Returns False when the subtree `key` was already converted,
+        otherwise records it and returns True
+        """
+        self._open.append((len(self.marks or ()), len(self._added)))
+        if key in self.digests:
+            digest = content_hash(obj)
+            if self._check(key, digest):
+                self._open.pop()
+                return False
+        else:
+            # Marks are merged in another index, which needs the digest
+            digest = content_hash(obj) if self.marks is not None else obj
+            self.remember({key: digest})
+            self._added.append(key)
+        if self.marks is not None:
+            self.marks.append([key, digest, len(out), None])
+        return True
+
+    def leave(self, out):
+        """Ends the subtree of the last successful `enter`
+        """
+        marks_start, _ = self._open.pop()
+        if self.marks is not None:
+            self.marks[marks_start][3] = len(out)
+        if not self._open:
+            del self._added[:]
+
+    def abort(self):
+        """Rolls back the last successful `enter`, and the subtrees entered
+        since, when the conversion of its subtree failed
+        """
+        marks_start, added_start = self._open.pop()
+        if self.marks is not None:
+            del self.marks[marks_start:]
+        for key in self._added[added_start:]:
+            self.digests.pop(key, None)
+        del self._added[added_start:]
+
+    def remember(self, digests):
+        """Records the subtrees of the key → digest mapping `digests`,
+        forgetting the least recently seen ones over `max_size`
+        """
+        for key, digest in digests.items():
+            if key not in self.digests:
+                self.digests[key] = digest
+        while len(self.digests) > self.max_size:
+            self.digests.popitem(last=False)
+
+    def hashed(self):
+        """Returns the key → digest mapping of the remembered subtrees,
+        hashing the ones that were only seen once so far
+        """
+        for key, first in self.digests.items():
+            if isinstance(first, dict):
+                self.digests[key] = content_hash(first)
+        return self.digests
+
+    def merge(self, items, marks):
+        """Returns `items` without the ranges of the subtrees in `marks`
+        that were already converted, and records the others. The triples of
+        a subtree nested in a dropped one are dropped with it
+        """
+        return without(items, self.drop(marks))
+
+    def drop(self, marks):
+        """Returns the (start, end) ranges of the subtrees in `marks` that
+        were already converted, and records the others
+        """
+        dropped = []
+        if not marks:
+            return dropped
+        added = {}
+        drop_until = 0
+        for key, digest, start, end in marks:
+            if start < drop_until:
+                continue
+            if key in self.digests and self._check(key, digest):
+                dropped.append((start, end))
+                drop_until = end
+            else:
+                added[key] = digest
+        # Only recorded once every subtree is checked, so that a conflict
+        # leaves the index as it was
+        self.remember(added)
+        return dropped
+
+    def _check(self, key, digest):
+        """Returns True when the subtree `key` is a repeat of the first
+        definition, and False when it conflicts with it in non-strict mode
+        """
+        self.digests.move_to_end(key)
+        first = self.digests[key]
+        if isinstance(first, dict):
+            first = self.digests[key] = content_hash(first)
+        if first is None or digest is None:
+            # Recorded without a hash, e.g. by an older snapshot
+            if first is None:
+                self.digests[key] = digest
+            return True
+        if first == digest:
+            return True
+        subject = key.split(" ", 1)[0]
+        if self.strict:
+            raise ValueError("Conflicting definitions of <" + subject + ">")
+        self.conflicts += 1
+        logger.warning("Conflicting definitions of <%s>, keeping both",
+                       subject)
+        return False
+
+
+def without(items, dropped):
+    """Returns `items` without the (start, end) ranges in `dropped`
+    """
+    if not dropped:
+        return items
+    kept = []
+    position = 0
+    for start, end in dropped:
+        kept.extend(items[position:start])
+        position = end
+    kept.extend(items[position:])
+    return kept
+
+
+def content_hash(record):
+    data = json.dumps(record, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
@@ -0,0 +1,332 @@
+import asyncio
+import io
+import json
+import logging
+import signal
+import time
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+
+from rdflib import URIRef
+
+from spatial2ccf.ontology import SPOntology
+from spatial2ccf.terms import TermFactory
+from spatial2ccf.writer import WRITERS, open_writer
+
+logger = logging.getLogger("spatial2ccf")
+
+CONTENT_TYPES = {
+    'ttl': 'text/turtle',
+    'nt': 'application/n-triples',
+    'nq': 'application/n-quads',
+    'jsonld': 'application/ld+json',
+}
+
+FORMATS = {content_type: format
+           for format, content_type in CONTENT_TYPES.items()}
+
+REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    417: 'Expectation Failed',
+    500: 'Internal Server Error',
+    501: 'Not Implemented',
+    505: 'HTTP Version Not Supported',
+}
+
+
+class ConversionService:
+    """Conversion Service
+    Converts the RUI records posted to /convert into CCF RDF. The modules,
+    the term caches and the ontology skeleton stay warm between requests,
+    and the conversions run on a pool of `workers` threads so that
+    concurrent requests do not wait for each other to be read or written.
+    The latencies of the last `window` requests are kept to report their
+    percentiles on /stats
+    """
+    def __init__(self, ontology_iri, workers=4, window=10000,
+                 max_body=1 << 26):
+        self.ontology_iri = ontology_iri
+        self.terms = TermFactory()
+        self.executor = ThreadPoolExecutor(workers)
+        self.max_body = max_body
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+
+    def convert(self, body, format='ttl', ontology_iri=None):
+        """Converts a RUI or JSON-LD document given as bytes and returns
+        the serialization in the given format
+        """
+        data = json.loads(body)
+        ontology_iri = ontology_iri or self.ontology_iri
+        output = io.BytesIO()
+        writer = open_writer(output, format, URIRef(ontology_iri))
+        o = SPOntology.new(ontology_iri, writer, terms=self.terms)
+        o.mutate(data).serialize(output, format)
+        return output.getvalue()
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'latency_ms': {
+                'p50': percentile(latencies, 50),
+                'p90': percentile(latencies, 90),
+                'p99': percentile(latencies, 99),
+                'max': latencies[-1] if latencies else None
+            },
+            'term_cache': {
+                'hits': self.terms.hits,
+                'misses': self.terms.misses
+            }
+        }
+
+    async def handle(self, reader, writer):
+        """Serves the requests of one connection, which is kept alive as
+        HTTP/1.0 and HTTP/1.1 say, until either side closes it
+        """
+        try:
+            while True:
+                request = await _read_request(reader, writer, self.max_body)
+                if request is None:
+                    break
+                method, target, version, headers, body = request
+                start = time.perf_counter()
+                status, content_type, body = await self._respond(
+                    method, target, headers, body)
+                keep_alive = _keep_alive(version, headers)
+                writer.write(_response(status, content_type, body,
+                                       keep_alive))
+                await writer.drain()
+                if target.startswith('/convert'):
+                    self.requests += 1
+                    if status != 200:
+                        self.errors += 1
+                    self.latencies.append(
+                        (time.perf_counter() - start) * 1000.0)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except _RequestError as e:
+            # The rest of the request cannot be told apart from the next
+            # one, so the connection is closed
+            writer.write(_response(e.status, 'text/plain',
+                                   str(e).encode('utf-8'), False))
+            await _linger(reader, writer)
+        finally:
+            writer.close()
+
+    async def _respond(self, method, target, headers, body):
+        url = urlparse(target)
+        query = parse_qs(url.query)
+        if url.path == '/stats':
+            return 200, 'application/json', \
+                json.dumps(self.stats()).encode('utf-8')
+        elif url.path != '/convert':
+            return 404, 'text/plain', b'Not found'
+        elif method != 'POST':
+            return 405, 'text/plain', b'Use POST'
+
+        format = _format(query, headers)
+        if format not in WRITERS:
+            return 400, 'text/plain', \
+                ("Unknown format <" + format + ">").encode('utf-8')
+        ontology_iri = query.get('ontology_iri', [None])[0]
+        loop = asyncio.get_running_loop()
+        try:
+            output = await loop.run_in_executor(
+                self.executor, self.convert, body, format, ontology_iri)
+        except (ValueError, KeyError, TypeError) as e:
+            return 400, 'text/plain', \
+                ("Invalid input: " + repr(e)).encode('utf-8')
+        except Exception:
+            logger.exception("Conversion failed")
+            return 500, 'text/plain', b'Conversion failed'
+        return 200, CONTENT_TYPES[format], output
+
+    async def serve(self, host='127.0.0.1', port=8080, socket_path=None):
+        """Serves until SIGINT or SIGTERM
+        """
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, stop.set)
+            except NotImplementedError:
+                # Not available on Windows, where Ctrl+C still works
+                pass
+        if socket_path is not None:
+            server = await asyncio.start_unix_server(self.handle,
+                                                     socket_path)
+            logger.info("Serving on %s", socket_path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+            logger.info("Serving on http://%s:%d", host, port)
+        async with server:
+            await stop.wait()
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of the sorted `values`
+    """
+    if not values:
+        return None
+    rank = max(0, -(-len(values) * p // 100) - 1)
+    return values[int(rank)]
+
+
+def run(args):
+    """Runs the service until it is interrupted, then logs the latency
+    percentiles
+    """
+    service = ConversionService(args.ontology_iri, args.workers)
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.socket))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.executor.shutdown()
+        logger.info("%s", json.dumps(service.stats()))
+
+
+class _RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+async def _read_request(reader, writer, max_body):
+    """Reads the next request of a connection as (method, target,
+    version, headers, body), or returns None once the client closed it.
+    A body sent in chunks is joined, and a client that waits for
+    100 Continue is told to send its body once the headers are accepted
+    """
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode('latin-1').split(' ')
+    except ValueError:
+        raise _RequestError(400, "Malformed request line")
+    version = version.strip()
+    if version not in ('HTTP/1.0', 'HTTP/1.1'):
+        raise _RequestError(505, "Unsupported version <" + version + ">")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    encodings = _tokens(headers.get('transfer-encoding', ''))
+    if encodings and encodings != ['chunked']:
+        raise _RequestError(501, "Unsupported Transfer-Encoding <" +
+                            headers['transfer-encoding'] + ">")
+    length = None
+    if not encodings:
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise _RequestError(400, "Invalid Content-Length")
+        if length < 0:
+            raise _RequestError(400, "Invalid Content-Length")
+        if length > max_body:
+            raise _RequestError(413, "Request body over " +
+                                str(max_body) + " bytes")
+    expect = headers.get('expect')
+    if expect is not None:
+        if expect.lower() != '100-continue':
+            raise _RequestError(417, "Unsupported Expect <" + expect + ">")
+        if version == 'HTTP/1.1':
+            writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+            await writer.drain()
+
+    if encodings:
+        body = await _read_chunks(reader, max_body)
+    else:
+        body = await reader.readexactly(length) if length else b''
+    return method, target, version, headers, body
+
+
+async def _read_chunks(reader, max_body):
+    chunks = []
+    size = 0
+    while True:
+        line = await reader.readline()
+        digits = line.split(b';', 1)[0].strip()
+        if not digits or digits.strip(b'0123456789abcdefABCDEF'):
+            raise _RequestError(400, "Invalid chunk size")
+        chunk_size = int(digits, 16)
+        if chunk_size == 0:
+            break
+        size += chunk_size
+        if size > max_body:
+            raise _RequestError(413, "Request body over " + str(max_body) +
+                                " bytes")
+        chunks.append(await reader.readexactly(chunk_size))
+        if await reader.readline() not in (b'\r\n', b'\n'):
+            raise _RequestError(400, "Malformed chunk")
+    # Trailers are read and ignored
+    while await reader.readline() not in (b'\r\n', b'\n', b''):
+        pass
+    return b''.join(chunks)
+
+
+async def _linger(reader, writer, timeout=1.0):
+    """Reads what the client still sends for up to `timeout` seconds
+    before the connection is closed, since closing it with unread data
+    resets it and the client may lose the response
+    """
+    try:
+        await writer.drain()
+        if writer.can_write_eof():
+            writer.write_eof()
+        await asyncio.wait_for(_discard(reader), timeout)
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+
+
+async def _discard(reader):
+    while await reader.read(1 << 16):
+        pass
+
+
+def _keep_alive(version, headers):
+    connection = _tokens(headers.get('connection', ''))
+    if version == 'HTTP/1.0':
+        return 'keep-alive' in connection
+    return 'close' not in connection
+
+
+def _tokens(value):
+    return [token.strip().lower() for token in value.split(',')
+            if token.strip()]
+
+
+def _format(query, headers):
+    if 'format' in query:
+        return query['format'][0]
+    accept = headers.get('accept', '')
+    for content_type in accept.split(','):
+        format = FORMATS.get(content_type.split(';')[0].strip())
+        if format is not None:
+            return format
+    return 'ttl'
+
+
+def _response(status, content_type, body, keep_alive=True):
+    head = ("HTTP/1.1 " + str(status) + " " + REASONS[status] + "\r\n" +
+            "Content-Type: " + content_type + "\r\n" +
+            "Content-Length: " + str(len(body)) + "\r\n" +
+            "Connection: " + ("keep-alive" if keep_alive else "close") +
+            "\r\n\r\n")
+    return head.encode('latin-1') + body
@@ -0,0 +1,310 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import zlib
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
+from operator import itemgetter
+
+from spatial2ccf.compression import EXTENSIONS
+from spatial2ccf.namespace import CCF
+from spatial2ccf.store import SQLiteStore, decode, encode
+from spatial2ccf.terms import expand_instance_id
+from spatial2ccf.writer import MultiWriter, open_writer
+
+MANIFEST_VERSION = 1
+
+SHARD_BY = ['subject', 'organ', 'donor']
+
+# Triples a ShardWriter holds before it spills them to a temporary file,
+# and triples written to that file at a time
+MAX_HELD = 1 << 20
+SPILL_SIZE = 1 << 14
+
+# Predicates that tie a subject to the one it belongs to, as (subject,
+# owner) pairs: placements, object references and extraction sets go
+# with the entity (or organ) they are for, and bounding boxes with the
+# entity they bound
+OWNER_PREDICATES = {
+    CCF.placement_for: lambda s, o: (s, o),
+    CCF.has_placement: lambda s, o: (o, s),
+    CCF.has_object_reference: lambda s, o: (o, s),
+    CCF.extraction_set_for: lambda s, o: (s, o),
+    CCF.represents_bbox_of: lambda s, o: (s, o),
+}
+
+
+class ShardWriter:
+    """Shard Writer
+    Splits the triples into `shards` files next to `destination`, e.g.
+    out-00003-of-00016.nt for out.nt, each written by its own writer on its
+    own thread. All the triples of a subject go to the same shard, chosen
+    by a stable hash of the subject ('subject'), of its reference organ
+    ('organ') or of the Donor it was registered for ('donor'). A subject
+    with no reference organ or Donor, e.g. an entity placed in another
+    entity, goes with the subject it belongs to, or else on its own.
+
+    Sharding by subject is done as the triples arrive. The other two need
+    every triple to be known, since a placement may come before the organ
+    of its entity, so the triples are held until the writer is closed.
+    Past `max_held` triples they are spilled to a temporary file next to
+    `destination`, so that only the ownership of the subjects grows with
+    the output. Closing the writer routes the triples in one pass and
+    writes a manifest with the file, triple count and SHA-256 checksum of
+    every shard
+    """
+    def __init__(self, destination, format, shards, shard_by='subject',
+                 donors=None, context=None, sort=False, compression=None,
+                 max_held=MAX_HELD):
+        if shard_by not in SHARD_BY:
+            raise ValueError("Unknown shard key <" + shard_by + ">")
+        self.destination = destination
+        self.format = format
+        self.shard_by = shard_by
+        self.donors = donors
+        self.paths = shard_paths(destination, shards)
+        self.counts = [0] * shards
+        # Every shard writer is fed through the queue of its own thread
+        self.writers = [MultiWriter([open_writer(path, format, context, sort,
+                                                 compression)])
+                        for path in self.paths]
+        self.max_held = max_held
+        self._shards = {}
+        self._held = [] if shard_by != 'subject' else None
+        self._spill = None
+        self._owners = {}
+        self._anchors = {}
+
+    def bind(self, prefix, namespace):
+        for writer in self.writers:
+            writer.bind(prefix, namespace)
+
+    def add(self, triple):
+        self.add_many((triple,))
+
+    def add_many(self, triples):
+        if self._held is None:
+            self._route(triples, str)
+            return
+        observe_owners(triples, self._owners,
+                       self._anchors if self.shard_by == 'organ' else None)
+        self._held.extend(triples)
+        if len(self._held) >= self.max_held:
+            self._spill_held()
+
+    def close(self):
+        if self._held is not None:
+            if self.shard_by == 'donor':
+                self._anchors = self.donors.anchors if self.donors else {}
+            key = group_key(self._owners, self._anchors)
+            if self._spill is not None:
+                # The spilled triples came first. Their terms are made once
+                # for every run of batches that share them, since rdflib
+                # checks the IRI of every term it makes
+                terms = lru_cache(maxsize=1 << 16)(decode)
+                with self._spill as spill:
+                    spill.seek(0)
+                    while True:
+                        try:
+                            packed = pickle.load(spill)
+                        except EOFError:
+                            break
+                        self._route(_unpack(packed, terms), key)
+            triples, self._held = self._held, None
+            self._route(triples, key)
+        for writer in self.writers:
+            writer.close()
+        write_manifest(manifest_path(self.destination), {
+            'format': self.format,
+            'shard_by': self.shard_by,
+            'triples': sum(self.counts),
+            'shards': [{'file': os.path.basename(path), 'triples': count}
+                       for path, count in zip(self.paths, self.counts)]
+        }, self.paths)
+
+    def _spill_held(self):
+        if self._spill is None:
+            self._spill = tempfile.TemporaryFile(
+                dir=os.path.dirname(os.path.abspath(self.destination)),
+                suffix='.spill')
+        for start in range(0, len(self._held), SPILL_SIZE):
+            pickle.dump(_pack(self._held[start:start + SPILL_SIZE]),
+                        self._spill, pickle.HIGHEST_PROTOCOL)
+        self._held = []
+
+    def _route(self, triples, key):
+        shards, count = self._shards, len(self.writers)
+        batches = [[] for _ in self.writers]
+        for triple in triples:
+            s = triple[0]
+            shard = shards.get(s)
+            if shard is None:
+                shard = shards[s] = shard_for(key(s), count)
+            batches[shard].append(triple)
+        for shard, batch in enumerate(batches):
+            if batch:
+                self.counts[shard] += len(batch)
+                self.writers[shard].add_many(batch)
+
+
+def _pack(triples):
+    """Returns the triples as a table of the text of their terms and the
+    positions of their terms in it, which pickles faster than the terms.
+    The converter shares its terms, so they are told apart by identity,
+    which is much cheaper than by value
+    """
+    index = {}
+    terms = []
+    codes = []
+    for triple in triples:
+        for term in triple:
+            code = index.get(id(term))
+            if code is None:
+                code = index[id(term)] = len(terms)
+                terms.append(encode(term))
+            codes.append(code)
+    return terms, codes
+
+
+def _unpack(packed, decode):
+    """Returns the triples of `_pack`, with their terms made by `decode`,
+    e.g. a cached `store.decode`
+    """
+    terms, codes = packed
+    terms = [decode(term) for term in terms]
+    terms = [terms[code] for code in codes]
+    return list(zip(terms[0::3], terms[1::3], terms[2::3]))
+
+
+class DonorIndex:
+    """Donor Index
+    Remembers the Donor of every registered tissue block of the Donor
+    records passed through `observe`, to shard by Donor
+    """
+    def __init__(self):
+        self.anchors = {}
+
+    def observe(self, data):
+        """Returns the document `data` with its records observed as they
+        are taken from it
+        """
+        if isinstance(data, dict):
+            return dict(data, **{'@graph': self._iter(data['@graph'])})
+        return self._iter(data)
+
+    def _iter(self, records):
+        for obj in records:
+            if obj.get('@type') == 'Donor' and '@id' in obj:
+                for sample in obj.get('samples', ()):
+                    location = sample.get('rui_location')
+                    if location is not None and '@id' in location:
+                        self.anchors[expand_instance_id(
+                            location['@id'])] = obj['@id']
+            yield obj
+
+
+def observe_owners(triples, owners, anchors=None):
+    """Records in `owners` the subject every subject of `triples` belongs
+    to, and in `anchors` the reference organ of every subject that has one
+    """
+    for s, p, o in triples:
+        pair = OWNER_PREDICATES.get(p)
+        if pair is not None:
+            owned, owner = pair(s, o)
+            owners.setdefault(str(owned), str(owner))
+        elif anchors is not None and p == CCF.has_reference_organ:
+            anchors[str(s)] = str(o)
+
+
+def group_key(owners, anchors):
+    """Returns a function giving the group of a subject: the anchor of the
+    subject, e.g. its reference organ, or else the group of the subject it
+    belongs to, or else the subject itself
+    """
+    anchors = {str(s): str(o) for s, o in anchors.items()}
+
+    def key(subject):
+        subject = str(subject)
+        chain = [subject]
+        # Bounded, since ownership may be cyclic in malformed data
+        while chain[-1] not in anchors and chain[-1] in owners and \
+                len(chain) < 16:
+            chain.append(owners[chain[-1]])
+        return anchors.get(chain[-1], chain[-1])
+    return key
+
+
+def shard_for(key, count):
+    """Returns the shard of a key, the same on every run and platform
+    """
+    return zlib.crc32(key.encode('utf-8')) % count
+
+
+def shard_paths(destination, shards):
+    """Returns the paths of the shards of `destination`, keeping its
+    extensions, e.g. out-00000-of-00002.nt.gz for out.nt.gz
+    """
+    if destination is None:
+        raise ValueError("Sharded output requires an output file")
+    root, extension = os.path.splitext(destination)
+    if extension.lower() in EXTENSIONS:
+        root, format_extension = os.path.splitext(root)
+        extension = format_extension + extension
+    return ["%s-%05d-of-%05d%s" % (root, i, shards, extension)
+            for i in range(shards)]
+
+
+def manifest_path(destination):
+    root, extension = os.path.splitext(destination)
+    if extension.lower() in EXTENSIONS:
+        root = os.path.splitext(root)[0]
+    return root + ".manifest.json"
+
+
+def checksum(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_manifest(path, manifest, paths):
+    """Writes the manifest, with the size and checksum of every shard
+    computed on a pool of threads
+    """
+    with ThreadPoolExecutor(min(len(paths), 8)) as executor:
+        checksums = list(executor.map(checksum, paths))
+    for shard, shard_path, digest in zip(manifest['shards'], paths,
+                                         checksums):
+        shard['bytes'] = os.path.getsize(shard_path)
+        shard['sha256'] = digest
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(dict(manifest, version=MANIFEST_VERSION), f, indent=2)
+
+
+def write_shards(graph, destination, format, shards, shard_by='subject',
+                 donors=None, context=None, compression=None):
+    """Writes an rdflib Graph or a store as shards of `destination`, in
+    batches so that the triples of a store are never all in memory
+    """
+    writer = ShardWriter(destination, format, shards, shard_by, donors,
+                         context, compression=compression)
+    for prefix, namespace in graph.namespaces():
+        writer.bind(prefix, namespace)
+    triples = iter(graph)
+    if format == 'jsonld' and not isinstance(graph, SQLiteStore):
+        # One node object per subject, which the store already gives by
+        # reading the triples back ordered by subject
+        triples = iter(sorted(graph, key=itemgetter(0)))
+    while True:
+        batch = list(islice(triples, SPILL_SIZE))
+        if not batch:
+            break
+        writer.add_many(batch)
+    writer.close()
+    return writer
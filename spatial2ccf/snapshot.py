@@ -0,0 +1,233 @@
+import json
+import mmap
+import os
+import struct
+import sys
+
+from array import array
+from itertools import islice
+
+from rdflib import BNode, Literal, URIRef
+
+MAGIC = b'S2CCFSNP'
+SNAPSHOT_VERSION = 1
+HEADER = struct.Struct('<8sII')
+# Triples passed on to the target writer at a time
+BATCH_SIZE = 1 << 14
+
+# Term kinds
+IRI, BLANK, PLAIN, TYPED, LANGUAGE = range(5)
+
+
+class SnapshotBuilder:
+    """Snapshot Builder
+    Interns the terms of the triples passed through it into a term table
+    and keeps every triple as three term numbers, so that a whole graph
+    can be saved as a compact binary snapshot, see Snapshot. When a target
+    writer is given every triple is passed on to it, which lets the builder
+    sit in front of a streaming writer
+    """
+    def __init__(self, target=None):
+        self.target = target
+        self.namespaces = {}
+        self.ids = {}
+        self.kinds = array('B')
+        self.extra = array('i')
+        self.offsets = array('Q', [0])
+        self.strings = []
+        self.languages = {}
+        self.triples = array('I')
+
+    def bind(self, prefix, namespace):
+        self.namespaces[prefix] = str(namespace)
+        if self.target is not None:
+            self.target.bind(prefix, namespace)
+
+    def add(self, triple):
+        self.add_many((triple,))
+
+    def add_many(self, triples):
+        if self.target is None or isinstance(triples, (list, tuple)):
+            self._add_many(triples)
+            if self.target is not None:
+                self.target.add_many(triples)
+            return
+        # In batches, since `triples` can be a generator
+        triples = iter(triples)
+        batch = list(islice(triples, BATCH_SIZE))
+        while batch:
+            self._add_many(batch)
+            self.target.add_many(batch)
+            batch = list(islice(triples, BATCH_SIZE))
+
+    def _add_many(self, triples):
+        intern = self.intern
+        append = self.triples.append
+        for s, p, o in triples:
+            append(intern(s))
+            append(intern(p))
+            append(intern(o))
+
+    def close(self):
+        if self.target is not None:
+            self.target.close()
+
+    def intern(self, term):
+        """Returns the number of `term` in the term table
+        """
+        # Literals are equal by value, e.g. "1.0" and "1.00", so they are
+        # told apart by their lexical form
+        key = term if type(term) is not Literal else \
+            (str(term), term.datatype, term.language)
+        number = self.ids.get(key)
+        if number is not None:
+            return number
+        if isinstance(term, Literal):
+            if term.language is not None:
+                kind = LANGUAGE
+                extra = self.languages.setdefault(term.language,
+                                                  len(self.languages))
+            elif term.datatype is not None:
+                kind, extra = TYPED, self.intern(term.datatype)
+            else:
+                kind, extra = PLAIN, -1
+        else:
+            kind, extra = BLANK if isinstance(term, BNode) else IRI, -1
+        data = str(term).encode('utf-8')
+        # Numbered after its datatype
+        number = len(self.kinds)
+        self.kinds.append(kind)
+        self.extra.append(extra)
+        self.offsets.append(self.offsets[-1] + len(data))
+        self.strings.append(data)
+        self.ids[key] = number
+        return number
+
+    def save(self, path, seen=None):
+        """Writes the snapshot to `path`, together with the shared subtrees
+        of the SeenIndex `seen`, so that a run continuing from it does not
+        convert them again
+        """
+        sections = [self.kinds.tobytes(), self.extra.tobytes(),
+                    self.offsets.tobytes(), b''.join(self.strings),
+                    self.triples.tobytes()]
+        meta = {
+            'byteorder': sys.byteorder,
+            'terms': len(self.kinds),
+            'triples': len(self.triples) // 3,
+            'namespaces': sorted(self.namespaces.items()),
+            'languages': sorted(self.languages, key=self.languages.get),
+            'seen': seen.hashed() if seen is not None else {},
+            'sections': [len(section) for section in sections]
+        }
+        # Padded with spaces, which JSON ignores
+        meta = _pad(json.dumps(meta, separators=(',', ':')).encode('utf-8'),
+                    HEADER.size, b' ')
+        temp_path = path + ".tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, SNAPSHOT_VERSION, len(meta)))
+            f.write(meta)
+            for section in sections:
+                f.write(_pad(section))
+        os.replace(temp_path, path)
+
+
+class Snapshot:
+    """Snapshot
+    Graph snapshot written by SnapshotBuilder.save. The file is memory
+    mapped and its term table and triples are read in place, the terms
+    being only built when they are first needed. A snapshot is made of a
+    header with its version and a JSON part (the counts, namespaces, term
+    languages and shared subtrees), followed by the term kinds, the
+    datatype or language of each literal, the offsets of the UTF-8 term
+    strings, the strings themselves and the triples as term numbers
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, meta_size = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError("Not a snapshot <" + path + ">")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError("Unsupported snapshot version <" +
+                             str(version) + ">")
+        meta = json.loads(bytes(self._map[HEADER.size:
+                                          HEADER.size + meta_size]))
+        if meta['byteorder'] != sys.byteorder:
+            raise ValueError("The snapshot <" + path + "> was written on "
+                             "a " + meta['byteorder'] + "-endian system")
+        self.namespaces = meta['namespaces']
+        self.languages = meta['languages']
+        self.seen = meta['seen']
+        view = memoryview(self._map)
+        position = HEADER.size + meta_size
+        sections = []
+        for size in meta['sections']:
+            sections.append(view[position:position + size])
+            position += size + -size % 8
+        kinds, extra, offsets, self._strings, triples = sections
+        self._kinds = kinds
+        self._extra = extra.cast('i')
+        self._offsets = offsets.cast('Q')
+        self._triples = triples.cast('I')
+        self._terms = [None] * meta['terms']
+
+    def __len__(self):
+        return len(self._triples) // 3
+
+    def close(self):
+        self._kinds = self._extra = self._offsets = None
+        self._strings = self._triples = None
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def term(self, number):
+        """Returns the term with the given number
+        """
+        term = self._terms[number]
+        if term is None:
+            value = str(self._strings[self._offsets[number]:
+                                      self._offsets[number + 1]], 'utf-8')
+            kind = self._kinds[number]
+            if kind == IRI:
+                term = URIRef(value)
+            elif kind == BLANK:
+                term = BNode(value)
+            elif kind == TYPED:
+                term = Literal(value, datatype=self.term(self._extra[number]))
+            elif kind == LANGUAGE:
+                term = Literal(value, lang=self.languages[self._extra[number]])
+            else:
+                term = Literal(value)
+            self._terms[number] = term
+        return term
+
+    def triples(self):
+        """Yields every triple of the snapshot
+        """
+        terms, term = self._terms, self.term
+        numbers = iter(self._triples)
+        for s, p, o in zip(numbers, numbers, numbers):
+            yield (terms[s] or term(s), terms[p] or term(p),
+                   terms[o] or term(o))
+
+
+def save_snapshot(path, triples, namespaces=(), seen=None):
+    """Writes the `triples`, e.g. an rdflib Graph, as a snapshot
+    """
+    builder = SnapshotBuilder()
+    for prefix, namespace in namespaces:
+        builder.bind(prefix, namespace)
+    builder.add_many(triples)
+    builder.save(path, seen)
+
+
+def _pad(data, start=0, fill=b'\0'):
+    # Every section starts on a multiple of 8 bytes
+    return data + fill * (-(start + len(data)) % 8)
@@ -0,0 +1,317 @@
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from rdflib import OWL, RDF
+
+from spatial2ccf.namespace import CCF
+
+PLACEMENT_FIELDS = {
+    CCF.placement_for: 'source',
+    CCF.placement_relative_to: 'target',
+    CCF.x_scaling: 'x_scaling',
+    CCF.y_scaling: 'y_scaling',
+    CCF.z_scaling: 'z_scaling',
+    CCF.x_rotation: 'x_rotation',
+    CCF.y_rotation: 'y_rotation',
+    CCF.z_rotation: 'z_rotation',
+    CCF.rotation_unit: 'rotation_units',
+    CCF.rotation_order: 'rotation_order',
+    CCF.x_translation: 'x_translation',
+    CCF.y_translation: 'y_translation',
+    CCF.z_translation: 'z_translation',
+    CCF.translation_unit: 'translation_units',
+}
+
+ENTITY_FIELDS = {
+    CCF.x_dimension: 'x_dimension',
+    CCF.y_dimension: 'y_dimension',
+    CCF.z_dimension: 'z_dimension',
+    CCF.dimension_unit: 'dimension_units',
+    CCF.representation_of: 'representation_of',
+}
+
+TRANSFORM_FIELDS = ['x_scaling', 'y_scaling', 'z_scaling', 'x_rotation',
+                    'y_rotation', 'z_rotation', 'x_translation',
+                    'y_translation', 'z_translation']
+
+REQUIRED_PLACEMENT_FIELDS = ['source', 'target'] + TRANSFORM_FIELDS
+
+DIMENSION_FIELDS = ['x_dimension', 'y_dimension', 'z_dimension']
+
+# Lengths are resolved in millimeters
+LENGTH_UNITS = {
+    'millimeter': 1.0,
+    'centimeter': 10.0,
+    'meter': 1000.0,
+}
+
+ANGLE_UNITS = {
+    'degree': None,
+    'radian': 1.0,
+}
+
+# The corners of the unit cube centered on the origin
+CORNERS = [(x, y, z) for x in (-0.5, 0.5) for y in (-0.5, 0.5)
+           for z in (-0.5, 0.5)]
+
+
+class PlacementCollector:
+    """Placement Collector
+    Keeps the placement and dimension values of the triples passed through
+    it, so that they can be resolved to world space after the conversion,
+    together with what each entity represents and collides with.
+    When a target writer is given every triple is passed on to it, which
+    lets the collector sit in front of a streaming writer
+    """
+    def __init__(self, target=None):
+        self.target = target
+        self.placements = {}
+        self.entities = {}
+        self.annotations = {}
+
+    def bind(self, prefix, namespace):
+        if self.target is not None:
+            self.target.bind(prefix, namespace)
+
+    def add(self, triple):
+        self.add_many((triple,))
+
+    def add_many(self, triples):
+        self.collect(triples)
+        if self.target is not None:
+            self.target.add_many(triples)
+
+    def close(self):
+        if self.target is not None:
+            self.target.close()
+
+    def collect(self, triples):
+        placements, entities = self.placements, self.entities
+        for s, p, o in triples:
+            field = PLACEMENT_FIELDS.get(p)
+            if field is not None:
+                placements.setdefault(s, {})[field] = o
+                continue
+            field = ENTITY_FIELDS.get(p)
+            if field is not None:
+                entities.setdefault(s, {})[field] = o
+            elif p == CCF.collides_with:
+                self.annotations.setdefault(s, set()).add(o)
+
+    def resolve(self):
+        return resolve(self.placements, self.entities)
+
+
+class WorldTable:
+    """World Table
+    World-space transforms and axis-aligned bounding boxes of the entities.
+    Row i of `world` is the 4x4 transform from the frame of `nodes[i]` to
+    the frame of `roots[i]`, the entity at the end of its placement chain,
+    in millimeters. `aabb_min` and `aabb_max` bound the box of the entity
+    dimensions centered on its origin, and are NaN for entities without
+    dimensions or with an unresolved (cyclic) placement chain
+    """
+    def __init__(self, nodes, roots, world, aabb_min, aabb_max):
+        self.nodes = nodes
+        self.roots = roots
+        self.world = world
+        self.aabb_min = aabb_min
+        self.aabb_max = aabb_max
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def save(self, path):
+        """Writes the table as a compressed NumPy .npz file
+        """
+        np.savez_compressed(path,
+                            nodes=np.array([str(n) for n in self.nodes]),
+                            roots=np.array([str(r) if r is not None else ''
+                                            for r in self.roots]),
+                            world=self.world,
+                            aabb_min=self.aabb_min,
+                            aabb_max=self.aabb_max)
+
+    def triples(self, terms):
+        """Yields every bounding box as a spatial entity that represents
+        the bounding box of the entity, placed in the frame of its root
+        with the same CCF terms as the input placements
+        """
+        millimeter = terms.string('millimeter')
+
+        def decimal(value):
+            return terms.decimal(round(float(value), 6))
+
+        for i in np.flatnonzero(np.isfinite(self.aabb_min).all(axis=1)):
+            node, root = self.nodes[i], self.roots[i]
+            if root is None or root == node:
+                continue
+            low, high = self.aabb_min[i], self.aabb_max[i]
+            size, center = high - low, (high + low) / 2
+            bbox = terms.iri(str(node) + "_world_bbox")
+            placement = terms.iri(str(node) + "_world_bbox_placement")
+            yield bbox, RDF.type, OWL.NamedIndividual
+            yield bbox, RDF.type, CCF.SpatialEntity
+            yield bbox, CCF.represents_bbox_of, node
+            yield bbox, CCF.x_dimension, decimal(size[0])
+            yield bbox, CCF.y_dimension, decimal(size[1])
+            yield bbox, CCF.z_dimension, decimal(size[2])
+            yield bbox, CCF.dimension_unit, millimeter
+            yield bbox, CCF.has_placement, placement
+            yield placement, RDF.type, OWL.NamedIndividual
+            yield placement, RDF.type, CCF.SpatialPlacement
+            yield placement, CCF.placement_for, bbox
+            yield placement, CCF.placement_relative_to, root
+            for axis, value in zip('xyz', center):
+                yield placement, CCF[axis + '_scaling'], decimal(1)
+                yield placement, CCF[axis + '_rotation'], decimal(0)
+                yield placement, CCF[axis + '_translation'], decimal(value)
+            yield placement, CCF.scaling_unit, terms.string('ratio')
+            yield placement, CCF.rotation_unit, terms.string('degree')
+            yield placement, CCF.rotation_order, terms.string('XYZ')
+            yield placement, CCF.translation_unit, millimeter
+
+
+def resolve(placements, entities):
+    """Resolves the placement chains to world transforms and bounding
+    boxes. `placements` maps placement subjects to their values by field
+    name, and `entities` maps entity subjects to their dimensions. When an
+    entity has several placements, the complete one with the lowest IRI is
+    used
+    """
+    if np is None:
+        raise ImportError("Resolving placements requires NumPy, install "
+                          "spatial2ccf[spatial]")
+    chosen = {}
+    # Sorted, so that the choice does not depend on the order of the triples
+    for placement in sorted(placements, key=str):
+        values = placements[placement]
+        if all(field in values for field in REQUIRED_PLACEMENT_FIELDS):
+            chosen.setdefault(values['source'], values)
+    rows = list(chosen.values())
+
+    # Sorted, so that the table does not depend on the order of the triples
+    nodes = sorted(set(entities).union([v['source'] for v in rows],
+                                       [v['target'] for v in rows]), key=str)
+    index = {node: i for i, node in enumerate(nodes)}
+    count = len(nodes)
+
+    world = np.tile(np.eye(4), (count, 1, 1))
+    parent = np.full(count, -1)
+    if rows:
+        sources = np.array([index[v['source']] for v in rows])
+        world[sources] = local_transforms(rows)
+        parent[sources] = [index[v['target']] for v in rows]
+
+    world, roots = _resolve_chains(world, parent)
+    root_nodes = [nodes[r] if r >= 0 else None for r in roots]
+
+    aabb_min = np.full((count, 3), np.nan)
+    aabb_max = np.full((count, 3), np.nan)
+    sized = [(index[node], values) for node, values in entities.items()
+             if all(field in values for field in DIMENSION_FIELDS)]
+    if sized:
+        at = np.array([i for i, _ in sized])
+        dimensions = _numbers([values for _, values in sized],
+                              DIMENSION_FIELDS)
+        dimensions *= _factors([v.get('dimension_units')
+                                for _, v in sized], LENGTH_UNITS)[:, None]
+        aabb_min[at], aabb_max[at] = bounding_boxes(world[at], dimensions)
+    return WorldTable(nodes, root_nodes, world, aabb_min, aabb_max)
+
+
+def local_transforms(rows):
+    """Returns the 4x4 transforms of the placements in `rows`, as the
+    translation, then the rotation in the rotation order (XYZ unless
+    given), then the scaling, computed for all placements at once
+    """
+    count = len(rows)
+    values = _numbers(rows, TRANSFORM_FIELDS)
+    scaling, angles, translation = values[:, 0:3], values[:, 3:6], \
+        values[:, 6:9]
+    to_radians = _factors([v.get('rotation_units') for v in rows],
+                          ANGLE_UNITS, np.pi / 180.0)
+    angles *= to_radians[:, None]
+    translation *= _factors([v.get('translation_units') for v in rows],
+                            LENGTH_UNITS)[:, None]
+
+    rotations = [_axis_rotations(angles[:, axis], axis) for axis in range(3)]
+    orders = np.array([str(v.get('rotation_order', 'XYZ')).upper()
+                       for v in rows])
+    rotation = np.empty((count, 3, 3))
+    for order in np.unique(orders):
+        if sorted(order) != ['X', 'Y', 'Z']:
+            raise ValueError("Unknown rotation order <" + order + ">")
+        at = orders == order
+        first, second, third = ('XYZ'.index(axis) for axis in order)
+        rotation[at] = rotations[first][at] @ rotations[second][at] @ \
+            rotations[third][at]
+
+    transforms = np.zeros((count, 4, 4))
+    transforms[:, :3, :3] = rotation * scaling[:, None, :]
+    transforms[:, :3, 3] = translation
+    transforms[:, 3, 3] = 1.0
+    return transforms
+
+
+def bounding_boxes(world, dimensions):
+    """Returns the minimum and maximum world corners of the boxes with the
+    given dimensions centered on the origin of each transform
+    """
+    corners = np.array(CORNERS)[None, :, :] * dimensions[:, None, :]
+    points = np.einsum('nij,nkj->nki', world[:, :3, :3], corners) + \
+        world[:, None, :3, 3]
+    return points.min(axis=1), points.max(axis=1)
+
+
+def _resolve_chains(world, parent):
+    # Pointer jumping: every round composes each transform with the one of
+    # its current ancestor, so a chain of length n takes log2(n) rounds
+    ancestor = parent.copy()
+    roots = np.where(parent >= 0, parent, np.arange(len(parent)))
+    for _ in range(max(1, len(parent).bit_length()) + 1):
+        active = np.flatnonzero(ancestor >= 0)
+        if not len(active):
+            break
+        above = ancestor[active]
+        world[active] = world[above] @ world[active]
+        roots[active] = roots[above]
+        ancestor[active] = ancestor[above]
+    # What is left is part of a cycle
+    cyclic = ancestor >= 0
+    world[cyclic] = np.nan
+    roots[cyclic] = -1
+    return world, roots
+
+
+def _axis_rotations(angles, axis):
+    rotation = np.zeros((len(angles), 3, 3))
+    i, j = [(1, 2), (2, 0), (0, 1)][axis]
+    cos, sin = np.cos(angles), np.sin(angles)
+    rotation[:, axis, axis] = 1.0
+    rotation[:, i, i] = cos
+    rotation[:, i, j] = -sin
+    rotation[:, j, i] = sin
+    rotation[:, j, j] = cos
+    return rotation
+
+
+def _factors(units, table, default=1.0):
+    # A missing unit is the default unit
+    units = np.array(['' if unit is None else str(unit) for unit in units])
+    factors = np.full(len(units), default)
+    for unit in np.unique(units):
+        if unit and unit not in table:
+            raise ValueError("Unknown unit <" + unit + ">")
+        elif table.get(unit) is not None:
+            factors[units == unit] = table[unit]
+    return factors
+
+
+def _numbers(rows, fields):
+    # NumPy parses the lexical forms of all the literals at once
+    return np.array([[str(row[field]) for field in fields] for row in rows],
+                    dtype=float)
+
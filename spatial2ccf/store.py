@@ -0,0 +1,202 @@
+import os
+import sqlite3
+
+from rdflib import BNode, Literal, URIRef
+
+from spatial2ccf.writer import open_writer
+
+SCHEMA = [
+    "CREATE TABLE terms (id INTEGER PRIMARY KEY, term TEXT NOT NULL UNIQUE)",
+    "CREATE TABLE triples (s INTEGER NOT NULL, p INTEGER NOT NULL, "
+    "o INTEGER NOT NULL, PRIMARY KEY (s, p, o)) WITHOUT ROWID",
+    "CREATE TABLE namespaces (prefix TEXT PRIMARY KEY, namespace TEXT)",
+]
+
+# The store is scratch space for a single run, so it trades durability
+# for insert speed
+PRAGMAS = [
+    "PRAGMA journal_mode = OFF",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA cache_size = -65536",
+]
+
+SELECT_TRIPLES = (
+    "SELECT s.term, p.term, o.term FROM triples "
+    "JOIN terms s ON s.id = triples.s "
+    "JOIN terms p ON p.id = triples.p "
+    "JOIN terms o ON o.id = triples.o "
+    "ORDER BY triples.s, triples.p, triples.o")
+
+# Terms looked up with a single IN query
+LOOKUP_SIZE = 500
+
+
+class SQLiteStore:
+    """SQLite Store
+    Keeps the triples in an SQLite database on disk instead of in memory,
+    so that corpora larger than the RAM can be converted. It is added to
+    like a streaming writer: every batch of triples is inserted in one
+    transaction, the terms being numbered in a term table and the triples
+    kept as three term numbers under a primary key, which drops the
+    repeated triples. Only the numbers of the last `cache_size` terms are
+    kept in memory. The triples are read back ordered by subject, so that
+    the streaming writers serialize them as one block per subject.
+
+    A store stands in for an rdflib Graph where the converted graph is
+    read, e.g. iterating, `namespaces` and `value`
+    """
+    def __init__(self, path, cache_size=1 << 16):
+        if os.path.exists(path):
+            # Every run starts from an empty store
+            os.remove(path)
+        self.path = path
+        self.cache_size = cache_size
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        for statement in PRAGMAS + SCHEMA:
+            self.connection.execute(statement)
+        self._ids = {}
+
+    def bind(self, prefix, namespace):
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO namespaces VALUES (?, ?)",
+                (prefix, str(namespace)))
+
+    def add(self, triple):
+        self.add_many((triple,))
+
+    def add_many(self, triples):
+        rows = [(encode(s), encode(p), encode(o)) for s, p, o in triples]
+        ids = self._term_ids(rows)
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO triples VALUES (?, ?, ?)",
+                [(ids[s], ids[p], ids[o]) for s, p, o in rows])
+
+    def close(self):
+        self.connection.close()
+
+    def __len__(self):
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM triples").fetchone()[0]
+
+    def __iter__(self):
+        # A connection of its own, so that several outputs can be read at
+        # once on their own threads
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        try:
+            decoded = {}
+            for row in connection.execute(SELECT_TRIPLES):
+                triple = []
+                for text in row:
+                    term = decoded.get(text)
+                    if term is None:
+                        term = decoded[text] = decode(text)
+                    triple.append(term)
+                yield tuple(triple)
+                if len(decoded) > self.cache_size:
+                    decoded.clear()
+        finally:
+            connection.close()
+
+    def namespaces(self):
+        return self.connection.execute(
+            "SELECT prefix, namespace FROM namespaces ORDER BY prefix"
+        ).fetchall()
+
+    def value(self, subject=None, predicate=None, object=None):
+        """Returns a term of a triple that matches the two given terms, as
+        rdflib Graph.value does
+        """
+        terms = [subject, predicate, object]
+        position = terms.index(None)
+        names = ['s', 'p', 'o']
+        conditions = ["%s.term = ?" % names[i] for i in range(3)
+                      if terms[i] is not None]
+        row = self.connection.execute(
+            "SELECT %s.term FROM triples "
+            "JOIN terms s ON s.id = triples.s "
+            "JOIN terms p ON p.id = triples.p "
+            "JOIN terms o ON o.id = triples.o WHERE %s LIMIT 1"
+            % (names[position], " AND ".join(conditions)),
+            [encode(term) for term in terms if term is not None]).fetchone()
+        return decode(row[0]) if row is not None else None
+
+    def serialize(self, destination, format, context=None, compression=None):
+        """Writes the triples with the streaming writer of the format
+        """
+        writer = open_writer(destination, format, context,
+                             compression=compression)
+        for prefix, namespace in self.namespaces():
+            writer.bind(prefix, namespace)
+        batch = []
+        for triple in self:
+            batch.append(triple)
+            if len(batch) >= 10000:
+                writer.add_many(batch)
+                batch = []
+        writer.add_many(batch)
+        writer.close()
+
+    def _term_ids(self, rows):
+        ids = self._ids
+        if len(ids) > self.cache_size:
+            ids.clear()
+        missing = list({term for row in rows for term in row
+                        if term not in ids})
+        if not missing:
+            return ids
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO terms (term) VALUES (?)",
+                [(term,) for term in missing])
+        for start in range(0, len(missing), LOOKUP_SIZE):
+            chunk = missing[start:start + LOOKUP_SIZE]
+            ids.update((term, number) for number, term in
+                       self.connection.execute(
+                           "SELECT id, term FROM terms WHERE term IN (" +
+                           ",".join("?" * len(chunk)) + ")", chunk))
+        return ids
+
+
+def open_store(spec):
+    """Opens a store given as 'sqlite:PATH'
+    """
+    kind, _, path = spec.partition(':')
+    if kind != 'sqlite' or not path:
+        raise ValueError("Unsupported store <" + spec + ">")
+    return SQLiteStore(path)
+
+
+def encode(term):
+    """Returns the text of a term in the term table. Literals keep their
+    lexical form, with the datatype or language before it
+    """
+    # str() first, since adding a str to an rdflib term gives a term
+    value = str(term)
+    if isinstance(term, Literal):
+        if term.language:
+            return "@" + term.language + " " + value
+        elif term.datatype:
+            return "^" + str(term.datatype) + " " + value
+        return '"' + value
+    elif isinstance(term, BNode):
+        return "_" + value
+    return "<" + value
+
+
+def decode(text):
+    """Returns the term of a text of the term table
+    """
+    kind, value = text[0], text[1:]
+    if kind == "<":
+        return URIRef(value)
+    elif kind == '"':
+        return Literal(value)
+    elif kind == "_":
+        return BNode(value)
+    tag, value = value.split(" ", 1)
+    if kind == "@":
+        return Literal(value, lang=tag)
+    return Literal(value, datatype=URIRef(tag))
+
@@ -0,0 +1,87 @@
+import re
+
+from functools import lru_cache, partial
+
+from rdflib import URIRef, Literal
+from rdflib import XSD
+
+from spatial2ccf.namespace import CCF
+
+OBO_PATTERN = re.compile("obo:", re.IGNORECASE)
+UBERON_PATTERN = re.compile("UBERON:", re.IGNORECASE)
+FMA_OBO_PATTERN = re.compile("http://purl.obolibrary.org/obo/FMA_",
+                             re.IGNORECASE)
+
+
+class TermFactory:
+    """Term Factory
+    Builds the URIRef and Literal terms of the ontology and interns them in
+    bounded LRU caches, so that values repeated across records (units,
+    rotation orders, reference organs, publishers, annotations) are only
+    constructed once
+    """
+    def __init__(self, max_size=1 << 16):
+        self.max_size = max_size
+        self._caches = {}
+        self.iri = self._cached('iri', URIRef)
+        self.string = self._cached('string', Literal)
+        self.integer = self._cached('integer',
+                                    partial(Literal, datatype=XSD.integer))
+        self.decimal = self._cached('decimal',
+                                    partial(Literal, datatype=XSD.decimal))
+        self.date = self._cached('date',
+                                 partial(Literal, datatype=XSD.date))
+        self.literal = self._cached('literal', Literal)
+        self.instance_iri = self._cached(
+            'instance_iri',
+            lambda id_string: self.iri(expand_instance_id(id_string)))
+        self.anatomical_entity_iri = self._cached(
+            'anatomical_entity_iri',
+            lambda id_string: self.iri(expand_anatomical_entity_id(id_string)))
+
+    def _cached(self, name, function):
+        cache = lru_cache(maxsize=self.max_size, typed=True)(function)
+        self._caches[name] = cache
+        return cache
+
+    @property
+    def hits(self):
+        return sum(cache.cache_info().hits for cache in self._caches.values())
+
+    @property
+    def misses(self):
+        return sum(cache.cache_info().misses
+                   for cache in self._caches.values())
+
+    def cache_info(self):
+        """Returns the hit and miss counters of every cache by name
+        """
+        return {name: cache.cache_info()._asdict()
+                for name, cache in self._caches.items()}
+
+    def clear(self):
+        for cache in self._caches.values():
+            cache.cache_clear()
+
+
+def expand_instance_id(id_string):
+    if "http://" not in id_string:
+        while id_string[0] == "#":
+            id_string = id_string[1:]
+        return CCF._NS + "latest/ccf.owl#" + id_string
+    else:
+        return id_string
+
+
+def expand_anatomical_entity_id(str):
+    id_string = str
+    if "obo:" in str:
+        id_string = OBO_PATTERN.sub(
+            "http://purl.obolibrary.org/obo/", str)
+    elif "UBERON:" in str:
+        id_string = UBERON_PATTERN.sub(
+            "http://purl.obolibrary.org/obo/UBERON_", str)
+    elif "http://purl.obolibrary.org/obo/FMA_" in str:
+        id_string = FMA_OBO_PATTERN.sub(
+            "http://purl.org/sig/ont/fma/fma", str)
+    return id_string
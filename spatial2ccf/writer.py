@@ -0,0 +1,509 @@
+import io
+import json
+import os
+import queue
+import re
+import sys
+import threading
+
+from functools import lru_cache
+
+from rdflib import Graph, Literal, URIRef
+from rdflib import RDF, RDFS, XSD
+from rdflib.plugins.serializers.nt import _quoteLiteral, _quote_encode
+from rdflib.term import _is_valid_uri
+
+from spatial2ccf.compression import EXTENSIONS, open_output
+
+PN_LOCAL_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_-]*$')
+
+
+class NTriplesWriter:
+    """N-Triples Writer
+    Writes each triple to the destination as soon as it is added, so that
+    the output never has to be held in an in-memory graph. The output is
+    compressed as given by `compression` or by the destination extension.
+    The last `cache_size` terms are rendered once
+    """
+    def __init__(self, destination=None, buffer_size=1 << 16,
+                 compression=None, cache_size=1 << 16):
+        self.stream, self._owns_stream = _open_stream(
+            destination, compression, buffer_size)
+        self._term = lru_cache(maxsize=cache_size)(nt_term)
+
+    def bind(self, prefix, namespace):
+        pass
+
+    def add(self, triple):
+        self.stream.write(self._row(triple).encode('ascii',
+                                                   '_rdflib_nt_escape'))
+
+    def add_many(self, triples):
+        self.stream.write(''.join(map(self._row, triples)).encode(
+            'ascii', '_rdflib_nt_escape'))
+
+    def add_rows(self, rows):
+        """Writes triples that are already serialized as N-Triples rows
+        """
+        self.stream.write(rows.encode('ascii', '_rdflib_nt_escape'))
+
+    def position(self):
+        """Returns the offset of the next row in an uncompressed output
+        file, or None when the output is not one
+        """
+        if self._owns_stream and isinstance(self.stream, io.BufferedWriter):
+            return self.stream.tell()
+        return None
+
+    def copy(self, source, offset, length):
+        """Writes `length` bytes of the binary file `source` from `offset`,
+        e.g. rows of a previous output
+        """
+        source.seek(offset)
+        self.stream.write(source.read(length))
+
+    def _row(self, triple):
+        return nt_row(triple, self._term)
+
+    def close(self):
+        if self._owns_stream:
+            self.stream.close()
+        else:
+            self.stream.flush()
+
+
+class NQuadsWriter(NTriplesWriter):
+    """N-Quads Writer
+    Same as the N-Triples writer but puts every triple into the named graph
+    given by the context IRI
+    """
+    def __init__(self, destination=None, context=None, **kwargs):
+        super().__init__(destination, **kwargs)
+        self.context = context
+
+    def _row(self, triple):
+        row = nt_row(triple, self._term)
+        if self.context is None:
+            return row
+        return row[:-2] + self.context.n3() + " .\n"
+
+    def add_rows(self, rows):
+        if rows and self.context is not None:
+            suffix = " " + self.context.n3() + " .\n"
+            rows = ''.join(row[:-2] + suffix
+                           for row in rows[:-1].split('\n'))
+        super().add_rows(rows)
+
+
+class TurtleWriter:
+    """Turtle Writer
+    Writes the triples of one subject as a single Turtle block in one
+    linear pass, relying on the converter to emit the triples of a subject
+    together. A subject that comes back later simply starts a new block.
+    With `sort` the triples are collected first and written ordered by
+    subject, predicate and object, which gives a deterministic output at
+    the cost of holding the triples in memory
+    """
+    def __init__(self, destination=None, sort=False, buffer_size=1 << 16,
+                 compression=None):
+        self.stream, self._owns_stream = _open_stream(
+            destination, compression, buffer_size)
+        self.sort = sort
+        self.namespaces = [('rdf', str(RDF)), ('rdfs', str(RDFS)),
+                           ('xsd', str(XSD))]
+        self.triples = []
+        self._started = False
+        self._subject = None
+        self._predicate = None
+        self._term = lru_cache(maxsize=1 << 16)(self._term)
+
+    def bind(self, prefix, namespace):
+        self.namespaces = [(p, n) for p, n in self.namespaces if p != prefix]
+        self.namespaces.append((prefix, str(namespace)))
+
+    def add(self, triple):
+        if self.sort:
+            self.triples.append(triple)
+        else:
+            self.stream.write(self._block(triple).encode('utf-8'))
+
+    def add_many(self, triples):
+        if self.sort:
+            self.triples.extend(triples)
+        else:
+            self.stream.write(''.join(map(self._block, triples))
+                              .encode('utf-8'))
+
+    def close(self):
+        if self.sort:
+            triples = sorted(set(self.triples),
+                             key=lambda t: (t[0], t[1], t[2].n3()))
+            self.triples = []
+            self.sort = False
+            self.add_many(triples)
+        text = self._header() if not self._started else ''
+        if self._subject is not None:
+            text += " .\n"
+        self.stream.write(text.encode('utf-8'))
+        if self._owns_stream:
+            self.stream.close()
+        else:
+            self.stream.flush()
+
+    def _block(self, triple):
+        s, p, o = triple
+        text = self._header() if not self._started else ''
+        if s == self._subject:
+            if p == self._predicate:
+                text += " ,\n        "
+            else:
+                text += " ;\n    " + self._predicate_term(p) + " "
+        else:
+            if self._subject is not None:
+                text += " .\n\n"
+            text += self._term(s) + " " + self._predicate_term(p) + " "
+        self._subject = s
+        self._predicate = p
+        return text + self._term(o)
+
+    def _header(self):
+        self._started = True
+        return ''.join("@prefix " + prefix + ": <" + namespace + "> .\n"
+                       for prefix, namespace in self.namespaces) + "\n"
+
+    def _predicate_term(self, p):
+        return "a" if p == RDF.type else self._term(p)
+
+    def _term(self, term):
+        if isinstance(term, Literal):
+            text = _quote_encode(term)
+            if term.language:
+                return text + "@" + term.language
+            elif term.datatype:
+                return text + "^^" + self._term(term.datatype)
+            return text
+        iri = str(term)
+        for prefix, namespace in reversed(self.namespaces):
+            if iri.startswith(namespace):
+                local_name = iri[len(namespace):]
+                if PN_LOCAL_PATTERN.match(local_name):
+                    return prefix + ":" + local_name
+        return "<" + _check_iri(iri) + ">"
+
+
+class JSONLDWriter:
+    """JSON-LD Writer
+    Writes a flat JSON-LD document in one linear pass, with one node object
+    for every run of triples with the same subject, like the Turtle writer.
+    The bound prefixes make up the @context and IRIs in their namespaces
+    are written as compact IRIs. Literals keep their lexical form
+    """
+    def __init__(self, destination=None, buffer_size=1 << 16,
+                 compression=None):
+        self.stream, self._owns_stream = _open_stream(
+            destination, compression, buffer_size)
+        self.namespaces = [('rdf', str(RDF)), ('rdfs', str(RDFS)),
+                           ('xsd', str(XSD))]
+        self._started = False
+        self._subject = None
+        self._node = None
+        self._term = lru_cache(maxsize=1 << 16)(self._term)
+
+    def bind(self, prefix, namespace):
+        self.namespaces = [(p, n) for p, n in self.namespaces if p != prefix]
+        self.namespaces.append((prefix, str(namespace)))
+
+    def add(self, triple):
+        self.add_many((triple,))
+
+    def add_many(self, triples):
+        text = []
+        node = self._node
+        for s, p, o in triples:
+            if s != self._subject:
+                if node is not None:
+                    text.append(self._dump(node))
+                node = {'@id': self._term(s)}
+                self._subject = s
+            if p == RDF.type:
+                key, value = '@type', self._term(o)
+            else:
+                key, value = self._term(p), self._value(o)
+            previous = node.get(key)
+            if previous is None:
+                node[key] = value
+            elif isinstance(previous, list):
+                previous.append(value)
+            else:
+                node[key] = [previous, value]
+        self._node = node
+        self.stream.write(''.join(text).encode('utf-8'))
+
+    def close(self):
+        text = self._dump(self._node) if self._node is not None else ''
+        if not self._started:
+            text += self._header()
+        self.stream.write((text + "\n]}\n").encode('utf-8'))
+        if self._owns_stream:
+            self.stream.close()
+        else:
+            self.stream.flush()
+
+    def _dump(self, node):
+        if self._started:
+            text = ",\n"
+        else:
+            text = self._header() + "\n"
+        return text + json.dumps(node, ensure_ascii=False)
+
+    def _header(self):
+        self._started = True
+        context = dict(self.namespaces)
+        return '{"@context": ' + json.dumps(context) + ', "@graph": ['
+
+    def _value(self, term):
+        if not isinstance(term, Literal):
+            return {'@id': self._term(term)}
+        elif term.language:
+            return {'@value': str(term), '@language': term.language}
+        elif term.datatype and term.datatype != XSD.string:
+            return {'@value': str(term), '@type': self._term(term.datatype)}
+        return str(term)
+
+    def _term(self, term):
+        iri = str(term)
+        for prefix, namespace in reversed(self.namespaces):
+            if iri.startswith(namespace):
+                local_name = iri[len(namespace):]
+                if PN_LOCAL_PATTERN.match(local_name):
+                    return prefix + ":" + local_name
+        return _check_iri(iri)
+
+
+class MultiWriter:
+    """Multi Writer
+    Sends every triple to several writers, e.g. to write Turtle, N-Triples
+    and JSON-LD from the same conversion. Each writer runs on its own
+    thread and is fed through a bounded queue of batches, so that a slow
+    output (e.g. one that is compressed) does not hold back the others
+    """
+    def __init__(self, writers, max_pending=8):
+        self.writers = writers
+        self._queues = []
+        self._threads = []
+        self._errors = []
+        for writer in writers:
+            pending = queue.Queue(max_pending)
+            thread = threading.Thread(target=self._run,
+                                      args=(writer, pending), daemon=True)
+            thread.start()
+            self._queues.append(pending)
+            self._threads.append(thread)
+
+    def bind(self, prefix, namespace):
+        self._send('bind', (prefix, namespace))
+
+    def add(self, triple):
+        self._send('add_many', ([triple],))
+
+    def add_many(self, triples):
+        # The batch is shared by the writers, so it must not change later
+        self._send('add_many', (tuple(triples),))
+
+    def close(self):
+        self._send('close', ())
+        for pending, thread in zip(self._queues, self._threads):
+            pending.put(None)
+            thread.join()
+        if self._errors:
+            raise self._errors[0]
+
+    def _send(self, method, args):
+        if self._errors:
+            raise self._errors[0]
+        for pending in self._queues:
+            pending.put((method, args))
+
+    def _run(self, writer, pending):
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            if self._errors:
+                # Keep draining the queue so that the sender never blocks
+                continue
+            method, args = item
+            try:
+                getattr(writer, method)(*args)
+            except Exception as e:
+                self._errors.append(e)
+
+
+class TripleList(list):
+    """Triple List
+    Collects the triples in the order they are added, e.g. to send them to
+    another process
+    """
+    def bind(self, prefix, namespace):
+        pass
+
+    def add(self, triple):
+        self.append(triple)
+
+    def add_many(self, triples):
+        self.extend(triples)
+
+    def close(self):
+        pass
+
+
+class TripleBuffer:
+    """Triple Buffer
+    Collects the triples added to it and passes them on to the target graph
+    or writer in batches of `flush_size` triples. Batches for an rdflib
+    Graph are deduplicated first, since the graph would drop the repeated
+    triples anyway, while writers receive every triple in order
+    """
+    def __init__(self, target, flush_size=10000):
+        self.target = target
+        self.flush_size = flush_size
+        self.triples = []
+        self.count = 0
+        self._to_graph = isinstance(target, Graph)
+
+    def add(self, triple):
+        self.triples.append(triple)
+        if len(self.triples) >= self.flush_size:
+            self.flush()
+
+    def add_many(self, triples):
+        self.triples.extend(triples)
+        if len(self.triples) >= self.flush_size:
+            self.flush()
+
+    extend = add_many
+
+    def __len__(self):
+        # Position of the next triple in the stream of added triples
+        return self.count + len(self.triples)
+
+    def flush(self):
+        if not self.triples:
+            return
+        self.count += len(self.triples)
+        if self._to_graph:
+            graph = self.target
+            graph.addN((s, p, o, graph)
+                       for s, p, o in dict.fromkeys(self.triples))
+        else:
+            self.target.add_many(self.triples)
+        self.triples = []
+
+
+def nt_row(triple, term=None):
+    """Returns the triple as an N-Triples row, like rdflib's N-Triples
+    serializer, with its terms rendered by `term`, e.g. a cached `nt_term`
+    """
+    if term is None:
+        term = nt_term
+    s, p, o = triple
+    return term(s) + " " + term(p) + " " + term(o) + " .\n"
+
+
+def nt_term(term):
+    """Returns the N-Triples form of a term. rdflib checks the IRI of a
+    term every time it is written, so callers cache this per term
+    """
+    if isinstance(term, Literal):
+        return _quoteLiteral(term)
+    elif isinstance(term, URIRef):
+        return "<" + _check_iri(str(term)) + ">"
+    return term.n3()
+
+
+def _check_iri(iri):
+    # The same check as rdflib's serializers, which reject IRIs with
+    # spaces or any of <>"{}|\^`
+    if not _is_valid_uri(iri):
+        raise ValueError("Invalid IRI <" + iri + ">")
+    return iri
+
+
+def _open_stream(destination, compression, buffer_size):
+    """Returns the binary stream for a writer and whether the writer owns
+    it. The destination can be a path, a binary file object that stays
+    open, or None for the standard output
+    """
+    if hasattr(destination, 'write'):
+        return destination, False
+    elif destination is None and compression is None:
+        return sys.stdout.buffer, False
+    return open_output(destination, compression, buffer_size), True
+
+
+WRITERS = {
+    'ttl': TurtleWriter,
+    'nt': NTriplesWriter,
+    'nq': NQuadsWriter,
+    'jsonld': JSONLDWriter,
+}
+
+FORMAT_EXTENSIONS = {
+    '.ttl': 'ttl',
+    '.nt': 'nt',
+    '.nq': 'nq',
+    '.jsonld': 'jsonld',
+    '.json': 'jsonld',
+}
+
+
+def format_for(destination, default='ttl'):
+    """Returns the output format implied by the extension of
+    `destination`, ignoring a compression extension
+    """
+    if destination is None:
+        return default
+    root, extension = os.path.splitext(destination)
+    if extension.lower() in EXTENSIONS:
+        extension = os.path.splitext(root)[1]
+    return FORMAT_EXTENSIONS.get(extension.lower(), default)
+
+
+def resolve_outputs(destinations, format=None):
+    """Returns a (destination, format) pair for every destination. The
+    given format applies to all of them, otherwise each format is taken
+    from the destination extension. No destination means the standard
+    output
+    """
+    if not destinations:
+        return [(None, format or 'ttl')]
+    return [(destination, format or format_for(destination))
+            for destination in destinations]
+
+
+def open_writer(destination, format, context=None, sort=False,
+                compression=None):
+    """Returns a streaming writer for the given output format
+    """
+    try:
+        writer_class = WRITERS[format]
+    except KeyError:
+        raise ValueError("Streaming is not supported for format <" +
+                         format + ">")
+    if writer_class is NQuadsWriter:
+        return writer_class(destination, context=context,
+                            compression=compression)
+    elif writer_class is TurtleWriter:
+        return writer_class(destination, sort=sort, compression=compression)
+    return writer_class(destination, compression=compression)
+
+
+def open_writers(outputs, context=None, sort=False, compression=None):
+    """Returns a streaming writer for the (destination, format) pairs in
+    `outputs`, which is a MultiWriter when there are several of them
+    """
+    writers = [open_writer(destination, format, context, sort, compression)
+               for destination, format in outputs]
+    if len(writers) == 1:
+        return writers[0]
+    return MultiWriter(writers)
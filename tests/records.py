@@ -0,0 +1,32 @@
+"""Small RUI records for the tests
+"""
+
+
+def placement(placement_id, target):
+    return {
+        "@id": placement_id, "@type": "SpatialPlacement", "target": target,
+        "placement_date": "2021-01-01",
+        "x_scaling": 1, "y_scaling": 1, "z_scaling": 1,
+        "scaling_units": "ratio",
+        "x_rotation": 0, "y_rotation": 0, "z_rotation": 0,
+        "rotation_units": "degree",
+        "x_translation": 1, "y_translation": 2, "z_translation": 3,
+        "translation_units": "millimeter"
+    }
+
+
+def entity(index, file="organ.glb"):
+    entity_id = "#Entity_" + str(index)
+    return {
+        "@id": entity_id, "@type": "SpatialEntity",
+        "creator_first_name": "Ellen", "creator_last_name": "Quardokus",
+        "creation_date": "2021-01-01",
+        "x_dimension": 10, "y_dimension": 10, "z_dimension": 10,
+        "dimension_units": "millimeter",
+        "object": {
+            "@id": entity_id + "Obj", "file": file,
+            "file_format": "model/gltf-binary",
+            "placement": placement(entity_id + "ObjPlacement", "#Organ")
+        },
+        "placement": placement(entity_id + "Placement", "#Organ")
+    }
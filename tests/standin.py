@@ -0,0 +1,72 @@
+"""Local HTTP stand-in server for the fetch and cache tests
+"""
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StandInServer:
+    """Serves the documents in `documents`, a dict of path → dict with the
+    'body' bytes and optionally an 'etag', a 'last_modified' date, a
+    'status' to answer with instead and a 'delay' in seconds. Conditional
+    requests are answered with 304 Not Modified when the validator matches.
+    Every request is recorded in `requests` as (path, headers)
+    """
+    def __init__(self, documents=None):
+        self.documents = {} if documents is None else documents
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests.append((self.path, dict(self.headers)))
+                document = server.documents.get(self.path)
+                if document is None:
+                    self.send_error(404)
+                    return
+                time.sleep(document.get('delay', 0))
+                if 'status' in document:
+                    self.send_error(document['status'])
+                    return
+                etag = document.get('etag')
+                last_modified = document.get('last_modified')
+                if (etag and self.headers.get('If-None-Match') == etag) or \
+                        (last_modified and
+                         self.headers.get('If-Modified-Since') ==
+                         last_modified):
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                if etag:
+                    self.send_header('ETag', etag)
+                if last_modified:
+                    self.send_header('Last-Modified', last_modified)
+                self.send_header('Content-Length',
+                                 str(len(document['body'])))
+                self.end_headers()
+                self.wfile.write(document['body'])
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                       daemon=True)
+
+    def url(self, path):
+        return "http://127.0.0.1:%d%s" % (self.httpd.server_port, path)
+
+    def responses(self, path):
+        """Returns the headers of the requests made for `path`
+        """
+        return [headers for p, headers in self.requests if p == path]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,31 @@
+import asyncio
+import unittest
+
+import spatial2ccf
+
+from tests.records import entity
+
+ONTOLOGY_IRI = "http://purl.org/ccf/data/test.owl"
+
+
+class APITest(unittest.TestCase):
+
+    def test_lazy_exports(self):
+        from spatial2ccf import aconvert, convert
+        self.assertTrue(callable(convert) and callable(aconvert))
+        with self.assertRaises(AttributeError):
+            spatial2ccf.missing
+
+    def test_convert_and_aconvert_agree(self):
+        records = [entity(1), entity(2)]
+        triples = list(spatial2ccf.convert(records, ONTOLOGY_IRI))
+
+        async def collect():
+            return [triple async for triple in
+                    spatial2ccf.aconvert(records, ONTOLOGY_IRI)]
+        self.assertEqual(asyncio.run(collect()), triples)
+        self.assertEqual(len(set(triples)), len(triples))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import requests
+
+from spatial2ccf.cache import HTTPCache
+
+from tests.standin import StandInServer
+
+LAST_MODIFIED = "Tue, 01 Sep 2020 00:00:00 GMT"
+
+
+class HTTPCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.server = StandInServer({
+            '/etag': {'body': b'etag body', 'etag': '"v1"'},
+            '/modified': {'body': b'modified body',
+                          'last_modified': LAST_MODIFIED},
+            '/a': {'body': b'a' * 10, 'etag': '"a"'},
+            '/b': {'body': b'b' * 10, 'etag': '"b"'},
+            '/c': {'body': b'c' * 10, 'etag': '"c"'}
+        })
+        self.server.__enter__()
+        self.session = requests.Session()
+
+    def tearDown(self):
+        self.session.close()
+        self.server.__exit__(None, None, None)
+        shutil.rmtree(self.directory)
+
+    def read(self, cache, path):
+        with cache.open(self.session, self.server.url(path)) as f:
+            return f.read()
+
+    def cached(self, cache):
+        return sorted(name for name in os.listdir(cache.directory)
+                      if name.endswith('.body'))
+
+    def test_etag_not_modified(self):
+        cache = HTTPCache(self.directory)
+        self.assertEqual(self.read(cache, '/etag'), b'etag body')
+        self.assertEqual(self.read(cache, '/etag'), b'etag body')
+        first, second = self.server.responses('/etag')
+        self.assertNotIn('If-None-Match', first)
+        self.assertEqual(second['If-None-Match'], '"v1"')
+
+    def test_last_modified_not_modified(self):
+        cache = HTTPCache(self.directory)
+        self.assertEqual(self.read(cache, '/modified'), b'modified body')
+        self.assertEqual(self.read(cache, '/modified'), b'modified body')
+        second = self.server.responses('/modified')[1]
+        self.assertEqual(second['If-Modified-Since'], LAST_MODIFIED)
+
+    def test_modified(self):
+        cache = HTTPCache(self.directory)
+        self.read(cache, '/etag')
+        self.server.documents['/etag'] = {'body': b'new body',
+                                          'etag': '"v2"'}
+        self.assertEqual(self.read(cache, '/etag'), b'new body')
+        self.assertEqual(self.read(cache, '/etag'), b'new body')
+        self.assertEqual(
+            self.server.responses('/etag')[2]['If-None-Match'], '"v2"')
+
+    def test_offline(self):
+        self.read(HTTPCache(self.directory), '/etag')
+        cache = HTTPCache(self.directory, offline=True)
+        self.assertEqual(self.read(cache, '/etag'), b'etag body')
+        with self.assertRaises(ValueError):
+            self.read(cache, '/modified')
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_least_recently_used_evicted(self):
+        cache = HTTPCache(self.directory, max_size=25)
+        for path in ['/a', '/b', '/a', '/c']:
+            self.read(cache, path)
+            # Access times must differ on coarse file system clocks
+            time.sleep(0.05)
+        self.assertEqual(len(self.cached(cache)), 2)
+        offline = HTTPCache(self.directory, offline=True)
+        self.assertEqual(self.read(offline, '/a'), b'a' * 10)
+        self.assertEqual(self.read(offline, '/c'), b'c' * 10)
+        with self.assertRaises(ValueError):
+            self.read(offline, '/b')
+
+    def test_evicted_while_revalidating(self):
+        cache = HTTPCache(self.directory)
+        self.read(cache, '/etag')
+        get = self.session.get
+
+        def evict_and_get(url, **kwargs):
+            # Another thread evicts the entry while it is revalidated
+            for name in os.listdir(self.directory):
+                os.remove(os.path.join(self.directory, name))
+            self.session.get = get
+            return get(url, **kwargs)
+
+        self.session.get = evict_and_get
+        self.assertEqual(self.read(cache, '/etag'), b'etag body')
+        second, third = self.server.responses('/etag')[1:]
+        self.assertEqual(second['If-None-Match'], '"v1"')
+        self.assertNotIn('If-None-Match', third)
+        self.assertEqual(len(self.cached(cache)), 1)
+
+    def test_body_missing(self):
+        cache = HTTPCache(self.directory)
+        self.read(cache, '/etag')
+        os.remove(os.path.join(self.directory, self.cached(cache)[0]))
+        self.assertEqual(self.read(cache, '/etag'), b'etag body')
+        self.assertNotIn('If-None-Match', self.server.responses('/etag')[1])
+        self.assertEqual(len(self.cached(cache)), 1)
+
+    def test_session_validators_ignored(self):
+        # A 304 to the session's own validators would leave nothing to read
+        self.session.headers['If-None-Match'] = '"v1"'
+        cache = HTTPCache(self.directory)
+        self.assertEqual(self.read(cache, '/etag'), b'etag body')
+        self.assertNotIn('If-None-Match', self.server.responses('/etag')[0])
+        offline = HTTPCache(self.directory, offline=True)
+        self.assertEqual(self.read(offline, '/etag'), b'etag body')
+
+    def test_not_modified_without_body(self):
+        self.server.documents['/broken'] = {'body': b'', 'status': 304}
+        cache = HTTPCache(self.directory)
+        with self.assertRaises(ValueError):
+            self.read(cache, '/broken')
+        self.assertEqual(self.cached(cache), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import json
+import os
+import tempfile
+import unittest
+
+from spatial2ccf.checkpoint import CheckpointMutator
+from spatial2ccf.ontology import SPOntology
+
+from tests.records import entity
+
+ONTOLOGY_IRI = "http://purl.org/ccf/data/test.owl"
+INPUTS = {
+    "first.json": [entity(i) for i in range(5)],
+    "second.json": [entity(i) for i in range(3, 9)]
+}
+
+
+class Killed(Exception):
+    pass
+
+
+def killed_after(records, count):
+    for i, record in enumerate(records):
+        if i == count:
+            raise Killed()
+        yield record
+
+
+def convert(mutator, killed_at=None):
+    o = SPOntology.new(ONTOLOGY_IRI)
+    inputs = mutator.restore(o, list(INPUTS))
+    for url in inputs:
+        records = INPUTS[url]
+        if killed_at is not None and url == killed_at[0]:
+            records = killed_after(records, killed_at[1])
+        o = mutator.mutate(o, records)
+    return o
+
+
+class CheckpointMutatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.checkpoint = os.path.join(self.directory.name, "run.checkpoint")
+        with CheckpointMutator() as mutator:
+            self.expected = set(convert(mutator).graph)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def resume(self):
+        with CheckpointMutator(self.checkpoint, every=2,
+                               resume=True) as mutator:
+            o = convert(mutator)
+        self.assertTrue(os.path.exists(self.checkpoint))
+        mutator.written([])
+        self.assertFalse(os.path.exists(self.checkpoint))
+        self.assertFalse(os.path.exists(self.checkpoint + ".triples"))
+        return o
+
+    def test_resume_after_failure(self):
+        with self.assertRaises(Killed):
+            with CheckpointMutator(self.checkpoint, every=2) as mutator:
+                convert(mutator, killed_at=("second.json", 3))
+        self.assertEqual(set(self.resume().graph), self.expected)
+
+    def test_resume_after_kill(self):
+        # Killed without leaving the with block, e.g. by SIGKILL: only the
+        # checkpoints saved every 2 records are left
+        mutator = CheckpointMutator(self.checkpoint, every=2).__enter__()
+        with self.assertRaises(Killed):
+            convert(mutator, killed_at=("second.json", 3))
+        self.assertEqual(set(self.resume().graph), self.expected)
+
+    def test_kept_until_written(self):
+        with CheckpointMutator(self.checkpoint, every=2) as mutator:
+            convert(mutator)
+        # The outputs failed: the resumed run has nothing left to convert
+        with CheckpointMutator(self.checkpoint, resume=True) as mutator:
+            o = SPOntology.new(ONTOLOGY_IRI)
+            self.assertEqual(mutator.restore(o, list(INPUTS)), [])
+        self.assertEqual(set(o.graph), self.expected)
+
+    def test_quarantine(self):
+        quarantine = os.path.join(self.directory.name, "rejected.jsonl")
+        broken = entity(9)
+        del broken["creation_date"]
+        with CheckpointMutator(quarantine_path=quarantine) as mutator:
+            o = SPOntology.new(ONTOLOGY_IRI)
+            mutator.restore(o, ["first.json"])
+            o = mutator.mutate(o, INPUTS["first.json"][:2] + [broken] +
+                               INPUTS["first.json"][2:])
+        self.assertEqual(mutator.quarantined, 1)
+        with open(quarantine, encoding='utf-8') as f:
+            rejected = [json.loads(line) for line in f]
+        self.assertEqual(len(rejected), 1)
+        self.assertEqual(rejected[0]['input'], "first.json")
+        self.assertEqual(rejected[0]['offset'], 2)
+        self.assertEqual(rejected[0]['record'], broken)
+        self.assertIn("creation_date", rejected[0]['error'])
+        expected = SPOntology.new(ONTOLOGY_IRI).mutate(INPUTS["first.json"])
+        self.assertEqual(set(o.graph), set(expected.graph))
+
+
+if __name__ == '__main__':
+    unittest.main()
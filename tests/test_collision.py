@@ -0,0 +1,95 @@
+import unittest
+
+from types import SimpleNamespace
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from rdflib import URIRef
+
+from spatial2ccf import collision
+from spatial2ccf.namespace import CCF
+
+STRUCTURES = [URIRef("http://purl.obolibrary.org/obo/UBERON_%07d" % i)
+              for i in range(5)]
+
+
+def random_scene(rng, structures=60, blocks=200):
+    low = rng.uniform(0, 100, (structures + blocks, 3))
+    high = low + rng.uniform(1, 20, (structures + blocks, 3))
+    nodes = [URIRef("http://example.org/node_%d" % i)
+             for i in range(structures + blocks)]
+    entities = {}
+    for i, node in enumerate(nodes):
+        entities[node] = {'representation_of': STRUCTURES[i % 5]} \
+            if i < structures else {}
+    roots = ["#Organ%d" % (i % 2) for i in range(len(nodes))]
+    table = SimpleNamespace(nodes=nodes, roots=roots, aabb_min=low,
+                            aabb_max=high)
+    annotations = {nodes[structures]: {STRUCTURES[0]}}
+    collector = SimpleNamespace(entities=entities, annotations=annotations)
+    return table, collector, structures
+
+
+def brute_force(table, collector, structures, mode):
+    triples = []
+    for b in range(structures, len(table.nodes)):
+        block = table.nodes[b]
+        if collector.annotations.get(block) and mode != 'all':
+            continue
+        found = set()
+        for s in range(structures):
+            if table.roots[s] == table.roots[b] and \
+                    (table.aabb_min[b] <= table.aabb_max[s]).all() and \
+                    (table.aabb_max[b] >= table.aabb_min[s]).all():
+                found.add(collector.entities[table.nodes[s]][
+                    'representation_of'])
+        found -= collector.annotations.get(block, set())
+        triples.extend((block, CCF.collides_with, structure)
+                       for structure in found)
+    return sorted(triples)
+
+
+@unittest.skipIf(np is None, "requires NumPy")
+class FindCollisionsTest(unittest.TestCase):
+
+    def test_matches_brute_force(self):
+        table, collector, structures = random_scene(np.random.default_rng(0))
+        for mode in ('missing', 'all'):
+            expected = brute_force(table, collector, structures, mode)
+            found = list(collision.find_collisions(table, collector, mode))
+            self.assertEqual(sorted(found), expected)
+            self.assertEqual(len(set(found)), len(found))
+
+    def test_existing_annotations_not_repeated(self):
+        table, collector, structures = random_scene(np.random.default_rng(2))
+        collector.annotations = {}
+        found = {}
+        for block, _, structure in collision.find_collisions(
+                table, collector, 'all'):
+            found.setdefault(block, []).append(structure)
+        block = next(block for block, computed in found.items()
+                     if len(computed) > 1)
+        kept, *missing = found[block]
+        collector.annotations = {block: {kept}}
+        again = [structure for node, _, structure in
+                 collision.find_collisions(table, collector, 'all')
+                 if node == block]
+        self.assertEqual(again, missing)
+
+    def test_sorting_fallback(self):
+        table, collector, structures = random_scene(np.random.default_rng(1))
+        matrix = list(collision.find_collisions(table, collector, 'all'))
+        max_pair_matrix = collision.MAX_PAIR_MATRIX
+        collision.MAX_PAIR_MATRIX = 0
+        try:
+            unique = list(collision.find_collisions(table, collector, 'all'))
+        finally:
+            collision.MAX_PAIR_MATRIX = max_pair_matrix
+        self.assertEqual(matrix, unique)
+
+
+if __name__ == '__main__':
+    unittest.main()
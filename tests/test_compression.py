@@ -0,0 +1,96 @@
+import bz2
+import gzip
+import io
+import json
+import lzma
+import os
+import tempfile
+import unittest
+
+from spatial2ccf.compression import CompressedStream, compression_for
+from spatial2ccf.compression import decompress, detect, open_input
+from spatial2ccf.compression import open_output
+from spatial2ccf.reader import load, open_text
+
+from tests.records import entity
+
+DECOMPRESS = {'gzip': gzip.decompress, 'bz2': bz2.decompress,
+              'xz': lzma.decompress}
+EXTENSION = {'gzip': '.gz', 'bz2': '.bz2', 'xz': '.xz'}
+DATA = json.dumps([entity(i) for i in range(50)]).encode('utf-8')
+
+
+class Failing(io.RawIOBase):
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        raise OSError("disk full")
+
+
+class CompressionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        for compression, extension in EXTENSION.items():
+            path = os.path.join(self.directory.name, "out.nt" + extension)
+            with self.subTest(compression=compression):
+                self.assertEqual(compression_for(path), compression)
+                with open_output(path) as f:
+                    # Several chunks handed over to the background thread
+                    f.chunk_size = 1000
+                    for start in range(0, len(DATA), 700):
+                        f.write(DATA[start:start + 700])
+                with open(path, 'rb') as f:
+                    compressed = f.read()
+                self.assertEqual(detect(compressed), compression)
+                self.assertEqual(DECOMPRESS[compression](compressed), DATA)
+                self.assertEqual(decompress(compressed), DATA)
+                with open(path, 'rb') as f:
+                    self.assertEqual(open_input(f).read(), DATA)
+
+    def test_explicit_compression(self):
+        path = os.path.join(self.directory.name, "out.nt")
+        with open_output(path, 'xz') as f:
+            f.write(DATA)
+        with open(path, 'rb') as f:
+            self.assertEqual(lzma.decompress(f.read()), DATA)
+        self.assertIsNone(compression_for(path))
+
+    def test_uncompressed_input(self):
+        self.assertIsNone(detect(DATA))
+        self.assertEqual(decompress(DATA), DATA)
+        self.assertEqual(open_input(io.BytesIO(DATA)).read(), DATA)
+
+    def test_compressed_records(self):
+        for compression in DECOMPRESS:
+            with self.subTest(compression=compression):
+                stream = io.BytesIO()
+                with CompressedStream(stream, compression, False) as f:
+                    f.write(DATA)
+                records = load(open_text(io.BytesIO(stream.getvalue())))
+                self.assertEqual(list(records), json.loads(DATA))
+
+    def test_write_error_raised(self):
+        stream = CompressedStream(Failing(), 'gzip', chunk_size=10)
+        with self.assertRaises(OSError):
+            for _ in range(100):
+                stream.write(DATA)
+        # Raised again when the stream is closed
+        with self.assertRaises(OSError):
+            stream.close()
+        self.assertTrue(stream.closed)
+
+    def test_unsupported(self):
+        with self.assertRaises(ValueError):
+            CompressedStream(io.BytesIO(), 'zip')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import json
+import unittest
+
+import requests
+
+from spatial2ccf.fetch import iter_documents, open_session
+
+from tests.standin import StandInServer
+
+
+def document(index):
+    return json.dumps([{'@id': "#Entity_" + str(index)}]).encode('utf-8')
+
+
+class FetchTest(unittest.TestCase):
+
+    def setUp(self):
+        # The first documents arrive last
+        self.server = StandInServer({
+            '/' + str(index): {'body': document(index),
+                               'delay': 0.05 * (5 - index)}
+            for index in range(6)
+        })
+        self.server.__enter__()
+        self.session = open_session(3)
+
+    def tearDown(self):
+        self.session.close()
+        self.server.__exit__(None, None, None)
+
+    def fetch(self, paths, jobs):
+        urls = [self.server.url(path) for path in paths]
+        return [list(data) for data in
+                iter_documents(self.session, urls, jobs)]
+
+    def test_order(self):
+        paths = ['/' + str(index) for index in range(6)]
+        expected = [[{'@id': "#Entity_" + str(index)}]
+                    for index in range(6)]
+        for jobs in [1, 3]:
+            with self.subTest(jobs=jobs):
+                self.assertEqual(self.fetch(paths, jobs), expected)
+
+    def test_errors(self):
+        self.server.documents['/error'] = {'body': b'', 'status': 500}
+        for path in ['/missing', '/error']:
+            for jobs in [1, 3]:
+                with self.subTest(path=path, jobs=jobs):
+                    with self.assertRaises(requests.HTTPError):
+                        self.fetch(['/0', path, '/1'], jobs)
+
+
+if __name__ == '__main__':
+    unittest.main()
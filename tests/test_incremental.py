@@ -0,0 +1,103 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from spatial2ccf.incremental import IncrementalMutator
+from spatial2ccf.ontology import SPOntology
+from spatial2ccf.writer import open_writer
+
+from tests.records import entity
+
+ONTOLOGY_IRI = "http://purl.org/ccf/data/test.owl"
+
+
+class IncrementalMutatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.input = os.path.join(self.directory, "records.json")
+        self.manifest = os.path.join(self.directory, "manifest.db")
+        self.output = os.path.join(self.directory, "output.nt")
+        self.write_records([entity(i) for i in range(20)])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_records(self, records):
+        with open(self.input, 'w') as f:
+            json.dump(records, f)
+
+    def convert(self, fail=False):
+        mutator = IncrementalMutator(self.manifest)
+        mutator.keep_output(self.output, 'nt', ONTOLOGY_IRI)
+        o = SPOntology.new(ONTOLOGY_IRI, open_writer(self.output, 'nt'))
+        with mutator:
+            for url in mutator.restore(o, [self.input]):
+                if url in mutator.unchanged:
+                    mutator.reuse(o, url)
+                    continue
+                with open(url) as f:
+                    mutator.mutate(o, json.load(f))
+                if fail:
+                    raise RuntimeError("failed run")
+        o.serialize(self.output, 'nt')
+        mutator.written([(self.output, 'nt')], ONTOLOGY_IRI)
+        return mutator
+
+    def read_output(self):
+        with open(self.output, 'rb') as f:
+            return f.read()
+
+    def full_conversion(self):
+        path = os.path.join(self.directory, "full.nt")
+        o = SPOntology.new(ONTOLOGY_IRI, open_writer(path, 'nt'))
+        with open(self.input) as f:
+            o.mutate(json.load(f))
+        o.serialize(path, 'nt')
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_unchanged_input_not_read(self):
+        first = self.convert()
+        self.assertEqual(first.converted, 20)
+        output = self.read_output()
+        second = self.convert()
+        self.assertEqual(second.unchanged, {self.input})
+        self.assertEqual((second.converted, second.reused), (0, 20))
+        self.assertEqual(self.read_output(), output)
+        self.assertFalse(os.path.exists(self.output + ".previous"))
+
+    def test_changed_record_converted_again(self):
+        self.convert()
+        records = [entity(i) for i in range(20)]
+        records[5]["object"]["file"] = "changed.glb"
+        del records[7]
+        self.write_records(records)
+        mutator = self.convert()
+        self.assertEqual((mutator.converted, mutator.reused), (1, 18))
+        self.assertEqual(mutator.removed, 1)
+        self.assertEqual(self.read_output(), self.full_conversion())
+
+    def test_failed_run_keeps_previous(self):
+        self.convert()
+        output = self.read_output()
+        self.write_records([entity(i) for i in range(5)])
+        with self.assertRaises(RuntimeError):
+            self.convert(fail=True)
+        self.assertEqual(self.read_output(), output)
+        self.write_records([entity(i) for i in range(20)])
+        mutator = self.convert()
+        self.assertEqual((mutator.converted, mutator.reused), (0, 20))
+        self.assertEqual(self.read_output(), output)
+
+    def test_unsupported_manifest(self):
+        with open(self.manifest, 'w') as f:
+            json.dump({'version': 1, 'records': {}}, f)
+        with self.assertRaises(ValueError):
+            self.convert()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import io
+import json
+import os
+import unittest
+
+from spatial2ccf.ontology import SPOntology
+from spatial2ccf.writer import NTriplesWriter
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+ONTOLOGY_IRI = "http://purl.org/ccf/data/test.owl"
+# Converted by the original if/elif converter: a SpatialEntity with its
+# object reference, placements and extraction set, a RetiredSpatialEntity,
+# a SpatialPlacement, an ExtractionSet and a Donor with samples
+DOCUMENTS = ["mapping.json", "mapping_donors.jsonld"]
+EXPECTED = "mapping.nt"
+
+
+def read(name):
+    with open(os.path.join(DATA, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def lines(text):
+    return set(line for line in text.splitlines() if line)
+
+
+class MappingTest(unittest.TestCase):
+
+    def convert(self, writer=None):
+        o = SPOntology.new(ONTOLOGY_IRI, writer)
+        for name in DOCUMENTS:
+            o.mutate(json.loads(read(name)))
+        return o
+
+    def test_same_triples_as_before(self):
+        o = self.convert()
+        self.assertEqual(lines(o.graph.serialize(format='nt')
+                               .decode('utf-8')),
+                         lines(read(EXPECTED)))
+
+    def test_same_triples_streamed(self):
+        stream = io.BytesIO()
+        o = self.convert(NTriplesWriter(stream))
+        o.serialize(None)
+        self.assertEqual(lines(stream.getvalue().decode('utf-8')),
+                         lines(read(EXPECTED)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+import warnings
+
+from rdflib import URIRef
+
+from spatial2ccf.namespace import CCF, DefinedNamespace, Namespace
+
+
+class Example(DefinedNamespace):
+    _NS = Namespace("http://example.org/vocabulary#")
+    _extras = ["first-name"]
+
+    Person: URIRef
+
+
+class ExampleExtended(Example):
+    age: URIRef
+
+
+class DefinedNamespaceTest(unittest.TestCase):
+
+    def test_terms_resolved_once(self):
+        self.assertEqual(CCF.SpatialEntity,
+                         URIRef("http://purl.org/ccf/SpatialEntity"))
+        self.assertIs(CCF.SpatialEntity, CCF.SpatialEntity)
+        self.assertIs(CCF["x_dimension"], CCF.x_dimension)
+        self.assertIs(Example["first-name"], Example["first-name"])
+        self.assertEqual(ExampleExtended.Person,
+                         URIRef("http://example.org/vocabulary#Person"))
+        self.assertEqual(ExampleExtended.age,
+                         URIRef("http://example.org/vocabulary#age"))
+
+    def test_contains(self):
+        self.assertIn("SpatialEntity", CCF)
+        self.assertIn(URIRef("http://purl.org/ccf/x_dimension"), CCF)
+        self.assertNotIn("spatial_entity", CCF)
+        self.assertIn("first-name", Example)
+        self.assertIn("Person", ExampleExtended)
+        self.assertNotIn("age", Example)
+
+    def test_undefined_term(self):
+        with self.assertRaises(AttributeError):
+            CCF.spatial_entity
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            term = Example.Animal
+        self.assertEqual(term, URIRef("http://example.org/vocabulary#Animal"))
+        self.assertEqual(len(caught), 1)
+        self.assertIn("Animal", str(caught[0].message))
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            Example.Person
+        self.assertEqual(caught, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
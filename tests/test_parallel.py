@@ -0,0 +1,61 @@
+import io
+import unittest
+
+from spatial2ccf.metrics import Metrics
+from spatial2ccf.ontology import SPOntology
+from spatial2ccf.parallel import ParallelMutator
+from spatial2ccf.writer import NTriplesWriter
+
+from tests.records import entity
+
+ONTOLOGY_IRI = "http://purl.org/ccf/data/test.owl"
+
+
+def records():
+    # Every chunk of 3 records repeats the object reference and extraction
+    # set of the first chunk
+    shared = entity(0)["object"]
+    data = []
+    for i in range(12):
+        record = entity(i)
+        record["object"] = shared
+        record["extraction_set"] = "#ExtractionSet"
+        data.append(record)
+        if i % 4 == 0:
+            data.append({"@id": "#ExtractionSet", "@type": "ExtractionSet",
+                         "label": "HuBMAP", "extraction_set_for": "#Organ",
+                         "rui_rank": 1})
+    return data
+
+
+class ParallelMutatorTest(unittest.TestCase):
+
+    def convert(self, processes, metrics=None):
+        stream = io.BytesIO()
+        o = SPOntology.new(ONTOLOGY_IRI, NTriplesWriter(stream),
+                           metrics=metrics)
+        if processes == 1:
+            o.mutate(records())
+        else:
+            with ParallelMutator(processes, chunk_size=3) as mutator:
+                mutator.mutate(o, records())
+        o.serialize(None)
+        return stream.getvalue()
+
+    def test_same_output_as_serial(self):
+        self.assertEqual(self.convert(2), self.convert(1))
+
+    def test_worker_metrics_merged(self):
+        serial, parallel = Metrics(), Metrics()
+        self.convert(1, serial)
+        self.convert(2, parallel)
+        self.assertEqual(parallel.types['SpatialEntity']['count'],
+                         serial.types['SpatialEntity']['count'])
+        self.assertEqual(parallel.stages['parse']['count'],
+                         serial.stages['parse']['count'])
+        self.assertGreater(parallel.counters['term_cache_hits'], 0)
+        self.assertGreater(parallel.counters['term_cache_misses'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
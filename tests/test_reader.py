@@ -0,0 +1,76 @@
+import io
+import json
+import random
+import unittest
+
+from spatial2ccf import reader
+
+DOCUMENTS = [
+    '[1, 2.5]',
+    '[-3e10]',
+    '[0, -0.0, 1E+2, 1.5e-3, 12345678901234567890, -7]',
+    '[true, false, null, "a\\"b\\\\c\\u00e9\\n", {"x": [1.25, {}]}]',
+    '[ {"@id": "#a", "x_dimension": 10.5, "rui_rank": 3} , [] ]',
+    '{"@context": {"ccf": "http://purl.org/ccf/"}, "n": 2.75, '
+    '"@graph": [{"@id": "#d", "samples": [{"w": -1e-2}]}, 4.5]}',
+    '-3.25e-2',
+    '  17  ',
+]
+
+
+def load(text, chunk_size):
+    data = reader.load(io.StringIO(text), chunk_size)
+    if isinstance(data, dict):
+        if '@graph' in data:
+            data = dict(data, **{'@graph': list(data['@graph'])})
+        return data
+    elif isinstance(data, (int, float, str, bool)) or data is None:
+        return data
+    return list(data)
+
+
+def random_value(rng, depth=0):
+    kind = rng.randrange(7 if depth < 3 else 4)
+    if kind == 0:
+        return rng.randint(-10 ** 6, 10 ** 6)
+    elif kind == 1:
+        return rng.uniform(-1e6, 1e6) * rng.choice([1, 1e-9, 1e12])
+    elif kind == 2:
+        return rng.choice([True, False, None])
+    elif kind == 3:
+        return ''.join(rng.choice('ab"\\\n é')
+                       for _ in range(rng.randint(0, 6)))
+    elif kind == 4:
+        return [random_value(rng, depth + 1)
+                for _ in range(rng.randint(0, 4))]
+    return {str(i): random_value(rng, depth + 1)
+            for i in range(rng.randint(0, 4))}
+
+
+class ReaderTest(unittest.TestCase):
+
+    def test_documents_at_every_chunk_size(self):
+        for text in DOCUMENTS:
+            expected = json.loads(text)
+            for chunk_size in range(1, len(text) + 2):
+                with self.subTest(text=text, chunk_size=chunk_size):
+                    self.assertEqual(load(text, chunk_size), expected)
+
+    def test_random_documents(self):
+        rng = random.Random(0)
+        for _ in range(200):
+            value = [random_value(rng) for _ in range(rng.randint(0, 5))]
+            text = json.dumps(value, indent=rng.choice([None, 1]))
+            for chunk_size in (1, 2, 3, 5, 8, 64):
+                with self.subTest(text=text, chunk_size=chunk_size):
+                    self.assertEqual(load(text, chunk_size), value)
+
+    def test_malformed(self):
+        with self.assertRaises(ValueError):
+            list(reader.load(io.StringIO('[1 2]'), 2))
+        with self.assertRaises(ValueError):
+            list(reader.load(io.StringIO('[1, 2.x]'), 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import logging
+import os
+import tracemalloc
+import unittest
+
+from unittest import mock
+
+from spatial2ccf.ontology import SPOntology
+from spatial2ccf.seen import SeenIndex, content_hash
+from spatial2ccf.terms import TermFactory
+from spatial2ccf.writer import NTriplesWriter
+
+from tests.records import entity
+
+ONTOLOGY_IRI = "http://purl.org/ccf/data/test.owl"
+
+
+class SeenIndexTest(unittest.TestCase):
+
+    def test_shared_object_converted_once(self):
+        o = SPOntology.new(ONTOLOGY_IRI)
+        o.mutate([entity(1)])
+        count = len(o.graph)
+        o.mutate([entity(1)])
+        self.assertEqual(len(o.graph), count)
+        self.assertEqual(len(o.seen.digests), 1)
+
+    def test_placements_not_indexed(self):
+        o = SPOntology.new(ONTOLOGY_IRI)
+        o.mutate([entity(i) for i in range(10)])
+        self.assertEqual(len(o.seen.digests), 10)
+        self.assertTrue(all(key.endswith("Obj") for key in o.seen.digests))
+
+    def test_conflict_keeps_both_with_warning(self):
+        o = SPOntology.new(ONTOLOGY_IRI)
+        o.mutate([entity(1, "first.glb")])
+        with self.assertLogs("spatial2ccf", logging.WARNING):
+            o.mutate([entity(1, "second.glb")])
+        files = {str(value) for value in o.graph.objects()
+                 if str(value).endswith(".glb")}
+        self.assertEqual(files, {"first.glb", "second.glb"})
+        self.assertEqual(o.seen.conflicts, 1)
+
+    def test_conflict_raises_in_strict_mode(self):
+        o = SPOntology.new(ONTOLOGY_IRI, strict=True)
+        o.mutate([entity(1, "first.glb")])
+        with self.assertRaises(ValueError):
+            o.mutate([entity(1, "second.glb")])
+
+    def test_hashed_when_seen_again(self):
+        o = SPOntology.new(ONTOLOGY_IRI)
+        with mock.patch("spatial2ccf.seen.content_hash",
+                        wraps=content_hash) as hashed:
+            o.mutate([entity(i) for i in range(10)])
+            self.assertEqual(hashed.call_count, 0)
+            o.mutate([entity(1)])
+            # The repeat and the first definition
+            self.assertEqual(hashed.call_count, 2)
+            o.mutate([entity(1)])
+            self.assertEqual(hashed.call_count, 3)
+        digests = o.seen.hashed()
+        self.assertTrue(all(isinstance(digest, str)
+                            for digest in digests.values()))
+
+    def test_failed_subtree_rolled_back(self):
+        o = SPOntology.new(ONTOLOGY_IRI)
+        broken = entity(1)
+        del broken["object"]["placement"]["x_scaling"]
+        with self.assertRaises(KeyError):
+            o.mutate([broken])
+        self.assertEqual(len(o.seen.digests), 0)
+        o.mutate([entity(1)])
+        files = {str(value) for value in o.graph.objects()
+                 if str(value).endswith(".glb")}
+        self.assertEqual(files, {"organ.glb"})
+
+    def test_abort_drops_nested_marks(self):
+        seen = SeenIndex(record_marks=True)
+        out = []
+        self.assertTrue(seen.enter("a", {"i": 0}, out))
+        out.append(0)
+        self.assertTrue(seen.enter("b", {"i": 1}, out))
+        out.append(1)
+        seen.leave(out)
+        seen.abort()
+        self.assertEqual(seen.marks, [])
+        self.assertEqual(len(seen.digests), 0)
+        self.assertTrue(seen.enter("c", {"i": 2}, out))
+        seen.leave(out)
+        self.assertEqual(seen.marks[0][0], "c")
+        self.assertEqual(seen.marks[0][2:], [2, 2])
+
+    def test_bounded(self):
+        seen = SeenIndex(max_size=3)
+        for i in range(10):
+            seen.enter(str(i), {"i": i}, [])
+        self.assertEqual(list(seen.digests), ["7", "8", "9"])
+        # A repeat makes a subtree the most recently seen
+        self.assertFalse(seen.enter("7", {"i": 7}, []))
+        seen.enter("10", {"i": 10}, [])
+        self.assertEqual(list(seen.digests), ["9", "7", "10"])
+
+    def test_streaming_memory_flat(self):
+        writer = NTriplesWriter(os.devnull, cache_size=256)
+        o = SPOntology.new(ONTOLOGY_IRI, writer, terms=TermFactory(256))
+        o.seen.max_size = 256
+        batches = [[entity(b * 500 + i) for i in range(500)]
+                   for b in range(6)]
+        tracemalloc.start()
+        try:
+            sizes = []
+            for batch in batches:
+                o.mutate(batch)
+                sizes.append(tracemalloc.get_traced_memory()[0])
+        finally:
+            tracemalloc.stop()
+            writer.close()
+        self.assertLessEqual(len(o.seen.digests), 256)
+        # Converting 2500 more records leaves the memory where it was
+        self.assertLess(sizes[-1] - sizes[0], 64 << 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import asyncio
+import json
+import unittest
+
+from spatial2ccf.server import ConversionService
+
+from tests.records import entity
+
+ONTOLOGY_IRI = "http://purl.org/ccf/data/test.owl"
+
+BODY = json.dumps([entity(1), entity(2)]).encode('utf-8')
+
+
+def request(method, target, headers=(), body=b'', version='HTTP/1.1'):
+    head = method + " " + target + " " + version + "\r\n"
+    head += ''.join(name + ": " + value + "\r\n" for name, value in headers)
+    return (head + "\r\n").encode('latin-1') + body
+
+
+def post(body=BODY, target="/convert?format=nt", headers=()):
+    return request("POST", target, [
+        ("Content-Length", str(len(body)))] + list(headers), body)
+
+
+async def read_response(reader):
+    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), 5)
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split(' ')[1])
+    headers = dict((name.lower(), value) for name, _, value in
+                   (line.partition(': ') for line in lines[1:] if line))
+    body = await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, headers, body
+
+
+class ConversionServiceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.service = ConversionService(ONTOLOGY_IRI, workers=2,
+                                         max_body=1 << 16)
+
+    def tearDown(self):
+        self.service.executor.shutdown()
+
+    def run_client(self, client):
+        async def scenario():
+            server = await asyncio.start_server(self.service.handle,
+                                                '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                reader, writer = await asyncio.open_connection('127.0.0.1',
+                                                               port)
+                try:
+                    return await client(reader, writer)
+                finally:
+                    writer.close()
+        return asyncio.run(scenario())
+
+    def exchange(self, *requests):
+        async def client(reader, writer):
+            responses = []
+            for data in requests:
+                writer.write(data)
+                responses.append(await read_response(reader))
+            return responses
+        return self.run_client(client)
+
+    def test_convert_and_stats(self):
+        (first, headers, output), (second, _, again), (ok, _, stats) = \
+            self.exchange(post(), post(), request("GET", "/stats"))
+        self.assertEqual((first, second, ok), (200, 200, 200))
+        self.assertEqual(headers['content-type'], 'application/n-triples')
+        self.assertEqual(headers['connection'], 'keep-alive')
+        self.assertIn(b'Entity_2', output)
+        self.assertEqual(again, output)
+        stats = json.loads(stats)
+        self.assertEqual((stats['requests'], stats['errors']), (2, 0))
+        self.assertIsNotNone(stats['latency_ms']['p50'])
+        self.assertGreater(stats['term_cache']['hits'], 0)
+
+    def test_expect_continue(self):
+        async def client(reader, writer):
+            writer.write(post(b'', headers=[
+                ("Expect", "100-continue")]).replace(
+                    b"Content-Length: 0", b"Content-Length: " +
+                    str(len(BODY)).encode('ascii')))
+            interim = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'),
+                                             1)
+            writer.write(BODY)
+            return interim, await read_response(reader)
+        interim, (status, _, output) = self.run_client(client)
+        self.assertEqual(interim, b'HTTP/1.1 100 Continue\r\n\r\n')
+        self.assertEqual(status, 200)
+        self.assertEqual(output, self.exchange(post())[0][2])
+
+    def test_expect_too_large(self):
+        async def client(reader, writer):
+            writer.write(request("POST", "/convert", [
+                ("Content-Length", str(1 << 20)),
+                ("Expect", "100-continue")]))
+            response = await read_response(reader)
+            return response, await reader.read()
+        (status, headers, _), rest = self.run_client(client)
+        self.assertEqual(status, 413)
+        self.assertEqual(headers['connection'], 'close')
+        self.assertEqual(rest, b'')
+
+    def test_chunked(self):
+        chunks = b''.join(b'%x;ext=1\r\n%s\r\n' % (len(BODY[i:i + 100]),
+                                                   BODY[i:i + 100])
+                          for i in range(0, len(BODY), 100))
+        chunked = request("POST", "/convert?format=nt", [
+            ("Transfer-Encoding", "chunked")],
+            chunks + b'0\r\nX-Trailer: 1\r\n\r\n')
+        (status, _, output), (_, _, expected) = \
+            self.exchange(chunked, post())
+        self.assertEqual(status, 200)
+        self.assertEqual(output, expected)
+
+    def test_http10_connection(self):
+        async def client(reader, writer):
+            writer.write(request("GET", "/stats", version='HTTP/1.0'))
+            response = await read_response(reader)
+            return response, await reader.read()
+        (status, headers, _), rest = self.run_client(client)
+        self.assertEqual((status, headers['connection']), (200, 'close'))
+        self.assertEqual(rest, b'')
+        kept = request("GET", "/stats", [("Connection", "Keep-Alive")],
+                       version='HTTP/1.0')
+        (first, headers, _), (second, _, _) = self.exchange(kept, kept)
+        self.assertEqual((first, second), (200, 200))
+        self.assertEqual(headers['connection'], 'keep-alive')
+
+    def test_errors(self):
+        cases = [
+            (request("GET", "/convert"), 405),
+            (request("GET", "/missing"), 404),
+            (post(target="/convert?format=xml"), 400),
+            (post(b'{"@graph": [}'), 400),
+            (b"BAD\r\n\r\n", 400),
+            (request("GET", "/stats", version='HTTP/2.0'), 505),
+            (post(b'x' * (1 << 17)), 413),
+            (request("POST", "/convert", [("Transfer-Encoding", "chunked")],
+                     b'zz\r\n'), 400),
+            (request("POST", "/convert", [("Transfer-Encoding", "gzip")]),
+             501),
+            (request("POST", "/convert", [("Expect", "nothing")]), 417),
+        ]
+        for data, expected in cases:
+            with self.subTest(request=data[:40]):
+                status, _, _ = self.exchange(data)[0]
+                self.assertEqual(status, expected)
+        stats = self.service.stats()
+        self.assertEqual((stats['requests'], stats['errors']), (3, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
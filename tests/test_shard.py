@@ -0,0 +1,117 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from rdflib import Graph
+
+import spatial2ccf
+
+from spatial2ccf.namespace import CCF
+from spatial2ccf.shard import ShardWriter, write_shards
+from spatial2ccf.store import SQLiteStore
+
+from tests.records import entity
+
+ONTOLOGY_IRI = "http://purl.org/ccf/data/test.owl"
+
+
+def records():
+    records = []
+    for index in range(30):
+        record = entity(index)
+        record["reference_organ"] = "#Organ_" + str(index % 3)
+        records.append(record)
+    # Falls back to its own group, with its placements and object
+    records.append(entity(99))
+    return records
+
+
+def normalized(nodes):
+    # Keys and repeated values come in the order of the triples
+    return sorted(json.dumps({
+        key: sorted(json.dumps(item, sort_keys=True) for item in
+                    (value if isinstance(value, list) else [value]))
+        for key, value in node.items()}, sort_keys=True) for node in nodes)
+
+
+class ShardWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.triples = list(spatial2ccf.convert(records(), ONTOLOGY_IRI))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, max_held):
+        destination = os.path.join(self.directory, "out.nt")
+        writer = ShardWriter(destination, 'nt', 3, 'organ',
+                             max_held=max_held)
+        for start in range(0, len(self.triples), 7):
+            writer.add_many(self.triples[start:start + 7])
+        spilled = writer._spill is not None
+        writer.close()
+        shards = []
+        for path in writer.paths:
+            with open(path, 'rb') as f:
+                shards.append(f.read())
+        with open(os.path.join(self.directory, "out.manifest.json")) as f:
+            manifest = json.load(f)
+        return shards, manifest, spilled
+
+    def test_spilled_same_as_held(self):
+        held, manifest, spilled = self.write(1 << 20)
+        self.assertFalse(spilled)
+        self.assertEqual(manifest['triples'], len(self.triples))
+        shards, _, spilled = self.write(10)
+        self.assertTrue(spilled)
+        self.assertEqual(shards, held)
+        self.assertEqual(sorted(os.listdir(self.directory)), [
+            "out-00000-of-00003.nt", "out-00001-of-00003.nt",
+            "out-00002-of-00003.nt", "out.manifest.json"])
+
+    def test_grouped_by_organ(self):
+        shards, _, _ = self.write(10)
+        shard_of = {}
+        graph = Graph()
+        for shard, data in enumerate(shards):
+            part = Graph().parse(data=data.decode('utf-8'), format='nt')
+            for s in part.subjects():
+                shard_of[s] = shard
+            graph += part
+        organs = {}
+        for s, o in graph.subject_objects(CCF.has_reference_organ):
+            organs.setdefault(o, set()).add(shard_of[s])
+        self.assertEqual(len(organs), 3)
+        self.assertTrue(all(len(found) == 1 for found in organs.values()))
+        for predicate in [CCF.has_placement, CCF.has_object_reference]:
+            for s, o in graph.subject_objects(predicate):
+                self.assertEqual(shard_of[s], shard_of[o])
+
+    def test_write_shards_from_store(self):
+        graph = Graph()
+        store = SQLiteStore(os.path.join(self.directory, "store.db"))
+        for triple in self.triples:
+            graph.add(triple)
+        store.add_many(self.triples)
+        outputs = {}
+        for name, source in [("graph", graph), ("store", store)]:
+            destination = os.path.join(self.directory, name + ".jsonld")
+            writer = write_shards(source, destination, 'jsonld', 3)
+            nodes = []
+            for path in writer.paths:
+                with open(path) as f:
+                    nodes.extend(json.load(f)['@graph'])
+            outputs[name] = nodes
+        store.close()
+        ids = [node['@id'] for node in outputs["store"]]
+        # One node object per subject
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(normalized(outputs["store"]),
+                         normalized(outputs["graph"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import io
+import os
+import tempfile
+import unittest
+
+from rdflib import Graph
+
+from spatial2ccf.ontology import SPOntology
+from spatial2ccf.snapshot import Snapshot, SnapshotBuilder, save_snapshot
+from spatial2ccf.writer import TurtleWriter
+
+from tests.records import entity
+
+ONTOLOGY_IRI = "http://purl.org/ccf/data/test.owl"
+EXAMPLE = "http://example.org/snapshot#"
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "base.snapshot")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        o = SPOntology.new(ONTOLOGY_IRI)
+        o.mutate([entity(i) for i in range(3)])
+        save_snapshot(self.path, o.graph, o.graph.namespaces(), o.seen)
+        with Snapshot(self.path) as snapshot:
+            self.assertEqual(len(snapshot), len(o.graph))
+            self.assertEqual(set(snapshot.triples()), set(o.graph))
+            self.assertEqual(snapshot.seen, dict(o.seen.digests))
+
+    def test_generator_passed_on_to_target(self):
+        o = SPOntology.new(ONTOLOGY_IRI)
+        o.mutate([entity(i) for i in range(3)])
+        target = SnapshotBuilder()
+        builder = SnapshotBuilder(target)
+        builder.add_many(triple for triple in o.graph)
+        self.assertEqual(len(builder.triples), 3 * len(o.graph))
+        self.assertEqual(target.triples, builder.triples)
+
+    def test_namespaces_bound_before_streaming(self):
+        base = SPOntology.new(ONTOLOGY_IRI)
+        base.graph.bind('ex', EXAMPLE)
+        base.mutate([entity(1)])
+        save_snapshot(self.path, base.graph, base.graph.namespaces(),
+                      base.seen)
+        stream = io.BytesIO()
+        with Snapshot(self.path) as snapshot:
+            o = SPOntology.new(ONTOLOGY_IRI, TurtleWriter(stream),
+                               namespaces=snapshot.namespaces)
+            o.load(snapshot)
+        o.mutate([entity(2)])
+        o.serialize(None)
+        text = stream.getvalue().decode('utf-8')
+        self.assertIn("@prefix ex: <" + EXAMPLE + "> .", text)
+        # The header comes before the first triple
+        self.assertLess(text.index("@prefix ex:"), text.index(" a "))
+        graph = Graph().parse(data=text, format='turtle')
+        expected = SPOntology.new(ONTOLOGY_IRI)
+        expected.mutate([entity(1), entity(2)])
+        self.assertEqual(set(graph), set(expected.graph))
+
+
+if __name__ == '__main__':
+    unittest.main()
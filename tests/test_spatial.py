@@ -0,0 +1,129 @@
+import unittest
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from spatial2ccf.ontology import SPOntology
+from spatial2ccf.spatial import PlacementCollector, bounding_boxes
+from spatial2ccf.spatial import local_transforms, resolve
+from spatial2ccf.terms import TermFactory
+
+from tests.records import entity
+
+ONTOLOGY_IRI = "http://purl.org/ccf/data/test.owl"
+
+
+def random_placement(rng, source, target):
+    values = {'source': source, 'target': target,
+              'rotation_order': rng.choice(['XYZ', 'ZYX', 'YXZ']),
+              'rotation_units': 'degree', 'translation_units': 'millimeter'}
+    for axis in 'xyz':
+        values[axis + '_scaling'] = rng.uniform(0.5, 2)
+        values[axis + '_rotation'] = rng.uniform(-180, 180)
+        values[axis + '_translation'] = rng.uniform(-50, 50)
+    return values
+
+
+def naive_local(values):
+    scaling = np.diag([values[axis + '_scaling'] for axis in 'xyz'] + [1])
+    rotation = np.eye(4)
+    for axis in values.get('rotation_order', 'XYZ'):
+        angle = np.radians(values[axis.lower() + '_rotation'])
+        i, j = [(1, 2), (2, 0), (0, 1)]['XYZ'.index(axis)]
+        matrix = np.eye(4)
+        matrix[i, i] = matrix[j, j] = np.cos(angle)
+        matrix[i, j], matrix[j, i] = -np.sin(angle), np.sin(angle)
+        rotation = rotation @ matrix
+    translation = np.eye(4)
+    translation[:3, 3] = [values[axis + '_translation'] for axis in 'xyz']
+    return translation @ rotation @ scaling
+
+
+def naive_world(placements, node):
+    # Follows the chain one placement at a time
+    by_source = {values['source']: values for values in placements.values()}
+    world, seen = np.eye(4), set()
+    while node in by_source:
+        if node in seen:
+            return None, None
+        seen.add(node)
+        values = by_source[node]
+        world = naive_local(values) @ world
+        node = values['target']
+    return world, node
+
+
+@unittest.skipIf(np is None, "requires NumPy")
+class ResolveTest(unittest.TestCase):
+
+    def test_matches_naive_products(self):
+        rng = np.random.default_rng(0)
+        placements = {}
+        # A tree of chains up to 40 placements long under two roots
+        for i in range(1, 80):
+            target = "root%d" % (i % 2) if i < 3 else \
+                "node%d" % rng.integers(max(1, i - 3), i)
+            placements["p%d" % i] = random_placement(rng, "node%d" % i,
+                                                     target)
+        # A cycle, and an entity placed on it
+        for source, target in [("c1", "c2"), ("c2", "c3"), ("c3", "c1"),
+                               ("hanging", "c1")]:
+            placements["p" + source] = random_placement(rng, source, target)
+        entities = {"node%d" % i: {'x_dimension': 1, 'y_dimension': 2,
+                                   'z_dimension': 3}
+                    for i in range(1, 80)}
+        table = resolve(placements, entities)
+        for i, node in enumerate(table.nodes):
+            with self.subTest(node=node):
+                world, root = naive_world(placements, node)
+                self.assertEqual(table.roots[i], root)
+                if world is None:
+                    self.assertTrue(np.isnan(table.world[i]).all())
+                else:
+                    np.testing.assert_allclose(table.world[i], world,
+                                               atol=1e-9)
+
+    def test_bounding_box(self):
+        rng = np.random.default_rng(1)
+        world = naive_local(random_placement(rng, "a", "b"))
+        dimensions = np.array([4.0, 6.0, 8.0])
+        corners = np.array([[x, y, z, 1] for x in (-2, 2) for y in (-3, 3)
+                            for z in (-4, 4)]) @ world.T
+        low, high = bounding_boxes(world[None], dimensions[None])
+        np.testing.assert_allclose(low[0], corners[:, :3].min(axis=0))
+        np.testing.assert_allclose(high[0], corners[:, :3].max(axis=0))
+
+    def test_units(self):
+        values = random_placement(np.random.default_rng(2), "a", "b")
+        converted = dict(values, rotation_units='radian',
+                         translation_units='centimeter')
+        for axis in 'xyz':
+            converted[axis + '_rotation'] = np.radians(
+                values[axis + '_rotation'])
+            converted[axis + '_translation'] = \
+                values[axis + '_translation'] / 10
+        np.testing.assert_allclose(local_transforms([converted]),
+                                   local_transforms([values]))
+        with self.assertRaises(ValueError):
+            local_transforms([dict(values, translation_units='inch')])
+        with self.assertRaises(ValueError):
+            local_transforms([dict(values, rotation_order='XXZ')])
+
+    def test_collected_from_conversion(self):
+        collector = PlacementCollector()
+        o = SPOntology.new(ONTOLOGY_IRI, collector)
+        o.mutate([entity(1)])
+        table = collector.resolve()
+        row = table.nodes.index(TermFactory().instance_iri("#Entity_1"))
+        self.assertEqual(table.roots[row],
+                         TermFactory().instance_iri("#Organ"))
+        # 10 mm wide, translated by (1, 2, 3) mm
+        np.testing.assert_allclose(table.aabb_min[row], [-4, -3, -2])
+        np.testing.assert_allclose(table.aabb_max[row], [6, 7, 8])
+        self.assertEqual(len(list(table.triples(TermFactory()))), 25)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import io
+import os
+import tempfile
+import unittest
+
+from rdflib import BNode, Literal, URIRef
+from rdflib import OWL, RDF, XSD
+
+from spatial2ccf.ontology import SPOntology
+from spatial2ccf.store import SQLiteStore, decode, encode, open_store
+
+from tests.records import entity
+
+ONTOLOGY_IRI = "http://purl.org/ccf/data/test.owl"
+
+
+class SQLiteStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "graph.sqlite")
+        self.records = [entity(i) for i in range(10)]
+        self.expected = SPOntology.new(ONTOLOGY_IRI).mutate(self.records)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def convert(self, store):
+        o = SPOntology.new(ONTOLOGY_IRI, store, batch_size=50)
+        o.mutate(self.records)
+        o.flush()
+        return o
+
+    def test_terms_round_trip(self):
+        for term in [URIRef("http://example.org/a b"), BNode("b1"),
+                     Literal("a \"quoted\" value"), Literal("chat", lang="fr"),
+                     Literal("1.00", datatype=XSD.decimal),
+                     Literal("with spaces", datatype=XSD.string)]:
+            with self.subTest(term=term):
+                decoded = decode(encode(term))
+                self.assertEqual(type(decoded), type(term))
+                self.assertEqual(decoded, term)
+                self.assertEqual(str(decoded), str(term))
+
+    def test_round_trip(self):
+        # Small caches, so that the term numbers are looked up again
+        store = SQLiteStore(self.path, cache_size=8)
+        self.convert(store)
+        self.assertEqual(len(store), len(self.expected.graph))
+        self.assertEqual(set(store), set(self.expected.graph))
+        self.assertEqual(dict(store.namespaces())['ccf'],
+                         str(dict(self.expected.graph.namespaces())['ccf']))
+        self.assertEqual(store.value(predicate=RDF.type,
+                                     object=OWL.Ontology),
+                         URIRef(ONTOLOGY_IRI))
+        store.close()
+
+    def test_repeated_triples_dropped(self):
+        store = SQLiteStore(self.path)
+        self.convert(store)
+        count = len(store)
+        triples = list(store)
+        store.add_many(triples)
+        self.convert(store)
+        self.assertEqual(len(store), count)
+        self.assertEqual(list(store), triples)
+        store.close()
+
+    def test_grouped_by_subject(self):
+        store = SQLiteStore(self.path)
+        self.convert(store)
+        subjects = [s for s, _, _ in store]
+        runs = [s for i, s in enumerate(subjects)
+                if i == 0 or s != subjects[i - 1]]
+        self.assertEqual(len(runs), len(set(subjects)))
+        stream = io.BytesIO()
+        store.serialize(stream, 'nt')
+        lines = set(stream.getvalue().decode('utf-8').splitlines())
+        expected = self.expected.graph.serialize(format='nt')
+        self.assertEqual(lines, set(expected.decode('utf-8').splitlines())
+                         - {''})
+        store.close()
+
+    def test_open_store(self):
+        with open(self.path, 'w') as f:
+            f.write("left over")
+        store = open_store("sqlite:" + self.path)
+        # Every run starts from an empty store
+        self.assertEqual(len(store), 0)
+        store.close()
+        for spec in ["sqlite:", "memory:" + self.path]:
+            with self.assertRaises(ValueError):
+                open_store(spec)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+
+from rdflib import Literal, URIRef
+from rdflib import XSD
+
+from spatial2ccf.ontology import SPOntology
+from spatial2ccf.terms import TermFactory, expand_anatomical_entity_id
+from spatial2ccf.terms import expand_instance_id
+
+from tests.records import entity
+
+ONTOLOGY_IRI = "http://purl.org/ccf/data/test.owl"
+
+
+class TermFactoryTest(unittest.TestCase):
+
+    def test_interned(self):
+        terms = TermFactory()
+        self.assertIs(terms.string("millimeter"), terms.string("millimeter"))
+        self.assertIs(terms.instance_iri("#Organ"),
+                      terms.instance_iri("#Organ"))
+        self.assertEqual(terms.hits, 2)
+        # instance_iri also misses once in the iri cache
+        self.assertEqual(terms.misses, 3)
+        self.assertEqual(terms.cache_info()['iri']['misses'], 1)
+
+    def test_same_terms_as_constructors(self):
+        terms = TermFactory()
+        self.assertEqual(terms.decimal(10),
+                         Literal(10, datatype=XSD.decimal))
+        self.assertEqual(terms.integer(3), Literal(3, datatype=XSD.integer))
+        self.assertEqual(terms.date("2021-01-01"),
+                         Literal("2021-01-01", datatype=XSD.date))
+        self.assertEqual(terms.instance_iri("##Organ"),
+                         URIRef("http://purl.org/ccf/latest/ccf.owl#Organ"))
+
+    def test_typed(self):
+        # 1 and 1.0 are equal keys but different literals
+        terms = TermFactory()
+        self.assertEqual(str(terms.decimal(1)), "1")
+        self.assertEqual(str(terms.decimal(1.0)), "1.0")
+        self.assertEqual(terms.hits, 0)
+
+    def test_bounded(self):
+        terms = TermFactory(max_size=2)
+        for value in ["a", "b", "c", "a"]:
+            terms.string(value)
+        self.assertEqual(terms.hits, 0)
+        self.assertEqual(terms.cache_info()['string']['currsize'], 2)
+        terms.clear()
+        self.assertEqual(terms.misses, 0)
+
+    def test_shared_by_records(self):
+        terms = TermFactory()
+        SPOntology.new(ONTOLOGY_IRI, terms=terms).mutate([entity(1)])
+        hits = terms.hits
+        SPOntology.new(ONTOLOGY_IRI, terms=terms).mutate([entity(2)])
+        self.assertGreater(terms.hits - hits, hits)
+
+    def test_expand(self):
+        self.assertEqual(expand_instance_id("http://example.org/a"),
+                         "http://example.org/a")
+        self.assertEqual(expand_anatomical_entity_id("obo:UBERON_0002113"),
+                         "http://purl.obolibrary.org/obo/UBERON_0002113")
+        self.assertEqual(expand_anatomical_entity_id("UBERON:0002113"),
+                         "http://purl.obolibrary.org/obo/UBERON_0002113")
+        self.assertEqual(
+            expand_anatomical_entity_id(
+                "http://purl.obolibrary.org/obo/FMA_7203"),
+            "http://purl.org/sig/ont/fma/fma7203")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,203 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from rdflib import BNode, Graph, Literal, URIRef
+from rdflib import RDF, XSD
+from rdflib.plugins.serializers.nt import _nt_row
+
+from spatial2ccf.writer import JSONLDWriter, NTriplesWriter, TurtleWriter
+from spatial2ccf.compression import decompress
+from spatial2ccf.ontology import SPOntology
+from spatial2ccf.writer import MultiWriter, TripleBuffer, TripleList
+from spatial2ccf.writer import nt_row, open_writers, resolve_outputs
+
+from tests.records import entity
+
+CCF = "http://purl.org/ccf/latest/ccf.owl#"
+ONTOLOGY_IRI = "http://purl.org/ccf/data/test.owl"
+
+
+def triples(subject):
+    s = URIRef(subject)
+    return [(s, RDF.type, URIRef(CCF + "spatial_entity")),
+            (s, URIRef(CCF + "x_dimension"),
+             Literal("10.0", datatype=XSD.float)),
+            (s, URIRef(CCF + "has_placement"),
+             URIRef("http://example.org/p?a=1&b=2"))]
+
+
+class WriterTest(unittest.TestCase):
+
+    def write(self, writer_class, data):
+        stream = io.BytesIO()
+        writer = writer_class(stream)
+        writer.bind('ccf', CCF)
+        writer.add_many(data)
+        writer.close()
+        return stream.getvalue()
+
+    def test_round_trip(self):
+        data = triples("http://example.org/entity#1")
+        expected = Graph()
+        for triple in data:
+            expected.add(triple)
+        graph = Graph().parse(
+            data=self.write(TurtleWriter, data).decode('utf-8'),
+            format='turtle')
+        self.assertEqual(set(graph), set(expected))
+        document = json.loads(self.write(JSONLDWriter, data))
+        self.assertEqual(document['@graph'], [{
+            '@id': "http://example.org/entity#1",
+            '@type': "ccf:spatial_entity",
+            'ccf:x_dimension': {'@value': "10.0", '@type': "xsd:float"},
+            'ccf:has_placement': {'@id': "http://example.org/p?a=1&b=2"}
+        }])
+
+    def test_nt_row(self):
+        s, p = URIRef("http://example.org/entity#1"), URIRef(CCF + "label")
+        # Equal lexical forms with other datatypes or languages must not
+        # share a cached rendering
+        for o in [Literal("1", datatype=XSD.integer),
+                  Literal("01", datatype=XSD.integer), Literal("1"),
+                  Literal("1", lang="en"), Literal('a "quoted"\nline'),
+                  URIRef("1"), BNode("b1")]:
+            with self.subTest(o=o):
+                self.assertEqual(nt_row((s, p, o)), _nt_row((s, p, o)))
+        self.assertEqual(
+            self.write(NTriplesWriter, triples(str(s))).decode('ascii'),
+            ''.join(map(_nt_row, triples(str(s)))))
+
+    def test_invalid_iri(self):
+        for subject in ["http://example.org/an entity",
+                        "http://example.org/<entity>",
+                        'http://example.org/"entity"',
+                        "http://example.org/{entity}",
+                        "http://example.org/a|b^c`d\\e"]:
+            for writer_class in [NTriplesWriter, TurtleWriter,
+                                 JSONLDWriter]:
+                with self.subTest(subject=subject, writer=writer_class):
+                    with self.assertRaises(ValueError):
+                        self.write(writer_class, triples(subject))
+
+
+class Batches(TripleList):
+    """Writer keeping the size of every batch it receives
+    """
+    def __init__(self):
+        super().__init__()
+        self.sizes = []
+
+    def add_many(self, triples):
+        self.sizes.append(len(triples))
+        super().add_many(triples)
+
+
+class TripleBufferTest(unittest.TestCase):
+
+    def test_flushed_at_flush_size(self):
+        data = triples("http://example.org/entity#1") * 3
+        target = Batches()
+        buffer = TripleBuffer(target, flush_size=4)
+        for triple in data[:5]:
+            buffer.add(triple)
+        buffer.add_many(data[5:])
+        self.assertEqual(target.sizes, [4, 5])
+        self.assertEqual(len(buffer), 9)
+        buffer.flush()
+        self.assertEqual(target.sizes, [4, 5])
+        # Repeated triples are kept for writers
+        self.assertEqual(target, data)
+
+    def test_graph_batches_deduplicated(self):
+        data = triples("http://example.org/entity#1") * 2
+        graph = Graph()
+        buffer = TripleBuffer(graph, flush_size=100)
+        buffer.add_many(data)
+        self.assertEqual(len(graph), 0)
+        buffer.flush()
+        self.assertEqual(set(graph), set(data))
+        self.assertEqual(buffer.count, 6)
+
+
+def normalized(data, format):
+    if format == 'nt':
+        return sorted(data.splitlines())
+    elif format == 'jsonld':
+        document = json.loads(data)
+        for node in document['@graph']:
+            for key, value in node.items():
+                if isinstance(value, list):
+                    node[key] = sorted(value, key=json.dumps)
+        return document
+    return data
+
+
+class Failing(TripleList):
+
+    def add_many(self, triples):
+        raise OSError("disk full")
+
+
+class MultiWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.records = [entity(i) for i in range(20)]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def paths(self, name):
+        return [os.path.join(self.directory.name, name + extension)
+                for extension in [".ttl", ".nt.gz", ".jsonld"]]
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        # Without the gzip header, which holds the time
+        return decompress(data)
+
+    def test_same_as_separate_runs(self):
+        for stream in [True, False]:
+            with self.subTest(stream=stream):
+                name = "stream" if stream else "graph"
+                outputs = resolve_outputs(self.paths(name))
+                self.assertEqual([format for _, format in outputs],
+                                 ["ttl", "nt", "jsonld"])
+                self.convert(outputs, stream)
+                for output in outputs:
+                    separate = (output[0] + ".separate", output[1])
+                    self.convert([separate], stream, 'gzip'
+                                 if output[1] == 'nt' else None)
+                    first, second = self.read(output[0]), \
+                        self.read(separate[0])
+                    if not stream:
+                        # Written from a graph, in graph order
+                        first = normalized(first, output[1])
+                        second = normalized(second, output[1])
+                    self.assertEqual(first, second)
+
+    def convert(self, outputs, stream, compression=None):
+        writer = open_writers(outputs, URIRef(ONTOLOGY_IRI),
+                              compression=compression) if stream else None
+        if stream and len(outputs) > 1:
+            self.assertIsInstance(writer, MultiWriter)
+        o = SPOntology.new(ONTOLOGY_IRI, writer)
+        o.mutate(self.records)
+        o.serialize_all(outputs, compression)
+
+    def test_error_raised(self):
+        writer = MultiWriter([TripleList(), Failing()])
+        writer.add_many(triples("http://example.org/entity#1"))
+        with self.assertRaises(OSError):
+            writer.close()
+        # The writers are closed and their threads are done
+        self.assertFalse(any(thread.is_alive()
+                             for thread in writer._threads))
+
+
+if __name__ == '__main__':
+    unittest.main()